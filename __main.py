@@ -1,11 +1,13 @@
+import re
 import tkinter as tk
 from tkinter import ttk, messagebox
+import matplotlib
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import pandas as pd
 from datetime import datetime, timedelta
-from stock_data import StockDataManager
+from stock_data import StockDataManager, MAX_CHART_SYMBOLS
 
 
 class StockChartGUI:
@@ -23,8 +25,11 @@ class StockChartGUI:
         # GUIコンポーネントの初期化
         self.setup_gui()
         
-        # デフォルトの色設定
-        self.colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728']
+        # デフォルトの色設定（tab10 の後に tab20b・tab20c を続け、MAX_CHART_SYMBOLS 色を用意する）
+        self.colors = [
+            matplotlib.colors.to_hex(color)
+            for name in ('tab10', 'tab20b', 'tab20c') for color in matplotlib.colormaps[name].colors
+        ]
     
     def setup_gui(self):
         """GUIコンポーネントをセットアップ"""
@@ -51,28 +56,43 @@ class StockChartGUI:
     def setup_stock_inputs(self, parent):
         """株式入力フィールドをセットアップ"""
         # 銘柄入力フレーム
-        stock_frame = ttk.LabelFrame(parent, text="銘柄入力（最大4社）", padding="10")
+        stock_frame = ttk.LabelFrame(parent, text=f"銘柄入力（最大{MAX_CHART_SYMBOLS}社）", padding="10")
         stock_frame.pack(fill=tk.X, pady=(0, 10))
         
         self.stock_entries = []
         self.stock_labels = []
         
+        # 入力欄（1つの欄にカンマ区切りで複数入力できる）
+        self.entries_frame = ttk.Frame(stock_frame)
+        self.entries_frame.pack(fill=tk.X)
         for i in range(4):
-            # ラベル
-            label = ttk.Label(stock_frame, text=f"銘柄 {i+1}:")
-            label.grid(row=i, column=0, sticky=tk.W, pady=2)
-            
-            # 入力フィールド
-            entry = ttk.Entry(stock_frame, width=15)
-            entry.grid(row=i, column=1, padx=(5, 0), pady=2)
-            
-            self.stock_entries.append(entry)
-            self.stock_labels.append(label)
+            self.add_stock_entry()
+        
+        add_btn = ttk.Button(stock_frame, text="＋ 入力欄を追加", command=self.add_stock_entry)
+        add_btn.pack(fill=tk.X, pady=(5, 0))
         
         # サンプル入力例
         self.stock_entries[0].insert(0, "AAPL")
         self.stock_entries[1].insert(0, "GOOGL")
     
+    def add_stock_entry(self):
+        """銘柄の入力欄を追加"""
+        i = len(self.stock_entries)
+        if i >= MAX_CHART_SYMBOLS:
+            messagebox.showwarning("警告", f"入力欄は最大{MAX_CHART_SYMBOLS}個です。")
+            return
+        
+        # ラベル
+        label = ttk.Label(self.entries_frame, text=f"銘柄 {i+1}:")
+        label.grid(row=i, column=0, sticky=tk.W, pady=2)
+        
+        # 入力フィールド
+        entry = ttk.Entry(self.entries_frame, width=15)
+        entry.grid(row=i, column=1, padx=(5, 0), pady=2)
+        
+        self.stock_entries.append(entry)
+        self.stock_labels.append(label)
+    
     def setup_period_selection(self, parent):
         """期間選択をセットアップ"""
         period_frame = ttk.LabelFrame(parent, text="表示期間", padding="10")
@@ -134,10 +154,10 @@ class StockChartGUI:
         """入力された有効な銘柄コードを取得"""
         symbols = []
         for entry in self.stock_entries:
-            symbol = entry.get().strip().upper()
-            if symbol:
-                symbols.append(symbol)
-        return symbols
+            for symbol in re.split(r'[,\s]+', entry.get().strip().upper()):
+                if symbol and symbol not in symbols:
+                    symbols.append(symbol)
+        return symbols[:MAX_CHART_SYMBOLS]
     
     def update_chart(self):
         """チャートを更新"""
@@ -156,36 +176,42 @@ class StockChartGUI:
         self.ax.set_ylabel("株価")
         self.ax.grid(True, alpha=0.3)
         
-        # データを取得してプロット
+        # 全銘柄のデータと会社情報をまとめて取得してプロット（未キャッシュの銘柄は並列取得）
+        try:
+            stock_data = self.stock_manager.get_stock_data_batch(symbols, period)
+            company_infos = self.stock_manager.get_company_infos(
+                [symbol for symbol in symbols if stock_data[symbol] is not None and not stock_data[symbol].empty]
+            )
+        except Exception as e:
+            messagebox.showerror("エラー", f"株価データの取得中にエラーが発生しました: {str(e)}")
+            return
+        
         valid_data_count = 0
+        failed_symbols = []
         for i, symbol in enumerate(symbols):
-            try:
-                # データ取得
-                data = self.stock_manager.get_stock_data(symbol, period)
-                
-                if data is not None and not data.empty:
-                    # 会社情報を取得
-                    company_info = self.stock_manager.get_company_info(symbol)
-                    company_name = company_info.get('shortName', symbol)
-                    
-                    # グラフにプロット
-                    color = self.colors[i % len(self.colors)]
-                    self.ax.plot(data.index, data['Close'], 
-                               label=f"{company_name} ({symbol})", 
-                               color=color, 
-                               linewidth=2)
-                    
-                    valid_data_count += 1
-                    
-                else:
-                    messagebox.showwarning("警告", f"銘柄コード '{symbol}' のデータを取得できませんでした。")
-                    
-            except Exception as e:
-                messagebox.showerror("エラー", f"銘柄 '{symbol}' の処理中にエラーが発生しました: {str(e)}")
+            if symbol not in company_infos:
+                failed_symbols.append(symbol)
+                continue
+            
+            data = stock_data[symbol]
+            company_name = company_infos[symbol].get('shortName', symbol)
+            
+            # グラフにプロット
+            color = self.colors[i % len(self.colors)]
+            self.ax.plot(data.index, data['Close'], 
+                       label=f"{company_name} ({symbol})", 
+                       color=color, 
+                       linewidth=2 if len(symbols) <= 10 else 1)
+            
+            valid_data_count += 1
+        
+        if failed_symbols:
+            messagebox.showwarning("警告", f"銘柄コード {', '.join(failed_symbols)} のデータを取得できませんでした。")
         
         if valid_data_count > 0:
-            # 凡例を表示
-            self.ax.legend(loc='upper left')
+            # 凡例を表示（銘柄が多い場合は複数列にする）
+            self.ax.legend(loc='upper left', ncol=1 + (valid_data_count - 1) // 15,
+                           fontsize='medium' if valid_data_count <= 10 else 'x-small')
             
             # 日付軸の回転
             self.figure.autofmt_xdate()
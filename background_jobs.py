@@ -0,0 +1,165 @@
+import os
+import uuid
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+from dash import DiskcacheManager
+
+from fork_safety import register_fork_reset
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ジョブの関数を作る Dash の内部の関数（pyproject.toml で固定した範囲の Dash にある）。
+# 見つからない Dash では公開の DiskcacheManager.make_job_fn を使い、中止は実行前の確認だけになる
+try:
+    from dash.background_callback.managers.diskcache_manager import _make_job_fn
+except ImportError:
+    _make_job_fn = None
+    logger.warning("この Dash のバージョンではジョブの途中での中止ができません（実行前の中止のみ）")
+
+# ワーカープロセスあたりで同時に実行するジョブの数（超えた分は順番待ちになる）
+BACKGROUND_JOB_THREADS = int(os.getenv('BACKGROUND_JOB_THREADS', '8'))
+# ジョブの実行中・中止要求の印を保持する上限（秒）
+JOB_STATE_TTL = 3600
+# 終了したジョブを実行中とみなし続ける時間（秒）。結果の確認と終了の確認の間に終了したジョブの結果を取りこぼさない
+JOB_FINISH_GRACE = 10
+
+
+class JobCancelled(Exception):
+    """中止されたジョブが進捗・結果を書き込もうとしたときに送出し、コールバックの処理を打ち切る"""
+
+
+class _JobResultCache:
+    """ジョブが進捗・結果を書き込むキャッシュ（中止されたジョブの書き込みは行わずに JobCancelled を送出する）"""
+    
+    def __init__(self, manager: 'ThreadJobManager'):
+        self._manager = manager
+    
+    def set(self, key, value, *args, **kwargs):
+        job = self._manager.current_job()
+        if job is not None and self._manager.is_cancelled(job):
+            raise JobCancelled(job)
+        return self._manager.handle.set(key, value, *args, **kwargs)
+
+
+class ThreadJobManager(DiskcacheManager):
+    """
+    バックグラウンドコールバックのジョブをワーカープロセス内のスレッドで実行するジョブマネージャー
+    
+    DiskcacheManager はジョブごとにサーバーのプロセスを fork するため、他のスレッドが SQLite などの
+    ロックを保持したまま複製されたジョブが止まることがあり、ジョブ内で作ったキャッシュ・接続も
+    ジョブの終了とともに失われる。ここではジョブをサーバーと同じプロセスのスレッドプールで実行し、
+    結果・進捗・実行中かどうかは diskcache に保存して、どのワーカーへのポーリングにも応答できるようにする。
+    
+    スレッドは外から停止できないため、中止されたジョブは次に進捗・結果を書き込む時点で打ち切る。
+    結果のキーは呼び出しごとに異なるものにし、同時に実行された他のユーザーのジョブの結果と混ざらないようにする。
+    """
+    
+    def __init__(self, cache=None, max_workers: int = BACKGROUND_JOB_THREADS):
+        """
+        Args:
+            cache: 結果を保存する diskcache.Cache
+            max_workers: 同時に実行するジョブの数
+        """
+        super().__init__(cache)
+        self.max_workers = max_workers
+        self._job_cache = _JobResultCache(self)
+        self._job_ids = itertools.count(1)
+        self._current = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='background-job')
+        register_fork_reset(self)
+    
+    def _reset_after_fork(self):
+        """fork したワーカーではスレッドプールとジョブ番号を作り直す（ジョブIDにはワーカーのPIDを含む）"""
+        self._job_ids = itertools.count(1)
+        self._current = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='background-job')
+    
+    def current_job(self):
+        """実行中のスレッドのジョブID（ジョブのスレッド以外ではNone）"""
+        return getattr(self._current, 'job', None)
+    
+    def is_cancelled(self, job) -> bool:
+        return self.handle.get(self._cancel_key(job)) is not None
+    
+    def build_cache_key(self, fn, args, cache_args_to_ignore, triggered):
+        """
+        ジョブの結果を保存するキー
+        
+        引数だけから作るキーでは、同じ入力（n_clicks など）で同時に実行された別のユーザー・タブのジョブと
+        キーが重なり、先にポーリングした側が他方の結果を受け取ってしまう。結果を再利用しない（cache_by なし）
+        場合は呼び出しごとに異なるキーにする。
+        """
+        key = super().build_cache_key(fn, args, cache_args_to_ignore, triggered)
+        if self.cache_by is None:
+            key = f"{key}-{uuid.uuid4().hex}"
+        return key
+    
+    def make_job_fn(self, fn, progress, key=None):
+        """進捗・結果の書き込みで中止を確認するジョブの関数を作成"""
+        if _make_job_fn is None:
+            return super().make_job_fn(fn, progress, key)
+        return _make_job_fn(fn, self._job_cache, progress)
+    
+    def call_job_fn(self, key, job_fn, args, context):
+        """ジョブをスレッドプールに追加し、ジョブID（<PID>-<連番>）を返す"""
+        job = f"{os.getpid()}-{next(self._job_ids)}"
+        self.handle.set(self._running_key(job), True, expire=JOB_STATE_TTL)
+        self._executor.submit(self._run_job, job, job_fn, key, args, context)
+        return job
+    
+    def _run_job(self, job, job_fn, key, args, context):
+        self._current.job = job
+        try:
+            if not self.is_cancelled(job):
+                job_fn(key, self._make_progress_key(key), args, context)
+        except JobCancelled:
+            logger.info(f"中止されたジョブを打ち切りました: {job}")
+        except Exception as e:
+            logger.error(f"バックグラウンドジョブのエラー ({job}): {e}")
+        finally:
+            self._current.job = None
+            self.handle.set(self._running_key(job), True, expire=JOB_FINISH_GRACE)
+    
+    def terminate_job(self, job):
+        """ジョブに中止を要求（実行中のジョブのみ）"""
+        if job is None:
+            return
+        if self.handle.get(self._running_key(job)) is not None:
+            self.handle.set(self._cancel_key(job), True, expire=JOB_STATE_TTL)
+    
+    def terminate_unhealthy_job(self, job):
+        """ジョブを実行していたワーカーが終了していれば、実行中の印を消す"""
+        if job is None or self._worker_alive(job):
+            return False
+        self.handle.delete(self._running_key(job))
+        return True
+    
+    def job_running(self, job):
+        if job is None:
+            return False
+        return (self.handle.get(self._running_key(job)) is not None
+                and not self.is_cancelled(job)
+                and self._worker_alive(job))
+    
+    def _worker_alive(self, job) -> bool:
+        """ジョブを実行しているワーカープロセスが動作中か（別のワーカーへのポーリングでも判定できる）"""
+        try:
+            pid = int(str(job).split('-', 1)[0])
+            os.kill(pid, 0)
+            return True
+        except (ValueError, ProcessLookupError):
+            return False
+        except PermissionError:
+            return True
+    
+    @staticmethod
+    def _running_key(job) -> str:
+        return f"job-running-{job}"
+    
+    @staticmethod
+    def _cancel_key(job) -> str:
+        return f"job-cancel-{job}"
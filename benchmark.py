@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+ベンチマーク（指標の計算・グラフの作成・ニュースの描画・NewsAPI へのリクエスト・バックグラウンドジョブ・お気に入りのSQL）
+
+外部のネットワークを使わず、乱数の種を固定した合成データで計測する。
+NewsAPI へのリクエストはローカルで起動した負荷試験用の代替サーバーに送る。
+お気に入りのSQLは BENCH_DATABASE_URL（計測用のPostgreSQL）が指定された場合のみ計測する。
+
+使い方:
+    python benchmark.py run [--output FILE] [--quick] [--only 名前の一部 ...]
+    python benchmark.py compare 基準.json 比較.json [--threshold 0.1]
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import shutil
+import timeit
+import importlib.util
+import tempfile
+import platform
+import argparse
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 計測用の一時ファイルを使い、プロファイルは取得しない（アプリのモジュールのimport前に設定する）
+_WORK_DIR = tempfile.mkdtemp(prefix='stock_benchmark_')
+atexit.register(shutil.rmtree, _WORK_DIR, ignore_errors=True)
+os.environ['STOCK_CACHE_PATH'] = os.path.join(_WORK_DIR, 'stock_cache.sqlite3')
+os.environ['NEWS_CACHE_PATH'] = os.path.join(_WORK_DIR, 'news_cache.sqlite3')
+os.environ['BACKGROUND_CACHE_DIR'] = os.path.join(_WORK_DIR, 'background')
+os.environ['STOCK_APP_PROFILE'] = 'off'
+
+import numpy as np
+import pandas as pd
+
+# 結果ファイルの形式の版
+RESULT_FORMAT_VERSION = 1
+# 結果の保存先（--output の未指定時）
+DEFAULT_OUTPUT_DIR = 'benchmark_results'
+# 計測する系列の長さ（約1年・5年・20年の営業日）
+SERIES_LENGTHS = [252, 1260, 5040]
+# グラフを作成する銘柄数
+CHART_SYMBOL_COUNTS = [1, 5, 10, 25, 50]
+# ニュースの記事数
+NEWS_ARTICLE_COUNTS = [15, 100]
+# お気に入りのSQLで登録する銘柄数
+FAVORITES_SQL_COUNT = 50
+# 計測の繰り返し回数（--quick の場合は QUICK_ROUNDS）
+ROUNDS = 7
+QUICK_ROUNDS = 3
+# 比較で遅くなったとみなす割合のデフォルト（中央値が10%以上増えたら回帰）
+DEFAULT_THRESHOLD = 0.10
+# 合成データの乱数の種
+SEED = 42
+
+
+def make_price_data(length: int, seed: int = SEED) -> pd.DataFrame:
+    """yfinance の history と同じ形式の合成株価データ（ランダムウォーク）"""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end='2026-01-02', periods=length, tz='America/New_York')
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, length)))
+    open_ = close * (1 + rng.normal(0, 0.003, length))
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.004, length))),
+        'Low': np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.004, length))),
+        'Close': close,
+        'Volume': rng.integers(1_000_000, 50_000_000, length),
+        'Dividends': 0.0,
+        'Stock Splits': 0.0
+    }, index=index)
+
+
+def make_articles(count: int) -> List[Dict]:
+    """NewsAPI の記事を整形したものと同じ形式の合成記事"""
+    articles = []
+    for i in range(count):
+        symbol = f"SYN{i % 10:02d}"
+        articles.append({
+            'id': f"article-{i}",
+            'title': f"{symbol} の決算発表 {i}: 売上高は市場予想を上回る",
+            'description': "合成記事の説明文です。" * 12,
+            'url': f"https://example.com/news/{i}",
+            'publishedAt': f"2026-01-{i % 28 + 1:02d}T09:00:00Z",
+            'formatted_date': f"2026-01-{i % 28 + 1:02d} 09:00",
+            'symbol': symbol,
+            'symbols': [symbol],
+            'sentiment': round(float(np.sin(i)), 3)
+        })
+    return articles
+
+
+def measure(func: Callable[[], object], rounds: int) -> Dict:
+    """1回あたりの所要時間（秒）の統計（1ラウンドが0.2秒以上になるよう回数を調整する）"""
+    func()  # ウォームアップ
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    timings = [total / number for total in timer.repeat(repeat=rounds, number=number)]
+    return {
+        'median': statistics.median(timings),
+        'min': min(timings),
+        'mean': statistics.mean(timings),
+        'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'rounds': rounds,
+        'number': number
+    }
+
+
+# ベンチマーク名と計測する関数の組
+Benchmark = Tuple[str, Callable[[], object]]
+
+_app = None
+
+
+def _get_app():
+    """計測用のアプリ（グラフ・ニュースのベンチマークで共有する）"""
+    global _app
+    if _app is None:
+        import web_app
+        
+        # ジョブのスレッドへの受け渡しやポーリングではなくコールバックの処理を計測するため、同期実行にする
+        web_app.create_background_callback_manager = lambda: None
+        _app = web_app.StockChartWebApp()
+    return _app
+
+
+def indicator_benchmarks() -> List[Benchmark]:
+    """移動平均・ボリンジャーバンドの計算"""
+    from stock_data import StockDataManager
+    manager = StockDataManager()
+    benchmarks = []
+    for length in SERIES_LENGTHS:
+        data = make_price_data(length)
+        benchmarks.append((f"indicators.moving_average[{length}]",
+                           lambda data=data: manager.calculate_moving_average(data, 20)))
+        benchmarks.append((f"indicators.bollinger_bands[{length}]",
+                           lambda data=data: manager.calculate_bollinger_bands(data, 20, 2)))
+    return benchmarks
+
+
+def _chart_request_body(app, symbols: List[str], period: str) -> Dict:
+    """グラフの表示ボタンを押したときの update_chart のリクエスト"""
+    output = next(key for key in app.app.callback_map if key.startswith('..stock-chart.figure...status-message'))
+    states = [[{'id': {'type': 'stock-input', 'index': 0}, 'property': 'value', 'value': ','.join(symbols)}]]
+    states += [{'id': component_id, 'property': prop, 'value': value} for component_id, prop, value in [
+        ('period-selector', 'value', period),
+        ('ma-checkbox', 'value', ['show']),
+        ('ma-period', 'value', 20),
+        ('bb-checkbox', 'value', ['show']),
+        ('bb-period', 'value', 20),
+        ('bb-std', 'value', 2),
+        ('sentiment-checkbox', 'value', []),
+        ('figure-key', 'data', None)
+    ]]
+    return {
+        'output': output,
+        'outputs': [{'id': component_id, 'property': prop} for component_id, prop in [
+            ('stock-chart', 'figure'), ('status-message', 'children'), ('chart-state', 'data'), ('figure-key', 'data'),
+            ('cached-figure', 'data')
+        ]],
+        'inputs': [
+            {'id': 'update-button', 'property': 'n_clicks', 'value': 1},
+            {'id': 'live-checkbox', 'property': 'value', 'value': []},
+            {'id': 'missing-figure', 'property': 'data', 'value': None}
+        ],
+        'state': states,
+        'changedPropIds': ['update-button.n_clicks']
+    }
+
+
+def chart_benchmarks() -> List[Benchmark]:
+    """update_chart コールバックでのグラフの作成（データ取得はキャッシュから、グラフのキャッシュは使わない）"""
+    app = _get_app()
+    app.figure_cache.ttl = 0
+    client = app.app.server.test_client()
+    client.get('/')
+    
+    period = '1y'
+    symbols = [f"SYN{i:02d}" for i in range(max(CHART_SYMBOL_COUNTS))]
+    cache = app.stock_manager.cache
+    for i, symbol in enumerate(symbols):
+        cache.set(f"{symbol}_{period}", make_price_data(SERIES_LENGTHS[0], SEED + i), 24 * 60 * 60)
+        cache.set(f"info_{symbol}", {'symbol': symbol, 'shortName': f"Synthetic {symbol}"}, 24 * 60 * 60)
+    
+    def build(body: Dict):
+        response = client.post('/_dash-update-component', json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"update_chart が失敗しました: HTTP {response.status_code}")
+        return response
+    
+    benchmarks = []
+    for count in CHART_SYMBOL_COUNTS:
+        body = _chart_request_body(app, symbols[:count], period)
+        benchmarks.append((f"chart.update_chart[{count}]", lambda body=body: build(body)))
+    return benchmarks
+
+
+def news_benchmarks() -> List[Benchmark]:
+    """ニュース欄の描画とテキスト形式への整形"""
+    app = _get_app()
+    news_manager = app.stock_manager.news_manager
+    benchmarks = []
+    for count in NEWS_ARTICLE_COUNTS:
+        articles = make_articles(count)
+        benchmarks.append((f"news.render_news_list[{count}]", lambda articles=articles: app.render_news_list(articles)))
+        benchmarks.append((f"news.format_news_for_display[{count}]",
+                           lambda articles=articles, count=count: news_manager.format_news_for_display(
+                               articles, page=1, per_page=count)))
+    return benchmarks
+
+
+def favorites_sql_benchmarks() -> Iterable[Benchmark]:
+    """お気に入りのSQL（BENCH_DATABASE_URL のデータベースに計測用のユーザーで登録し、計測後に削除する）"""
+    os.environ['DATABASE_URL'] = os.environ['BENCH_DATABASE_URL']
+    from database import DatabaseManager
+    
+    db = DatabaseManager(max_favorites=FAVORITES_SQL_COUNT)
+    # 読み込みの計測用（登録済み）と登録・削除の計測用のユーザー
+    reader_id = f"benchmark-reader-{os.getpid()}"
+    writer_id = f"benchmark-writer-{os.getpid()}"
+    entries = [(f"SYN{i:02d}", f"Synthetic SYN{i:02d}") for i in range(FAVORITES_SQL_COUNT)]
+    
+    def add_and_remove():
+        db.add_favorite_stocks(entries, writer_id)
+        for symbol, _ in entries:
+            db.remove_favorite_stock(symbol, writer_id)
+    
+    db.add_favorite_stocks(entries, reader_id)
+    try:
+        yield f"favorites_sql.add_remove[{FAVORITES_SQL_COUNT}]", add_and_remove
+        yield f"favorites_sql.get_favorite_stocks[{FAVORITES_SQL_COUNT}]", lambda: db.get_favorite_stocks(reader_id)
+        yield "favorites_sql.is_favorite", lambda: db.is_favorite(entries[-1][0], reader_id)
+        yield "favorites_sql.get_favorites_count", lambda: db.get_favorites_count(reader_id)
+        yield "favorites_sql.get_all_favorite_symbols", db.get_all_favorite_symbols
+    finally:
+        for user_id in (reader_id, writer_id):
+            for symbol, _ in entries:
+                db.remove_favorite_stock(symbol, user_id)
+        db.close()
+
+
+def newsapi_http_benchmarks() -> List[Benchmark]:
+    """NewsAPI への1リクエストの所要時間（負荷試験の代替サーバーに対して、接続を使い回す場合と毎回接続する場合）"""
+    os.environ['LOADTEST_NEWS_LATENCY'] = '0'
+    from loadtest import start_news_stand_in
+    from news_api import NewsAPIClient
+    
+    url = f"{start_news_stand_in()}/everything"
+    params = {'q': '"Apple" OR "AAPL"', 'language': 'en', 'sortBy': 'publishedAt', 'pageSize': 10}
+    reused = NewsAPIClient()
+    fresh = NewsAPIClient()
+    
+    def with_new_connection():
+        fresh.session = fresh._create_session()
+        try:
+            return fresh._get_json(url, params)
+        finally:
+            fresh.session.close()
+    
+    return [
+        ("newsapi_http.get_json[session_reuse]", lambda: reused._get_json(url, params)),
+        ("newsapi_http.get_json[new_connection]", with_new_connection),
+    ]
+
+
+def background_job_benchmarks() -> List[Benchmark]:
+    """バックグラウンドコールバックのジョブを開始して結果を受け取るまで（ThreadJobManager と一時ディレクトリの diskcache）"""
+    import diskcache
+    from background_jobs import ThreadJobManager
+    
+    manager = ThreadJobManager(diskcache.Cache(os.path.join(_WORK_DIR, 'background_jobs')))
+    
+    def double(set_progress, value):
+        set_progress(f"{value} を処理中")
+        return value * 2
+    
+    job_fn = manager.make_job_fn(double, progress=True)
+    
+    def run_job():
+        # アプリのポーリングと同じく、結果が書き込まれるまでジョブが実行中であることを確認しながら待つ
+        key = manager.build_cache_key(double, [21], [], [])
+        job = manager.call_job_fn(key, job_fn, [21], {})
+        while not manager.result_ready(key):
+            if not manager.job_running(job):
+                raise RuntimeError(f"ジョブ {job} が結果を書き込まずに終了しました")
+            time.sleep(0.001)
+        result = manager.get_result(key, job)
+        if result != 42:
+            raise RuntimeError(f"ジョブ {job} の結果が正しくありません: {result!r}")
+        return result
+    
+    return [("background_jobs.round_trip", run_job)]
+
+
+# グループ名 -> (ベンチマークを作成する関数, 計測しない理由を返す関数)
+BENCHMARK_GROUPS = {
+    'indicators': (indicator_benchmarks, lambda: None),
+    'chart': (chart_benchmarks, lambda: None),
+    'news': (news_benchmarks, lambda: None),
+    'newsapi_http': (newsapi_http_benchmarks, lambda: None),
+    'background_jobs': (background_job_benchmarks,
+                        lambda: None if importlib.util.find_spec('diskcache') else "diskcache が無い（uv sync --extra background）"),
+    'favorites_sql': (favorites_sql_benchmarks,
+                      lambda: None if os.getenv('BENCH_DATABASE_URL') else "BENCH_DATABASE_URL が未指定"),
+}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(only: List[str] = None, rounds: int = ROUNDS) -> Dict:
+    """ベンチマークを実行して結果を返す"""
+    results = {}
+    skipped = {}
+    for group, (factory, skip_reason) in BENCHMARK_GROUPS.items():
+        reason = skip_reason()
+        if reason:
+            skipped[group] = reason
+            print(f"{group}: スキップ（{reason}）")
+            continue
+        for name, func in factory():
+            if only and not any(pattern in name for pattern in only):
+                continue
+            results[name] = measure(func, rounds)
+            print(f"{name:<48} {results[name]['median'] * 1000:10.3f} ms"
+                  f"  (min {results[name]['min'] * 1000:.3f} ms, {results[name]['number']}回 x {rounds})")
+    return {
+        'version': RESULT_FORMAT_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+        'skipped': skipped
+    }
+
+
+def compare_results(base: Dict, new: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """
+    2回の結果の中央値を比較して表示する
+    
+    Returns:
+        List[str]: threshold 以上遅くなったベンチマークの名前
+    """
+    regressions = []
+    print(f"基準: {base.get('git_commit') or '-'} ({base.get('created_at')})")
+    print(f"比較: {new.get('git_commit') or '-'} ({new.get('created_at')})")
+    print(f"{'ベンチマーク':<42} {'基準(ms)':>10} {'比較(ms)':>10} {'変化':>8}")
+    for name in sorted(set(base['results']) | set(new['results'])):
+        if name not in new['results'] or name not in base['results']:
+            print(f"{name:<48} {'（片方のみ）':>30}")
+            continue
+        before = base['results'][name]['median']
+        after = new['results'][name]['median']
+        change = after / before - 1 if before else 0.0
+        mark = ''
+        if change >= threshold:
+            mark = '  回帰'
+            regressions.append(name)
+        elif change <= -threshold:
+            mark = '  改善'
+        print(f"{name:<48} {before * 1000:10.3f} {after * 1000:10.3f} {change:+8.1%}{mark}")
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="株価チャートアプリのベンチマーク")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    run_parser = subparsers.add_parser('run', help="ベンチマークを実行して結果をJSONで保存")
+    run_parser.add_argument('--output', help=f"結果のファイル（デフォルト: {DEFAULT_OUTPUT_DIR}/<日時>.json）")
+    run_parser.add_argument('--quick', action='store_true', help=f"繰り返し回数を {QUICK_ROUNDS} 回に減らす")
+    run_parser.add_argument('--only', nargs='+', help="名前に指定の文字列を含むベンチマークだけを実行")
+    
+    compare_parser = subparsers.add_parser('compare', help="2回の結果を比較（回帰がある場合は終了コード1）")
+    compare_parser.add_argument('base', help="基準の結果ファイル")
+    compare_parser.add_argument('new', help="比較する結果ファイル")
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help=f"回帰とみなす中央値の増加率（デフォルト: {DEFAULT_THRESHOLD}）")
+    args = parser.parse_args(argv)
+    
+    if args.command == 'run':
+        result = run_benchmarks(args.only, QUICK_ROUNDS if args.quick else ROUNDS)
+        output = args.output or os.path.join(DEFAULT_OUTPUT_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"結果を保存しました: {output}")
+        return 0
+    
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+    regressions = compare_results(base, new, args.threshold)
+    if regressions:
+        print(f"{len(regressions)}件のベンチマークが {args.threshold:.0%} 以上遅くなりました: {', '.join(regressions)}")
+        return 1
+    print("回帰はありません")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
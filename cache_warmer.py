@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dtime, timedelta, timezone
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+from zoneinfo import ZoneInfo
+import logging
+
+from fork_safety import register_fork_reset
+
+try:
+    import fcntl
+except ImportError:
+    # Windows ではワーカー間の排他を行わない（単一プロセスで動かす想定）
+    fcntl = None
+
+if TYPE_CHECKING:
+    from stock_data import StockDataManager
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 取引所 -> (タイムゾーン, 取引開始時刻, 取引終了時刻)。祝日は考慮しない
+MARKET_HOURS = {
+    'US': ('America/New_York', dtime(9, 30), dtime(16, 0)),
+    'JP': ('Asia/Tokyo', dtime(9, 0), dtime(15, 30)),
+    'HK': ('Asia/Hong_Kong', dtime(9, 30), dtime(16, 0)),
+    'GB': ('Europe/London', dtime(8, 0), dtime(16, 30)),
+    'DE': ('Europe/Berlin', dtime(9, 0), dtime(17, 30)),
+}
+# 銘柄コードの接尾辞 -> 取引所（接尾辞のない銘柄は米国市場とみなす）
+SYMBOL_SUFFIX_MARKETS = {'.T': 'JP', '.HK': 'HK', '.L': 'GB', '.DE': 'DE', '.F': 'DE'}
+
+# 事前取得する期間（カンマ区切り、デフォルトは画面の初期値の1年）
+WARMUP_PERIODS = [period.strip() for period in os.getenv('WARMUP_PERIODS', '1y').split(',') if period.strip()]
+# 事前取得の同時取得数（画面からの取得の分を残すため MAX_FETCH_WORKERS より少なくする）
+WARMUP_MAX_WORKERS = 4
+# 取引終了から再取得までの待ち時間（終値が確定するのを待つ）
+WARMUP_CLOSE_DELAY = timedelta(minutes=30)
+# 事前取得するニュースの銘柄あたりの記事数（ニュース欄と同じ）
+WARMUP_NEWS_PAGE_SIZE = 10
+# 他のワーカーが事前取得を担当している場合に、担当を引き継げるか確認する間隔（秒）
+WARMUP_LOCK_RETRY = 60
+# 事前取得の状況を保存する共有キャッシュのキーと保持期間（秒）
+WARMUP_STATUS_KEY = 'cache_warmup_status'
+WARMUP_STATUS_TTL = 7 * 24 * 60 * 60
+
+
+def market_for_symbol(symbol: str) -> str:
+    """銘柄コードから取引所を判定"""
+    for suffix, market in SYMBOL_SUFFIX_MARKETS.items():
+        if symbol.upper().endswith(suffix):
+            return market
+    return 'US'
+
+
+def _next_session_time(market: str, now: datetime, closing: bool) -> datetime:
+    """now より後の最初の平日の取引開始（closing=True の場合は取引終了）時刻"""
+    tz_name, open_time, close_time = MARKET_HOURS[market]
+    tz = ZoneInfo(tz_name)
+    local_now = now.astimezone(tz)
+    for days in range(8):
+        day = local_now.date() + timedelta(days=days)
+        candidate = datetime.combine(day, close_time if closing else open_time, tzinfo=tz)
+        if day.weekday() < 5 and candidate > local_now:
+            return candidate
+    raise ValueError(f"取引時間を計算できません: {market}")
+
+
+def next_market_close(market: str, now: datetime = None) -> datetime:
+    """次の取引終了時刻"""
+    return _next_session_time(market, now or datetime.now(timezone.utc), closing=True)
+
+
+def next_market_open(market: str, now: datetime = None) -> datetime:
+    """次の取引開始時刻"""
+    return _next_session_time(market, now or datetime.now(timezone.utc), closing=False)
+
+
+def is_market_open(market: str, now: datetime = None) -> bool:
+    """取引時間中かどうか"""
+    now = now or datetime.now(timezone.utc)
+    # 次の取引終了が次の取引開始より先なら取引時間中
+    return next_market_close(market, now) < next_market_open(market, now)
+
+
+class CacheWarmer:
+    """
+    お気に入り銘柄の株価データ・会社情報・ニュースを事前に取得してキャッシュしておく
+    
+    起動時に全銘柄を取得し、その後は取引所ごとの取引終了（WARMUP_CLOSE_DELAY 後）に
+    その取引所の銘柄を取得し直す。取引時間外に取得したデータは次の取引開始までキャッシュする。
+    本番モードの複数ワーカーでは、ロックファイルを取得した1つのワーカーだけが取得し、
+    進捗は共有キャッシュに保存してどのワーカーからも表示できるようにする。
+    """
+    
+    def __init__(self, stock_manager: StockDataManager, symbols_provider: Callable[[], List[str]] = None,
+                 periods: List[str] = None, max_workers: int = WARMUP_MAX_WORKERS, lock_path: str = None):
+        """
+        Args:
+            stock_manager: 取得・キャッシュに使うデータマネージャー
+            symbols_provider: 事前取得する銘柄のリストを返す関数（未指定時は全ユーザーのお気に入り銘柄）
+            periods: 事前取得する期間のリスト
+            max_workers: 同時取得数の上限
+            lock_path: 担当ワーカーを決めるロックファイルのパス（未指定時は環境変数 WARMUP_LOCK_PATH、デフォルト: cache_warmup.lock）
+        """
+        self.stock_manager = stock_manager
+        self.symbols_provider = symbols_provider or stock_manager.get_all_favorite_symbols
+        self.periods = periods or WARMUP_PERIODS
+        self.max_workers = max_workers
+        self.lock_path = lock_path or os.getenv('WARMUP_LOCK_PATH', 'cache_warmup.lock')
+        
+        self._lock_file = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        register_fork_reset(self)
+    
+    def start(self):
+        """事前取得を開始（起動時の取得の後、取引終了ごとに取得し直す）"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='cache-warmer', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """事前取得を停止"""
+        self._stop_event.set()
+    
+    def get_status(self) -> Optional[Dict]:
+        """
+        事前取得の状況を取得（まだ一度も実行していない場合はNone）
+        
+        Returns:
+            Dict: state（'running', 'done'）, market, total, completed, failed, started_at, finished_at, next_runs
+        """
+        return self.stock_manager.cache.get(WARMUP_STATUS_KEY)
+    
+    def warm(self, symbols: List[str], market: str = None, next_runs: Dict[str, str] = None) -> Dict:
+        """
+        指定された銘柄の株価データ・会社情報・ニュースを取得してキャッシュする
+        
+        Args:
+            symbols: 銘柄コードのリスト
+            market: 取引終了後の再取得の場合は取引所（起動時の取得ではNone）
+            next_runs: 次回の再取得の予定（取引所 -> ISO形式の日時）
+        
+        Returns:
+            Dict: 事前取得の状況
+        """
+        status = {
+            'state': 'running',
+            'market': market,
+            'total': len(symbols),
+            'completed': 0,
+            'failed': [],
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'finished_at': None,
+            'next_runs': next_runs or {}
+        }
+        self._save_status(status)
+        
+        def warm_symbol(symbol: str) -> bool:
+            ttl = self._cache_ttl(market_for_symbol(symbol))
+            fetched = [self.stock_manager.refresh_stock_data(symbol, period, ttl) is not None
+                       for period in self.periods]
+            self.stock_manager.get_company_info(symbol)
+            return all(fetched)
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(symbols)))) as executor:
+            for symbol, succeeded in zip(symbols, executor.map(warm_symbol, symbols)):
+                status['completed'] += 1
+                if not succeeded:
+                    status['failed'].append(symbol)
+                self._save_status(status)
+        
+        if symbols:
+            try:
+                # 期限切れ前の更新は NewsRefresher が行うため、ここでは未取得のものだけを取得させる
+                self.stock_manager.news_manager.prefetch_news(symbols, WARMUP_NEWS_PAGE_SIZE)
+            except Exception as e:
+                logger.error(f"ニュースの事前取得エラー: {e}")
+        
+        status.update(state='done', finished_at=datetime.now(timezone.utc).isoformat())
+        self._save_status(status)
+        logger.info(f"キャッシュを事前取得しました ({market or '起動時'}): "
+                    f"{status['completed'] - len(status['failed'])}/{status['total']} 銘柄")
+        return status
+    
+    def _run(self):
+        while not self._stop_event.is_set() and not self._acquire_lock():
+            # 他のワーカーが担当中（そのワーカーが終了したら引き継ぐ）
+            self._stop_event.wait(WARMUP_LOCK_RETRY)
+        if self._stop_event.is_set():
+            return
+        
+        symbols = self._get_symbols()
+        self._warm_safely(symbols, None, self._next_runs(symbols))
+        
+        while not self._stop_event.is_set():
+            next_runs = self._next_runs(self._get_symbols())
+            if not next_runs:
+                # お気に入り銘柄が登録されるまで待つ
+                self._stop_event.wait(WARMUP_LOCK_RETRY)
+                continue
+            
+            market, run_at = min(next_runs.items(), key=lambda item: item[1])
+            wait_seconds = (datetime.fromisoformat(run_at) - datetime.now(timezone.utc)).total_seconds()
+            if self._stop_event.wait(max(0.0, wait_seconds)):
+                return
+            
+            symbols = [symbol for symbol in self._get_symbols() if market_for_symbol(symbol) == market]
+            # 再取得中の取引所の次回は翌営業日の取引終了後
+            next_runs = self._next_runs(self._get_symbols())
+            self._warm_safely(symbols, market, next_runs)
+    
+    def _warm_safely(self, symbols: List[str], market: Optional[str], next_runs: Dict[str, str]):
+        try:
+            self.warm(symbols, market, next_runs)
+        except Exception as e:
+            logger.error(f"キャッシュの事前取得エラー: {e}")
+    
+    def _get_symbols(self) -> List[str]:
+        try:
+            return list(self.symbols_provider())
+        except Exception as e:
+            logger.error(f"事前取得する銘柄の取得エラー: {e}")
+            return []
+    
+    def _next_runs(self, symbols: List[str]) -> Dict[str, str]:
+        """銘柄のある取引所ごとの次回の再取得日時"""
+        now = datetime.now(timezone.utc)
+        return {
+            market: (next_market_close(market, now - WARMUP_CLOSE_DELAY) + WARMUP_CLOSE_DELAY)
+            .astimezone(timezone.utc).isoformat()
+            for market in sorted({market_for_symbol(symbol) for symbol in symbols})
+        }
+    
+    def _cache_ttl(self, market: str) -> Optional[float]:
+        """取引時間外は次の取引開始まで、取引時間中は通常の有効期間（None）でキャッシュする"""
+        if is_market_open(market):
+            return None
+        return max(0.0, (next_market_open(market) - datetime.now(timezone.utc)).total_seconds())
+    
+    def _save_status(self, status: Dict):
+        self.stock_manager.cache.set(WARMUP_STATUS_KEY, dict(status, failed=list(status['failed'])),
+                                     WARMUP_STATUS_TTL)
+    
+    def _acquire_lock(self) -> bool:
+        """担当ワーカーのロックを取得（取得できた場合はプロセス終了まで保持する）"""
+        if fcntl is None or self._lock_file is not None:
+            return True
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+    
+    def _reset_after_fork(self):
+        """fork した子プロセスでは事前取得は動かず、ロックも担当しない（開始は post_fork で改めて行う）"""
+        if self._lock_file is not None:
+            # 子プロセスの複製を閉じても親プロセスのロックは解除されない
+            self._lock_file.close()
+            self._lock_file = None
+        self._thread = None
@@ -1,103 +1,209 @@
 import os
+import uuid
+import threading
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor, execute_values
 from typing import List, Dict, Optional
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import logging
+from fork_safety import keep_inherited, register_fork_reset
+from metrics import metrics
+from shared_cache import SharedDataCache
 
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# ユーザーIDが指定されない場合（単一ユーザー運用・既存データ）のユーザーID
+DEFAULT_USER_ID = 'default'
+
+# 共有キャッシュに保存するお気に入り一覧の版の保持期間（秒）。期限切れ後は各ワーカーが一覧を取得し直す
+FAVORITES_VERSION_TTL = 24 * 60 * 60
+
+
+def get_favorites_limit() -> int:
+    """ユーザーあたりのお気に入り銘柄の上限（環境変数 FAVORITES_LIMIT、デフォルト: 10）"""
+    try:
+        return int(os.getenv('FAVORITES_LIMIT', '10'))
+    except ValueError:
+        logger.warning("FAVORITES_LIMIT が不正な値のため 10 を使用します")
+        return 10
+
+
+def resolve_user_id(user_id: Optional[str]) -> str:
+    """未指定（None/空文字）のユーザーIDを DEFAULT_USER_ID に解決"""
+    return user_id or DEFAULT_USER_ID
+
+
+class _TimedCursorMixin:
+    """クエリの実行時間をメトリクス（sql_query）に操作名（operation）ごとに記録するカーソル"""
+    
+    operation = 'unknown'
+    
+    def execute(self, query, vars=None):
+        with metrics.timer('sql_query', self.operation):
+            return super().execute(query, vars)
+
+
+class TimedCursor(_TimedCursorMixin, psycopg2.extensions.cursor):
+    pass
+
+
+class TimedRealDictCursor(_TimedCursorMixin, RealDictCursor):
+    pass
+
+
+def _timed_cursor(connection, operation: str, cursor_factory=TimedCursor):
+    """クエリの実行時間を operation（DatabaseManager のメソッド名）で記録するカーソルを作成"""
+    cursor = connection.cursor(cursor_factory=cursor_factory)
+    cursor.operation = operation
+    return cursor
+
 
 class DatabaseManager:
-    def __init__(self):
-        self.connection = None
-        self.connect()
-        self.create_tables()
+    def __init__(self, max_favorites: int = None):
+        self.max_favorites = max_favorites if max_favorites is not None else get_favorites_limit()
+        
+        # 接続とテーブル作成は初回アクセス時まで遅延させる
+        self._connection = None
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        register_fork_reset(self)
+    
+    def _reset_after_fork(self):
+        """fork した子プロセスでは親プロセスの接続を使わず、初回アクセス時に接続し直す"""
+        keep_inherited(self._connection)
+        self._connection = None
+        self._initialized = False
+        self._init_lock = threading.Lock()
+    
+    @property
+    def connection(self):
+        """データベース接続（初回アクセス時に接続・テーブル作成を行う）"""
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self.connect()
+                    self.create_tables()
+                    self._initialized = True
+        return self._connection
+    
+    @connection.setter
+    def connection(self, value):
+        self._connection = value
     
     def connect(self):
         """PostgreSQLデータベースに接続"""
         try:
             database_url = os.getenv('DATABASE_URL')
             if database_url:
-                self.connection = psycopg2.connect(database_url)
+                self._connection = psycopg2.connect(database_url, cursor_factory=TimedCursor)
             else:
-                self.connection = psycopg2.connect(
+                self._connection = psycopg2.connect(
                     host=os.getenv('DB_HOST', 'localhost'),
                     port=os.getenv('DB_PORT', '5432'),
                     database=os.getenv('DB_NAME', 'stock_analyzer'),
                     user=os.getenv('DB_USER', 'user'),
-                    password=os.getenv('DB_PASSWORD', 'password')
+                    password=os.getenv('DB_PASSWORD', 'password'),
+                    cursor_factory=TimedCursor
                 )
             logger.info("データベース接続が成功しました")
         except Exception as e:
             logger.error(f"データベース接続エラー: {e}")
-            self.connection = None
+            self._connection = None
     
     def create_tables(self):
         """必要なテーブルを作成"""
-        if not self.connection:
+        if not self._connection:
             logger.error("データベース接続がありません")
             return
         
         try:
-            cursor = self.connection.cursor()
+            cursor = _timed_cursor(self._connection, 'create_tables')
             
-            # お気に入り銘柄テーブル
+            # お気に入り銘柄テーブル（ユーザーごと）
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS favorite_stocks (
                     id SERIAL PRIMARY KEY,
-                    symbol VARCHAR(20) NOT NULL UNIQUE,
+                    user_id VARCHAR(64) NOT NULL DEFAULT 'default',
+                    symbol VARCHAR(20) NOT NULL,
                     company_name VARCHAR(100),
                     added_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
             
-            self.connection.commit()
+            # 単一ユーザー版のテーブルからの移行（既存の銘柄は default ユーザーに属する）
+            cursor.execute("""
+                ALTER TABLE favorite_stocks
+                ADD COLUMN IF NOT EXISTS user_id VARCHAR(64) NOT NULL DEFAULT 'default'
+            """)
+            cursor.execute("ALTER TABLE favorite_stocks DROP CONSTRAINT IF EXISTS favorite_stocks_symbol_key")
+            
+            # ユーザー単位の検索・重複チェック・一覧取得用のインデックス
+            cursor.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_favorite_stocks_user_symbol
+                ON favorite_stocks (user_id, symbol)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_favorite_stocks_user_added
+                ON favorite_stocks (user_id, added_date)
+            """)
+            # 全ユーザーのお気に入り銘柄一覧（重複なし）の取得用のインデックス
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_favorite_stocks_symbol
+                ON favorite_stocks (symbol)
+            """)
+            
+            self._connection.commit()
             cursor.close()
             logger.info("テーブル作成が完了しました")
             
         except Exception as e:
             logger.error(f"テーブル作成エラー: {e}")
-            if self.connection:
-                self.connection.rollback()
+            if self._connection:
+                self._connection.rollback()
     
-    def add_favorite_stock(self, symbol: str, company_name: str = None) -> bool:
+    def add_favorite_stock(self, symbol: str, company_name: str = None,
+                           user_id: str = DEFAULT_USER_ID) -> bool:
         """お気に入り銘柄を追加"""
         if not self.connection:
             logger.error("データベース接続がありません")
             return False
         
         try:
-            cursor = self.connection.cursor()
+            cursor = _timed_cursor(self.connection, 'add_favorite_stock')
             
             # 現在の銘柄数をチェック
-            cursor.execute("SELECT COUNT(*) FROM favorite_stocks")
+            cursor.execute("SELECT COUNT(*) FROM favorite_stocks WHERE user_id = %s", (user_id,))
             count = cursor.fetchone()[0]
             
-            if count >= 10:
-                logger.warning("お気に入り銘柄は最大10個までです")
+            if count >= self.max_favorites:
+                logger.warning(f"お気に入り銘柄は最大{self.max_favorites}個までです (ユーザー: {user_id})")
                 cursor.close()
                 return False
             
             # 重複チェック
-            cursor.execute("SELECT symbol FROM favorite_stocks WHERE symbol = %s", (symbol,))
+            cursor.execute(
+                "SELECT 1 FROM favorite_stocks WHERE user_id = %s AND symbol = %s",
+                (user_id, symbol.upper())
+            )
             if cursor.fetchone():
-                logger.warning(f"銘柄 {symbol} は既にお気に入りに登録されています")
+                logger.warning(f"銘柄 {symbol} は既にお気に入りに登録されています (ユーザー: {user_id})")
                 cursor.close()
                 return False
             
             # 銘柄を追加
             cursor.execute(
-                "INSERT INTO favorite_stocks (symbol, company_name) VALUES (%s, %s)",
-                (symbol.upper(), company_name)
+                "INSERT INTO favorite_stocks (user_id, symbol, company_name) VALUES (%s, %s, %s)",
+                (user_id, symbol.upper(), company_name)
             )
             
             self.connection.commit()
             cursor.close()
-            logger.info(f"お気に入り銘柄 {symbol} を追加しました")
+            logger.info(f"お気に入り銘柄 {symbol} を追加しました (ユーザー: {user_id})")
             return True
             
         except (psycopg2.Error, psycopg2.IntegrityError) as e:
@@ -111,23 +217,84 @@ class DatabaseManager:
                 self.connection.rollback()
             return False
     
-    def remove_favorite_stock(self, symbol: str) -> bool:
+    def add_favorite_stocks(self, entries: List[tuple], user_id: str = DEFAULT_USER_ID) -> List[str]:
+        """
+        複数のお気に入り銘柄を1トランザクションで追加
+        
+        Args:
+            entries: (symbol, company_name) のリスト
+            user_id: ユーザーID
+        
+        Returns:
+            List[str]: 追加された銘柄コードのリスト（上限超過・重複の銘柄は含まれない）
+        """
+        if not entries:
+            return []
+        
+        if not self.connection:
+            logger.error("データベース接続がありません")
+            return []
+        
+        try:
+            cursor = _timed_cursor(self.connection, 'add_favorite_stocks')
+            
+            cursor.execute("SELECT COUNT(*) FROM favorite_stocks WHERE user_id = %s", (user_id,))
+            remaining = self.max_favorites - cursor.fetchone()[0]
+            if remaining <= 0:
+                logger.warning(f"お気に入り銘柄は最大{self.max_favorites}個までです (ユーザー: {user_id})")
+                cursor.close()
+                return []
+            
+            rows = [(user_id, symbol.upper(), company_name) for symbol, company_name in entries[:remaining]]
+            inserted = execute_values(
+                cursor,
+                """
+                INSERT INTO favorite_stocks (user_id, symbol, company_name) VALUES %s
+                ON CONFLICT (user_id, symbol) DO NOTHING
+                RETURNING symbol
+                """,
+                rows,
+                fetch=True
+            )
+            
+            self.connection.commit()
+            cursor.close()
+            
+            added = [row[0] for row in inserted]
+            logger.info(f"お気に入り銘柄 {len(added)} 件を一括追加しました (ユーザー: {user_id})")
+            return added
+            
+        except psycopg2.Error as e:
+            logger.error(f"お気に入り銘柄一括追加エラー: {e}")
+            if self.connection:
+                self.connection.rollback()
+            return []
+        except Exception as e:
+            logger.error(f"予期しないエラー (お気に入り銘柄一括追加): {e}")
+            if self.connection:
+                self.connection.rollback()
+            return []
+    
+    def remove_favorite_stock(self, symbol: str, user_id: str = DEFAULT_USER_ID) -> bool:
         """お気に入り銘柄を削除"""
         if not self.connection:
             logger.error("データベース接続がありません")
             return False
         
         try:
-            cursor = self.connection.cursor()
+            cursor = _timed_cursor(self.connection, 'remove_favorite_stock')
             
-            cursor.execute("DELETE FROM favorite_stocks WHERE symbol = %s", (symbol.upper(),))
+            cursor.execute(
+                "DELETE FROM favorite_stocks WHERE user_id = %s AND symbol = %s",
+                (user_id, symbol.upper())
+            )
             
             if cursor.rowcount > 0:
                 self.connection.commit()
-                logger.info(f"お気に入り銘柄 {symbol} を削除しました")
+                logger.info(f"お気に入り銘柄 {symbol} を削除しました (ユーザー: {user_id})")
                 result = True
             else:
-                logger.warning(f"銘柄 {symbol} はお気に入りに登録されていません")
+                logger.warning(f"銘柄 {symbol} はお気に入りに登録されていません (ユーザー: {user_id})")
                 result = False
             
             cursor.close()
@@ -144,20 +311,27 @@ class DatabaseManager:
                 self.connection.rollback()
             return False
     
-    def get_favorite_stocks(self) -> List[Dict[str, any]]:
+    def get_favorite_stocks(self, user_id: str = DEFAULT_USER_ID) -> List[Dict[str, any]]:
         """お気に入り銘柄一覧を取得"""
+        favorites = self.fetch_favorite_stocks(user_id)
+        return favorites if favorites is not None else []
+    
+    def fetch_favorite_stocks(self, user_id: str = DEFAULT_USER_ID) -> Optional[List[Dict[str, any]]]:
+        """お気に入り銘柄一覧を取得（取得に失敗した場合は登録なしと区別できるようNone）"""
         if not self.connection:
             logger.error("データベース接続がありません")
-            return []
+            return None
         
         try:
-            cursor = self.connection.cursor(cursor_factory=RealDictCursor)
+            cursor = _timed_cursor(self.connection, 'fetch_favorite_stocks', TimedRealDictCursor)
             
+            # idx_favorite_stocks_user_added により該当ユーザーの行のみを登録順に走査
             cursor.execute("""
                 SELECT symbol, company_name, added_date 
                 FROM favorite_stocks 
+                WHERE user_id = %s
                 ORDER BY added_date ASC
-            """)
+            """, (user_id,))
             
             favorites = cursor.fetchall()
             cursor.close()
@@ -166,24 +340,60 @@ class DatabaseManager:
             
         except psycopg2.Error as e:
             logger.error(f"お気に入り銘柄取得エラー: {e}")
-            return []
+            return None
         except Exception as e:
             logger.error(f"予期しないエラー (お気に入り銘柄取得): {e}")
-            return []
+            return None
     
-    def get_favorite_symbols(self) -> List[str]:
+    def get_favorite_symbols(self, user_id: str = DEFAULT_USER_ID) -> List[str]:
         """お気に入り銘柄のシンボル一覧を取得"""
-        favorites = self.get_favorite_stocks()
+        favorites = self.get_favorite_stocks(user_id)
         return [fav['symbol'] for fav in favorites]
     
-    def is_favorite(self, symbol: str) -> bool:
+    def get_all_favorite_symbols(self) -> List[str]:
+        """全ユーザーのお気に入り銘柄のシンボル一覧（重複なし）を取得"""
+        if not self.connection:
+            return []
+        
+        try:
+            cursor = _timed_cursor(self.connection, 'get_all_favorite_symbols')
+            # idx_favorite_stocks_symbol 上で次の銘柄へ順に読み飛ばす（同じ銘柄を登録したユーザーの行は読まない）
+            cursor.execute("""
+                WITH RECURSIVE symbols AS (
+                    (SELECT symbol FROM favorite_stocks ORDER BY symbol LIMIT 1)
+                    UNION ALL
+                    SELECT (
+                        SELECT f.symbol FROM favorite_stocks f
+                        WHERE f.symbol > s.symbol
+                        ORDER BY f.symbol LIMIT 1
+                    )
+                    FROM symbols s
+                    WHERE s.symbol IS NOT NULL
+                )
+                SELECT symbol FROM symbols WHERE symbol IS NOT NULL
+            """)
+            symbols = [row[0] for row in cursor.fetchall()]
+            cursor.close()
+            return symbols
+            
+        except psycopg2.Error as e:
+            logger.error(f"お気に入り銘柄一覧取得エラー: {e}")
+            return []
+        except Exception as e:
+            logger.error(f"予期しないエラー (お気に入り銘柄一覧取得): {e}")
+            return []
+    
+    def is_favorite(self, symbol: str, user_id: str = DEFAULT_USER_ID) -> bool:
         """指定された銘柄がお気に入りに登録されているかチェック"""
         if not self.connection:
             return False
         
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT 1 FROM favorite_stocks WHERE symbol = %s", (symbol.upper(),))
+            cursor = _timed_cursor(self.connection, 'is_favorite')
+            cursor.execute(
+                "SELECT 1 FROM favorite_stocks WHERE user_id = %s AND symbol = %s",
+                (user_id, symbol.upper())
+            )
             result = cursor.fetchone() is not None
             cursor.close()
             return result
@@ -195,14 +405,14 @@ class DatabaseManager:
             logger.error(f"予期しないエラー (お気に入りチェック): {e}")
             return False
     
-    def get_favorites_count(self) -> int:
+    def get_favorites_count(self, user_id: str = DEFAULT_USER_ID) -> int:
         """お気に入り銘柄の数を取得"""
         if not self.connection:
             return 0
         
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT COUNT(*) FROM favorite_stocks")
+            cursor = _timed_cursor(self.connection, 'get_favorites_count')
+            cursor.execute("SELECT COUNT(*) FROM favorite_stocks WHERE user_id = %s", (user_id,))
             count = cursor.fetchone()[0]
             cursor.close()
             return count
@@ -216,9 +426,9 @@ class DatabaseManager:
     
     def close(self):
         """データベース接続を閉じる"""
-        if self.connection:
-            self.connection.close()
-            self.connection = None
+        if self._connection:
+            self._connection.close()
+            self._connection = None
             logger.info("データベース接続を閉じました")
     
     def __del__(self):
@@ -227,41 +437,122 @@ class DatabaseManager:
 
 
 class FavoriteStockManager:
-    def __init__(self):
-        self.db = DatabaseManager()
+    """
+    お気に入り銘柄の追加・削除・一覧取得（一覧はユーザーごとにプロセス内でキャッシュする）
+    
+    変更時にはユーザーごとの版を共有キャッシュに書き込み、他のワーカープロセスは一覧の取得時に
+    キャッシュした時点の版と比べて、変更されていれば取得し直す。
+    """
+    
+    def __init__(self, max_favorites: int = None, cache_ttl: int = 60, shared_cache: SharedDataCache = None):
+        """
+        Args:
+            max_favorites: ユーザーあたりのお気に入り上限（未指定時は FAVORITES_LIMIT）
+            cache_ttl: ユーザーごとのお気に入り一覧キャッシュの有効期間（秒）
+            shared_cache: 一覧の版を共有するキャッシュ（未指定時は新たに開く）
+        """
+        self.db = DatabaseManager(max_favorites)
+        self.cache_ttl = cache_ttl
+        self.shared_cache = shared_cache if shared_cache is not None else SharedDataCache()
+        # user_id -> (取得時刻, 取得前に確認した版, お気に入り一覧)
+        self.cache = {}
+        self._cache_lock = threading.Lock()
     
-    def add_favorite(self, symbol: str, company_name: str = None) -> Dict[str, any]:
+    @property
+    def max_favorites(self) -> int:
+        """ユーザーあたりのお気に入り上限"""
+        return self.db.max_favorites
+    
+    def _invalidate(self, user_id: str):
+        """指定ユーザーのキャッシュを破棄し、共有キャッシュの版を更新して他のワーカーのキャッシュも無効にする"""
+        with self._cache_lock:
+            self.cache.pop(user_id, None)
+        self.shared_cache.set(self._version_key(user_id), uuid.uuid4().hex, FAVORITES_VERSION_TTL)
+    
+    @staticmethod
+    def _version_key(user_id: str) -> str:
+        return f"favorites_version_{user_id}"
+    
+    def add_favorite(self, symbol: str, company_name: str = None,
+                     user_id: Optional[str] = None) -> Dict[str, any]:
         """お気に入り銘柄を追加（結果をDict形式で返す）"""
-        if self.db.get_favorites_count() >= 10:
+        user_id = resolve_user_id(user_id)
+        symbols = self.get_symbols(user_id)
+        
+        if len(symbols) >= self.max_favorites:
             return {
                 'success': False,
-                'message': 'お気に入り銘柄は最大10個までです'
+                'message': f'お気に入り銘柄は最大{self.max_favorites}個までです'
             }
         
-        if self.db.is_favorite(symbol):
+        if symbol.upper() in symbols:
             return {
                 'success': False,
                 'message': f'銘柄 {symbol} は既にお気に入りに登録されています'
             }
         
-        success = self.db.add_favorite_stock(symbol, company_name)
+        success = self.db.add_favorite_stock(symbol, company_name, user_id)
+        self._invalidate(user_id)
         return {
             'success': success,
             'message': f'銘柄 {symbol} をお気に入りに追加しました' if success else f'銘柄 {symbol} の追加に失敗しました'
         }
     
-    def remove_favorite(self, symbol: str) -> Dict[str, any]:
+    def add_favorites(self, entries: List[tuple], user_id: Optional[str] = None) -> List[Dict[str, any]]:
+        """
+        複数のお気に入り銘柄を一括追加（銘柄ごとの結果をDict形式で返す）
+        
+        Args:
+            entries: (symbol, company_name) のリスト。上限を超えた分は入力順に後ろから除外される
+            user_id: ユーザーID
+        """
+        user_id = resolve_user_id(user_id)
+        added = set(self.db.add_favorite_stocks(entries, user_id))
+        self._invalidate(user_id)
+        
+        results = []
+        for symbol, _ in entries:
+            symbol = symbol.upper()
+            if symbol in added:
+                message = f'銘柄 {symbol} をお気に入りに追加しました'
+            else:
+                message = f'銘柄 {symbol} の追加に失敗しました（上限{self.max_favorites}個または登録済み）'
+            results.append({'symbol': symbol, 'success': symbol in added, 'message': message})
+        return results
+    
+    def remove_favorite(self, symbol: str, user_id: Optional[str] = None) -> Dict[str, any]:
         """お気に入り銘柄を削除（結果をDict形式で返す）"""
-        success = self.db.remove_favorite_stock(symbol)
+        user_id = resolve_user_id(user_id)
+        success = self.db.remove_favorite_stock(symbol, user_id)
+        self._invalidate(user_id)
         return {
             'success': success,
             'message': f'銘柄 {symbol} をお気に入りから削除しました' if success else f'銘柄 {symbol} の削除に失敗しました'
         }
     
-    def get_favorites(self) -> List[Dict[str, any]]:
-        """お気に入り銘柄一覧を取得"""
-        return self.db.get_favorite_stocks()
+    def get_favorites(self, user_id: Optional[str] = None) -> List[Dict[str, any]]:
+        """お気に入り銘柄一覧を取得（ユーザーごとにキャッシュ）"""
+        user_id = resolve_user_id(user_id)
+        # 取得前に版を確認し、取得中に他のワーカーで変更された場合は次回に取得し直す
+        version = self.shared_cache.get(self._version_key(user_id))
+        with self._cache_lock:
+            if user_id in self.cache:
+                cache_time, cached_version, favorites = self.cache[user_id]
+                if cached_version == version and datetime.now() - cache_time < timedelta(seconds=self.cache_ttl):
+                    return list(favorites)
+        
+        favorites = self.db.fetch_favorite_stocks(user_id)
+        if favorites is None:
+            # 取得エラーはキャッシュせず、次回に取得し直す
+            return []
+        with self._cache_lock:
+            self.cache[user_id] = (datetime.now(), version, favorites)
+        return list(favorites)
     
-    def get_symbols(self) -> List[str]:
+    def get_symbols(self, user_id: Optional[str] = None) -> List[str]:
         """お気に入り銘柄のシンボル一覧を取得"""
-        return self.db.get_favorite_symbols()
\ No newline at end of file
+        return [fav['symbol'] for fav in self.get_favorites(user_id)]
+    
+    def get_all_symbols(self) -> List[str]:
+        """全ユーザーのお気に入り銘柄のシンボル一覧（重複なし）を取得"""
+        return self.db.get_all_favorite_symbols()
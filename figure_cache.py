@@ -0,0 +1,58 @@
+import json
+import hashlib
+from typing import Dict, Optional
+
+import plotly.io as pio
+
+from metrics import metrics
+from shared_cache import SharedDataCache
+
+# シリアライズ済みのグラフの有効期間（秒）。データの版もキーに含むため、株価データのキャッシュと同程度にする
+FIGURE_CACHE_TTL = 300
+
+
+def data_version(data) -> str:
+    """株価データの版（行数・最終日・最終値が同じなら同じデータとみなす）"""
+    return f"{len(data)}:{data.index[-1]}:{float(data['Close'].iloc[-1])!r}"
+
+
+class FigureCache:
+    """
+    作成済みのグラフをシリアライズしたJSONで保持する
+    
+    入力（銘柄・期間・指標の設定）とデータの版のハッシュをキーにし、同じ入力のグラフは
+    作成とシリアライズを省く。JSONは orjson があれば orjson で作成され、数値の配列は
+    型付き配列（base64）として埋め込まれる。共有キャッシュに保存するため、どのワーカーからも配信できる。
+    """
+    
+    def __init__(self, cache: SharedDataCache, ttl: int = FIGURE_CACHE_TTL):
+        self.cache = cache
+        self.ttl = ttl
+    
+    def make_key(self, inputs: Dict, versions: Dict) -> str:
+        """入力とデータの版からキーを作成"""
+        payload = json.dumps({'inputs': inputs, 'versions': versions}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        保存済みのグラフを取得
+        
+        Returns:
+            Dict: json（シリアライズ済みのグラフ）, status, chart_state（ない場合はNone）
+        """
+        entry = self.cache.get(f"figure_{key}")
+        metrics.record_cache('figure', entry is not None)
+        return entry
+    
+    def put(self, key: str, figure, status: str, chart_state: Dict) -> Dict:
+        """グラフをシリアライズして保存"""
+        with metrics.timer('figure_serialize', 'plotly_json'):
+            figure_json = pio.to_json(figure, validate=False, engine='auto')
+        entry = {
+            'json': figure_json,
+            'status': status,
+            'chart_state': chart_state
+        }
+        self.cache.set(f"figure_{key}", entry, self.ttl)
+        return entry
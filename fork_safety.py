@@ -0,0 +1,29 @@
+import os
+import weakref
+
+# fork した子プロセス（gunicorn の preload_app で起動したワーカーなど）で作り直す必要のある接続を持つオブジェクト
+_resources = weakref.WeakSet()
+
+# 親プロセスから引き継いだ接続
+# 子プロセスで閉じると親プロセスの接続（DBセッション・SQLiteのロック）に影響するため、参照を保持して閉じないようにする
+_inherited_handles = []
+
+
+def register_fork_reset(resource):
+    """fork 後の子プロセスで resource._reset_after_fork() を呼ぶよう登録"""
+    _resources.add(resource)
+
+
+def keep_inherited(handle):
+    """親プロセスから引き継いだ接続を閉じずに保持する"""
+    if handle is not None:
+        _inherited_handles.append(handle)
+
+
+def _reset_after_fork():
+    for resource in list(_resources):
+        resource._reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,28 @@
+import os
+import multiprocessing
+
+# 本番モードの gunicorn 設定（gunicorn -c gunicorn.conf.py wsgi:application）
+
+bind = os.getenv('BIND', '0.0.0.0:8050')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+# コールバックの大半は外部API・DBの待ち時間のため、ワーカーごとにスレッドでも並行処理する
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+# アプリの初期化（銘柄一覧の読み込みなど）をマスタープロセスで1度だけ行う
+# DB・キャッシュの接続は各ワーカーで開き直される（fork_safety.py）
+preload_app = True
+
+# バックグラウンドコールバックを使わない場合の遅い取得に備えて長めにする
+timeout = 120
+accesslog = '-'
+
+
+def post_fork(server, worker):
+    """
+    各ワーカーでキャッシュの事前取得とニュースのバックグラウンド更新を開始
+    （事前取得を実際に行うのはロックを取得した1つのワーカーのみ）
+    """
+    import wsgi
+    wsgi.stock_chart_app.start_background_tasks()
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import os
+import time
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional
+import logging
+
+from fork_safety import register_fork_reset
+from metrics import metrics
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from shared_cache import SharedDataCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 最新の足を取得し直す間隔（秒）
+LIVE_POLL_INTERVAL = float(os.getenv('LIVE_POLL_INTERVAL', '15'))
+# 最後の要求からこの時間（秒）内の銘柄を監視中とみなし、他の銘柄の取得にまとめる
+LIVE_WATCH_TTL = 60.0
+# 取得する直近の日足の期間
+LIVE_BAR_PERIOD = '5d'
+
+
+class LiveQuoteHub:
+    """
+    ライブ更新用の最新の日足を、接続中の全クライアント分まとめて取得する
+    
+    同じ銘柄を見ているクライアントの要求は poll_interval 秒に1回の取得を共有し、
+    期限切れの銘柄は監視中の他の銘柄と合わせて1回の yf.download で取得する。
+    共有キャッシュを指定した場合は、他のワーカープロセスの取得結果も利用する。
+    """
+    
+    def __init__(self, poll_interval: float = LIVE_POLL_INTERVAL, shared_cache: SharedDataCache = None):
+        self.poll_interval = poll_interval
+        self.shared_cache = shared_cache
+        # symbol -> (取得時刻, 直近の日足)
+        self._latest = {}
+        # symbol -> 最後に要求された時刻
+        self._watched = {}
+        self._lock = threading.Lock()
+        # 同時に1つの取得だけを行い、待っていたクライアントはその結果を使う
+        self._fetch_lock = threading.Lock()
+        register_fork_reset(self)
+    
+    def _reset_after_fork(self):
+        """
+        fork した子プロセスでは、親プロセスの取得中のスレッドが保持していたロックを作り直す
+        
+        取得はロックを保持したまま行うため、取得中に fork されると子プロセスではロックが解放されない。
+        監視中の銘柄は親プロセスのクライアントのものなので引き継がない（取得済みの日足はそのまま使う）。
+        """
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._watched = {}
+    
+    def get_latest_bars(self, symbols: List[str]) -> Dict[str, pd.DataFrame]:
+        """
+        銘柄ごとの直近の日足を取得
+        
+        Returns:
+            Dict: symbol -> 直近の日足（取得できなかった銘柄は含まない）
+        """
+        now = time.time()
+        with self._lock:
+            for symbol in symbols:
+                self._watched[symbol] = now
+            stale = self._stale_symbols(symbols, now)
+        
+        if stale:
+            with self._fetch_lock:
+                now = time.time()
+                with self._lock:
+                    # 他のクライアントの取得を待つ間に更新された銘柄を除き、監視中の期限切れの銘柄を加える
+                    stale = self._stale_symbols(symbols, now)
+                    if stale:
+                        for symbol, requested_at in list(self._watched.items()):
+                            if now - requested_at > LIVE_WATCH_TTL:
+                                del self._watched[symbol]
+                        stale = sorted(set(stale) | set(self._stale_symbols(list(self._watched), now)))
+                if stale:
+                    bars = self._fetch(stale)
+                    with self._lock:
+                        for symbol in stale:
+                            # 取得できなかった銘柄も次の間隔までは再取得しない
+                            self._latest[symbol] = (now, bars.get(symbol))
+        
+        with self._lock:
+            return {
+                symbol: self._latest[symbol][1] for symbol in symbols
+                if symbol in self._latest and self._latest[symbol][1] is not None
+            }
+    
+    def _stale_symbols(self, symbols: List[str], now: float) -> List[str]:
+        return [
+            symbol for symbol in symbols
+            if symbol not in self._latest or now - self._latest[symbol][0] >= self.poll_interval
+        ]
+    
+    def _fetch(self, symbols: List[str]) -> Dict[str, Optional[pd.DataFrame]]:
+        """直近の日足を取得（共有キャッシュにあるものはそれを使う）"""
+        bars = {}
+        if self.shared_cache is not None:
+            for symbol in symbols:
+                cached = self.shared_cache.get(f"live_{symbol}")
+                metrics.record_cache('live_quotes', cached is not None)
+                if cached is not None:
+                    bars[symbol] = cached
+        
+        missing = [symbol for symbol in symbols if symbol not in bars]
+        if not missing:
+            return bars
+        
+        try:
+            import pandas as pd
+            import yfinance as yf
+            
+            with metrics.timer('upstream_fetch', 'yfinance.download'):
+                data = yf.download(missing, period=LIVE_BAR_PERIOD, interval='1d', group_by='ticker',
+                                   auto_adjust=True, progress=False, threads=True)
+            for symbol in missing:
+                if isinstance(data.columns, pd.MultiIndex):
+                    if symbol not in data.columns.get_level_values(0):
+                        continue
+                    frame = data[symbol]
+                else:
+                    frame = data
+                frame = frame.dropna(subset=['Close'])
+                if frame.empty:
+                    continue
+                bars[symbol] = frame
+                if self.shared_cache is not None:
+                    self.shared_cache.set(f"live_{symbol}", frame, self.poll_interval)
+            logger.info(f"最新の日足を取得しました: {', '.join(missing)}")
+        except Exception as e:
+            logger.error(f"最新の日足の取得エラー ({', '.join(missing)}): {e}")
+        
+        return bars
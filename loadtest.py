@@ -0,0 +1,698 @@
+#!/usr/bin/env python3
+"""
+負荷試験（1インスタンスで何人の同時利用に耐えられるかを測る）
+
+yfinance・NewsAPI・PostgreSQL を遅延を指定できるローカルの代替に置き換えてアプリを起動し、
+仮想ユーザーがグラフ・お気に入り・ニュースのコールバック（/_dash-update-component）を
+混在させて呼び出す。スループット、操作ごとの p50/p95/p99 のレイテンシとエラー率を表示する。
+
+使い方:
+    python loadtest.py all [--mode dev|gunicorn] [--users 20] [--duration 60]   # 起動と負荷をまとめて実行
+    python loadtest.py serve [--mode dev|gunicorn] [--port 8050]                 # 代替を使ってアプリだけを起動
+    python loadtest.py run [--url http://127.0.0.1:8050] [--users 20]             # 起動済みのアプリに負荷をかける
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import random
+import signal
+import sqlite3
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+# 代替の遅延（秒）のデフォルト（環境変数で serve から起動したアプリのプロセスに渡す）
+DEFAULT_YFINANCE_LATENCY = 0.3
+DEFAULT_NEWS_LATENCY = 0.2
+DEFAULT_DB_LATENCY = 0.005
+# 操作 -> 重み（実際の利用での割合の目安）
+TRAFFIC_MIX = {
+    'chart': 40,
+    'favorites_list': 10,
+    'favorites_add': 15,
+    'favorites_remove': 10,
+    'news': 15,
+    'news_page': 10,
+}
+# グラフ・お気に入りで使う銘柄
+SYMBOL_POOL = [
+    'AAPL', 'MSFT', 'GOOGL', 'AMZN', 'META', 'NVDA', 'TSLA', 'NFLX', 'ADBE', 'ORCL',
+    'INTC', 'AMD', 'IBM', 'CSCO', 'QCOM', 'TXN', 'AVGO', 'CRM', 'PYPL', 'UBER',
+    'JPM', 'BAC', 'WMT', 'KO', 'PEP', 'DIS', 'NKE', 'MCD', 'V', 'MA'
+]
+CHART_PERIODS = ['1mo', '6mo', '1y', '5y']
+# 期間 -> 日足の本数
+PERIOD_BARS = {'1d': 1, '5d': 5, '1mo': 21, '3mo': 63, '6mo': 126, '1y': 252, '2y': 504,
+               '5y': 1260, '10y': 2520, 'ytd': 200, 'max': 5000}
+# 仮想ユーザーが最初に登録するお気に入りの数
+INITIAL_FAVORITES = 3
+# コールバック1回の応答を待つ上限（秒、バックグラウンドコールバックの完了待ちを含む）
+REQUEST_TIMEOUT = 60
+# アプリの起動・終了を待つ上限（秒）
+SERVER_START_TIMEOUT = 120
+SERVER_STOP_TIMEOUT = 30
+
+
+# ---------------------------------------------------------------------------
+# 代替（アプリのプロセス内で使う）
+# ---------------------------------------------------------------------------
+
+def _latency(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def make_bars(symbol: str, count: int) -> 'pd.DataFrame':
+    """銘柄ごとに決まった合成の日足（yfinance の history と同じ列・タイムゾーン付きの日付）"""
+    import numpy as np
+    import pandas as pd
+    
+    rng = np.random.default_rng(zlib.crc32(symbol.encode('utf-8')))
+    index = pd.bdate_range(end=datetime.now().date(), periods=count, tz='America/New_York')
+    close = 50 + rng.random() * 200 * np.exp(np.cumsum(rng.normal(0, 0.012, count)))
+    return pd.DataFrame({
+        'Open': close * (1 + rng.normal(0, 0.003, count)),
+        'High': close * 1.01,
+        'Low': close * 0.99,
+        'Close': close,
+        'Volume': rng.integers(1_000_000, 50_000_000, count),
+        'Dividends': 0.0,
+        'Stock Splits': 0.0
+    }, index=index)
+
+
+class StandInTicker:
+    """yfinance.Ticker の代替（LOADTEST_YFINANCE_LATENCY 秒待ってから合成データを返す）"""
+    
+    def __init__(self, symbol: str, session=None):
+        self.ticker = symbol.upper()
+    
+    def history(self, period: str = '1mo', interval: str = '1d', start=None, end=None, **kwargs):
+        time.sleep(_latency('LOADTEST_YFINANCE_LATENCY', DEFAULT_YFINANCE_LATENCY))
+        if self.ticker.startswith('INVALID'):
+            import pandas as pd
+            return pd.DataFrame()
+        if start is not None:
+            count = max(1, (datetime.fromisoformat(str(end or datetime.now().date())) -
+                            datetime.fromisoformat(str(start))).days * 5 // 7)
+        else:
+            count = PERIOD_BARS.get(period, 252)
+        return make_bars(self.ticker, count)
+    
+    @property
+    def info(self) -> Dict:
+        time.sleep(_latency('LOADTEST_YFINANCE_LATENCY', DEFAULT_YFINANCE_LATENCY))
+        return {
+            'symbol': self.ticker,
+            'shortName': f"{self.ticker} Stand-in Inc.",
+            'longName': f"{self.ticker} Stand-in Incorporated",
+            'sector': 'Technology',
+            'industry': 'Software',
+            'marketCap': 10_000_000_000,
+            'currency': 'USD',
+            'exchange': 'NMS'
+        }
+
+
+def standin_download(tickers, period: str = '1mo', group_by: str = 'column', **kwargs):
+    """yfinance.download の代替（group_by='ticker' の形式で返す）"""
+    import pandas as pd
+    
+    time.sleep(_latency('LOADTEST_YFINANCE_LATENCY', DEFAULT_YFINANCE_LATENCY))
+    symbols = tickers.split() if isinstance(tickers, str) else list(tickers)
+    return pd.concat({symbol: make_bars(symbol.upper(), PERIOD_BARS.get(period, 5)) for symbol in symbols}, axis=1)
+
+
+class StandInDatabaseManager:
+    """
+    PostgreSQL の DatabaseManager の代替
+    
+    SQLite のファイル（LOADTEST_DB_PATH）に保存するため、gunicorn の全ワーカーで同じお気に入りを参照できる。
+    クエリ1回ごとに LOADTEST_DB_LATENCY 秒待つ（DBサーバーとの往復の代わり）。
+    """
+    
+    def __init__(self, max_favorites: int = None):
+        from database import get_favorites_limit
+        self.max_favorites = max_favorites if max_favorites is not None else get_favorites_limit()
+        self.path = os.environ['LOADTEST_DB_PATH']
+        with self._connect() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS favorite_stocks (
+                    user_id TEXT NOT NULL,
+                    symbol TEXT NOT NULL,
+                    company_name TEXT,
+                    added_date TEXT NOT NULL,
+                    PRIMARY KEY (user_id, symbol)
+                )
+            """)
+    
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+    
+    def _query(self, sql: str, params=()) -> List[tuple]:
+        time.sleep(_latency('LOADTEST_DB_LATENCY', DEFAULT_DB_LATENCY))
+        connection = self._connect()
+        try:
+            with connection:
+                return connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+    
+    def add_favorite_stock(self, symbol: str, company_name: str = None, user_id: str = 'default') -> bool:
+        return bool(self.add_favorite_stocks([(symbol, company_name)], user_id))
+    
+    def add_favorite_stocks(self, entries: List[tuple], user_id: str = 'default') -> List[str]:
+        remaining = self.max_favorites - self.get_favorites_count(user_id)
+        added = []
+        for symbol, company_name in entries[:max(0, remaining)]:
+            rows = self._query(
+                "INSERT INTO favorite_stocks VALUES (?, ?, ?, ?) ON CONFLICT DO NOTHING RETURNING symbol",
+                (user_id, symbol.upper(), company_name, datetime.now().isoformat())
+            )
+            added.extend(row[0] for row in rows)
+        return added
+    
+    def remove_favorite_stock(self, symbol: str, user_id: str = 'default') -> bool:
+        return bool(self._query("DELETE FROM favorite_stocks WHERE user_id = ? AND symbol = ? RETURNING symbol",
+                                (user_id, symbol.upper())))
+    
+    def get_favorite_stocks(self, user_id: str = 'default') -> List[Dict[str, any]]:
+        return self.fetch_favorite_stocks(user_id)
+    
+    def fetch_favorite_stocks(self, user_id: str = 'default') -> Optional[List[Dict[str, any]]]:
+        rows = self._query("SELECT symbol, company_name, added_date FROM favorite_stocks WHERE user_id = ? "
+                           "ORDER BY added_date", (user_id,))
+        return [{'symbol': symbol, 'company_name': company_name, 'added_date': datetime.fromisoformat(added_date)}
+                for symbol, company_name, added_date in rows]
+    
+    def get_favorite_symbols(self, user_id: str = 'default') -> List[str]:
+        return [favorite['symbol'] for favorite in self.get_favorite_stocks(user_id)]
+    
+    def get_all_favorite_symbols(self) -> List[str]:
+        return [row[0] for row in self._query("SELECT DISTINCT symbol FROM favorite_stocks ORDER BY symbol")]
+    
+    def is_favorite(self, symbol: str, user_id: str = 'default') -> bool:
+        return bool(self._query("SELECT 1 FROM favorite_stocks WHERE user_id = ? AND symbol = ?",
+                                (user_id, symbol.upper())))
+    
+    def get_favorites_count(self, user_id: str = 'default') -> int:
+        return self._query("SELECT COUNT(*) FROM favorite_stocks WHERE user_id = ?", (user_id,))[0][0]
+    
+    def close(self):
+        pass
+
+
+class StandInNewsHandler(BaseHTTPRequestHandler):
+    """NewsAPI の /v2/everything の代替（LOADTEST_NEWS_LATENCY 秒待ってから合成記事を返す）"""
+    
+    # 本物の NewsAPI と同じく keep-alive で接続を使い回せるようにする（HTTP/1.0 だと応答ごとに切断される）
+    protocol_version = 'HTTP/1.1'
+    # ヘッダーと本文を別々に書き込むため、Nagle と遅延ACKで使い回した接続の応答が約40ms遅れるのを防ぐ
+    disable_nagle_algorithm = True
+    
+    def do_GET(self):
+        time.sleep(_latency('LOADTEST_NEWS_LATENCY', DEFAULT_NEWS_LATENCY))
+        params = parse_qs(urlparse(self.path).query)
+        # クエリの "検索語" ごとに記事を作る（アプリが記事を銘柄に振り分けられるよう見出しに含める）
+        terms = re.findall(r'"([^"]+)"', params.get('q', [''])[0]) or ['market']
+        page_size = int(params.get('pageSize', ['10'])[0])
+        now = datetime.now(timezone.utc)
+        articles = [{
+            'source': {'id': None, 'name': 'Stand-in News'},
+            'author': 'loadtest',
+            'title': f"{terms[i % len(terms)]} shares move after quarterly update ({i})",
+            'description': f"Stand-in article {i} about {terms[i % len(terms)]} for load testing.",
+            'url': f"https://news.example.com/{terms[i % len(terms)]}/{now:%Y%m%d%H}/{i}",
+            'urlToImage': None,
+            'publishedAt': (now - timedelta(hours=i)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'content': f"Stand-in content {i}."
+        } for i in range(page_size)]
+        body = json.dumps({'status': 'ok', 'totalResults': len(articles), 'articles': articles}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def start_news_stand_in() -> str:
+    """NewsAPI の代替をバックグラウンドで起動し、ベースURLを返す"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInNewsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='news-stand-in', daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v2"
+
+
+def install_stand_ins():
+    """yfinance と DatabaseManager を代替に置き換える（アプリのモジュールの利用前に呼ぶ）"""
+    import yfinance
+    import database
+    
+    yfinance.Ticker = StandInTicker
+    yfinance.download = standin_download
+    database.DatabaseManager = StandInDatabaseManager
+
+
+def standin_application():
+    """gunicorn 用: 代替に置き換えたうえで wsgi のアプリを返す（gunicorn 'loadtest:standin_application()'）"""
+    install_stand_ins()
+    import wsgi
+    return wsgi.application
+
+
+def _serve_environment(work_dir: str, args) -> Dict[str, str]:
+    """代替を使うアプリのプロセスの環境変数（キャッシュは毎回空の一時ファイルから始める）"""
+    env = dict(os.environ)
+    env.update({
+        'STOCK_CACHE_PATH': os.path.join(work_dir, 'stock_cache.sqlite3'),
+        'NEWS_CACHE_PATH': os.path.join(work_dir, 'news_cache.sqlite3'),
+        'BACKGROUND_CACHE_DIR': os.path.join(work_dir, 'background'),
+        'WARMUP_LOCK_PATH': os.path.join(work_dir, 'cache_warmup.lock'),
+        'LOADTEST_DB_PATH': os.path.join(work_dir, 'favorites.sqlite3'),
+        'LOADTEST_YFINANCE_LATENCY': str(args.yfinance_latency),
+        'LOADTEST_NEWS_LATENCY': str(args.news_latency),
+        'LOADTEST_DB_LATENCY': str(args.db_latency),
+        'NEWS_APIKEY': 'loadtest',
+        'NEWS_API_BASE_URL': start_news_stand_in(),
+        'STOCK_APP_PROFILE': 'off',
+    })
+    return env
+
+
+def serve(args) -> int:
+    """代替を使ってアプリを起動（終了するまで戻らない）"""
+    work_dir = tempfile.mkdtemp(prefix='stock_loadtest_')
+    env = _serve_environment(work_dir, args)
+    print(f"代替の遅延: yfinance {args.yfinance_latency}秒, NewsAPI {args.news_latency}秒, DB {args.db_latency}秒"
+          f"（作業ディレクトリ: {work_dir}）")
+    
+    if args.mode == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f"127.0.0.1:{args.port}",
+                   '--access-logfile', '/dev/null', 'loadtest:standin_application()']
+        process = subprocess.Popen(command, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+        signal.signal(signal.SIGTERM, lambda signum, frame: process.terminate())
+        return process.wait()
+    
+    os.environ.update(env)
+    install_stand_ins()
+    from web_app import StockChartWebApp
+    StockChartWebApp().run(debug=False, host='127.0.0.1', port=args.port)
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# 負荷の生成
+# ---------------------------------------------------------------------------
+
+class DashClient:
+    """1人の仮想ユーザー（ページを開き、コールバックをブラウザと同じ形式で呼び出す）"""
+    
+    def __init__(self, base_url: str, user_id: str, dependencies: List[Dict], stats: 'LoadStats'):
+        import requests
+        
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        self.session.headers[os.getenv('USER_ID_HEADER', 'X-User-Id')] = user_id
+        self.dependencies = dependencies
+        self.stats = stats
+        self.end_id = None
+        self.favorites = []
+        self.news_page = 1
+        self.news_articles_key = None
+    
+    def _get(self, path: str):
+        response = self.session.get(f"{self.base_url}{path}", timeout=REQUEST_TIMEOUT)
+        self.stats.count_http()
+        return response
+    
+    def open_page(self):
+        """ページを開き、コールバックの呼び出しに必要なページごとのトークンを取得"""
+        response = self._get('/')
+        response.raise_for_status()
+        config = re.search(r'<script id="_dash-config" type="application/json">(.*?)</script>', response.text, re.S)
+        self.end_id = json.loads(config.group(1)).get('end_id') if config else None
+    
+    def _dependency(self, output_prefix: str) -> Dict:
+        return next(dep for dep in self.dependencies if dep['output'].startswith(output_prefix))
+    
+    def call(self, output_prefix: str, inputs: List, state: List = None, changed: List[str] = None) -> Optional[Dict]:
+        """
+        コールバックを呼び出して応答を返す（バックグラウンドコールバックは完了までポーリングする）
+        
+        Returns:
+            Dict: 出力の値（PreventUpdate・no_update の場合はNone）
+        """
+        dependency = self._dependency(output_prefix)
+        body = {
+            'output': dependency['output'],
+            'outputs': _parse_outputs(dependency['output']),
+            'inputs': inputs,
+            'state': state or [],
+            'changedPropIds': changed or []
+        }
+        params = {'endId': self.end_id} if self.end_id else {}
+        background = dependency.get('background')
+        deadline = time.monotonic() + REQUEST_TIMEOUT
+        while True:
+            response = self.session.post(f"{self.base_url}/_dash-update-component", params=params, json=body,
+                                         timeout=REQUEST_TIMEOUT)
+            self.stats.count_http()
+            if response.status_code == 204:
+                return None
+            response.raise_for_status()
+            data = response.json()
+            if 'response' in data or not background:
+                return data.get('response')
+            if 'cacheKey' in data:
+                # ジョブが開始された（以降は同じリクエストに cacheKey・job を付けて結果を取得する）
+                params = dict(params, cacheKey=data['cacheKey'], job=data['job'])
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{output_prefix} のバックグラウンドコールバックが完了しません")
+            time.sleep(background.get('interval', 1000) / 1000)
+    
+    def chart(self, rng: random.Random):
+        symbols = rng.sample(SYMBOL_POOL, rng.randint(1, 5))
+        state = [[{'id': {'type': 'stock-input', 'index': 0}, 'property': 'value', 'value': ','.join(symbols)}]]
+        state += [_value(component_id, prop, value) for component_id, prop, value in [
+            ('period-selector', 'value', rng.choice(CHART_PERIODS)),
+            ('ma-checkbox', 'value', ['show'] if rng.random() < 0.5 else []),
+            ('ma-period', 'value', 20),
+            ('bb-checkbox', 'value', ['show'] if rng.random() < 0.3 else []),
+            ('bb-period', 'value', 20),
+            ('bb-std', 'value', 2),
+            ('sentiment-checkbox', 'value', []),
+            ('figure-key', 'data', None)
+        ]]
+        result = self.call('..stock-chart.figure...status-message.children',
+                           [_value('update-button', 'n_clicks', 1), _value('live-checkbox', 'value', []),
+                            _value('missing-figure', 'data', None)],
+                           state, ['update-button.n_clicks'])
+        if result is None:
+            raise RuntimeError("グラフの更新が結果を返さずに終了しました")
+        cached_figure = ((result or {}).get('cached-figure') or {}).get('data')
+        if cached_figure:
+            # キャッシュから表示するグラフは、ブラウザがクライアントサイドのコールバックで取得する
+            self._get(f"/_figure/{cached_figure['key']}").raise_for_status()
+    
+    def favorites_list(self, rng: random.Random):
+        result = self.call('..favorites-list.children...favorites-status.children...favorite-input.value',
+                           [_value('add-favorite-button', 'n_clicks', 0), _value('favorites-list', 'n_clicks', 1)],
+                           [_value('favorite-input', 'value', '')], ['favorites-list.n_clicks'])
+        return result
+    
+    def favorites_add(self, rng: random.Random, symbol: str = None):
+        symbol = symbol or rng.choice([s for s in SYMBOL_POOL if s not in self.favorites] or SYMBOL_POOL)
+        self.call('..favorites-list.children...favorites-status.children...favorite-input.value',
+                  [_value('add-favorite-button', 'n_clicks', 1), _value('favorites-list', 'n_clicks', None)],
+                  [_value('favorite-input', 'value', symbol)], ['add-favorite-button.n_clicks'])
+        if symbol not in self.favorites:
+            self.favorites.append(symbol)
+    
+    def favorites_remove(self, rng: random.Random):
+        if not self.favorites:
+            return self.favorites_add(rng)
+        symbol = self.favorites.pop(rng.randrange(len(self.favorites)))
+        button_id = {'index': symbol, 'type': 'remove-favorite'}
+        self.call('..favorites-list.children@',
+                  [[{'id': button_id, 'property': 'n_clicks', 'value': 1}]], [],
+                  [f"{json.dumps(button_id, separators=(',', ':'), sort_keys=True)}.n_clicks"])
+    
+    def news(self, rng: random.Random):
+        result = self.call('..news-display.children...news-status.children',
+                           [_value('get-news-button', 'n_clicks', 1)], [], ['get-news-button.n_clicks'])
+        if result is None:
+            raise RuntimeError("ニュースの取得が結果を返さずに終了しました")
+        self.news_page = 1
+        # ページ送りはこのキーで共有キャッシュの記事リストを参照する
+        self.news_articles_key = (result.get('news-articles-key') or {}).get('data')
+    
+    def news_page_next(self, rng: random.Random):
+        self.call('..news-display.children@',
+                  [_value('news-prev-button', 'n_clicks', None), _value('news-next-button', 'n_clicks', 1)],
+                  [_value('news-page', 'data', self.news_page),
+                   _value('news-articles-key', 'data', self.news_articles_key)], ['news-next-button.n_clicks'])
+        self.news_page += 1
+
+
+def _value(component_id, prop: str, value) -> Dict:
+    return {'id': component_id, 'property': prop, 'value': value}
+
+
+def _parse_outputs(output: str):
+    """コールバックの出力の文字列（..id.prop...id.prop..）をリクエストの outputs の形式にする"""
+    multi = output.startswith('..') and output.endswith('..')
+    outputs = []
+    for part in (output[2:-2].split('...') if multi else [output]):
+        component_id, prop = part.rsplit('.', 1)
+        if component_id.startswith('{'):
+            component_id = json.loads(component_id)
+        outputs.append({'id': component_id, 'property': prop.split('@')[0]})
+    return outputs if multi else outputs[0]
+
+
+class LoadStats:
+    """操作ごとのレイテンシ・エラー数と、HTTPリクエスト数を集計する"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.error_samples = {}
+        self.http_requests = 0
+    
+    def count_http(self):
+        with self._lock:
+            self.http_requests += 1
+    
+    def record(self, action: str, elapsed: float, error: Exception = None):
+        with self._lock:
+            self.latencies.setdefault(action, []).append(elapsed)
+            if error is not None:
+                self.errors[action] = self.errors.get(action, 0) + 1
+                self.error_samples.setdefault(action, f"{type(error).__name__}: {error}"[:200])
+    
+    def summary(self, duration: float) -> Dict:
+        actions = {}
+        for action, latencies in sorted(self.latencies.items()):
+            ordered = sorted(latencies)
+            actions[action] = {
+                'count': len(ordered),
+                'errors': self.errors.get(action, 0),
+                'error_rate': self.errors.get(action, 0) / len(ordered),
+                'throughput': len(ordered) / duration,
+                'mean_ms': sum(ordered) / len(ordered) * 1000,
+                'p50_ms': _percentile(ordered, 50) * 1000,
+                'p95_ms': _percentile(ordered, 95) * 1000,
+                'p99_ms': _percentile(ordered, 99) * 1000,
+                'error_sample': self.error_samples.get(action)
+            }
+        everything = sorted(latency for latencies in self.latencies.values() for latency in latencies)
+        total = len(everything)
+        errors = sum(self.errors.values())
+        return {
+            'duration': duration,
+            'operations': total,
+            'throughput': total / duration if duration else 0.0,
+            'http_requests': self.http_requests,
+            'http_throughput': self.http_requests / duration if duration else 0.0,
+            'errors': errors,
+            'error_rate': errors / total if total else 0.0,
+            'p50_ms': _percentile(everything, 50) * 1000,
+            'p95_ms': _percentile(everything, 95) * 1000,
+            'p99_ms': _percentile(everything, 99) * 1000,
+            'actions': actions
+        }
+
+
+def _percentile(ordered: List[float], percent: float) -> float:
+    """昇順に並べた値のパーセンタイル（nearest-rank 法）"""
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+def run_load(base_url: str, users: int, duration: float, think_time: float, ramp_up: float,
+             seed: int = 0) -> Dict:
+    """仮想ユーザーで負荷をかけ、集計結果を返す"""
+    import requests
+    
+    dependencies = requests.get(f"{base_url.rstrip('/')}/_dash-dependencies", timeout=REQUEST_TIMEOUT).json()
+    stats = LoadStats()
+    actions = {
+        'chart': DashClient.chart,
+        'favorites_list': DashClient.favorites_list,
+        'favorites_add': DashClient.favorites_add,
+        'favorites_remove': DashClient.favorites_remove,
+        'news': DashClient.news,
+        'news_page': DashClient.news_page_next,
+    }
+    names = list(TRAFFIC_MIX)
+    weights = [TRAFFIC_MIX[name] for name in names]
+    started_at = time.monotonic()
+    stop_at = started_at + ramp_up + duration
+    
+    def timed(action: str, func):
+        action_started_at = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            stats.record(action, time.perf_counter() - action_started_at, e)
+            return
+        stats.record(action, time.perf_counter() - action_started_at)
+    
+    def user_session(index: int):
+        rng = random.Random(seed * 100_003 + index)
+        time.sleep(ramp_up * index / max(1, users))
+        client = DashClient(base_url, f"loadtest-{seed}-{index}", dependencies, stats)
+        timed('page_load', client.open_page)
+        for symbol in rng.sample(SYMBOL_POOL, INITIAL_FAVORITES):
+            timed('favorites_add', lambda symbol=symbol: client.favorites_add(rng, symbol))
+        while time.monotonic() < stop_at:
+            action = rng.choices(names, weights)[0]
+            timed(action, lambda: actions[action](client, rng))
+            if think_time > 0:
+                time.sleep(min(rng.expovariate(1 / think_time), max(0.0, stop_at - time.monotonic())))
+    
+    threads = [threading.Thread(target=user_session, args=(i,), daemon=True) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.summary(time.monotonic() - started_at)
+
+
+def print_summary(summary: Dict):
+    print(f"\n所要時間 {summary['duration']:.1f}秒, 操作 {summary['operations']}回 "
+          f"({summary['throughput']:.2f}回/秒), HTTPリクエスト {summary['http_requests']}回 "
+          f"({summary['http_throughput']:.2f}回/秒), エラー率 {summary['error_rate']:.2%}")
+    print(f"{'操作':<18} {'回数':>6} {'回/秒':>7} {'エラー率':>8} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9}")
+    for action, values in summary['actions'].items():
+        print(f"{action:<20} {values['count']:>6} {values['throughput']:>8.2f} {values['error_rate']:>9.2%} "
+              f"{values['p50_ms']:>9.0f} {values['p95_ms']:>9.0f} {values['p99_ms']:>9.0f}")
+    print(f"{'全体':<18} {summary['operations']:>6} {summary['throughput']:>8.2f} {summary['error_rate']:>9.2%} "
+          f"{summary['p50_ms']:>9.0f} {summary['p95_ms']:>9.0f} {summary['p99_ms']:>9.0f}")
+    for action, values in summary['actions'].items():
+        if values['error_sample']:
+            print(f"エラーの例 ({action}): {values['error_sample']}")
+
+
+def _wait_for_server(base_url: str, process: subprocess.Popen):
+    import requests
+    
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"アプリが終了しました（終了コード {process.returncode}）")
+        try:
+            if requests.get(f"{base_url}/_dash-layout", timeout=5).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{SERVER_START_TIMEOUT}秒以内にアプリが起動しませんでした")
+
+
+def _stop_server(process: subprocess.Popen):
+    """アプリを終了し、残ったジョブのプロセスも終了する"""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=SERVER_STOP_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        pass
+    except ProcessLookupError:
+        return
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    process.wait()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="株価チャートアプリの負荷試験")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    serve_options = argparse.ArgumentParser(add_help=False)
+    serve_options.add_argument('--mode', choices=['dev', 'gunicorn'], default='dev',
+                               help="開発用サーバー（web_app.py と同じ）または gunicorn（gunicorn.conf.py の設定）")
+    serve_options.add_argument('--port', type=int, default=8050)
+    serve_options.add_argument('--yfinance-latency', type=float, default=DEFAULT_YFINANCE_LATENCY,
+                               help=f"yfinance の代替の遅延（秒、デフォルト: {DEFAULT_YFINANCE_LATENCY}）")
+    serve_options.add_argument('--news-latency', type=float, default=DEFAULT_NEWS_LATENCY,
+                               help=f"NewsAPI の代替の遅延（秒、デフォルト: {DEFAULT_NEWS_LATENCY}）")
+    serve_options.add_argument('--db-latency', type=float, default=DEFAULT_DB_LATENCY,
+                               help=f"DBの代替のクエリごとの遅延（秒、デフォルト: {DEFAULT_DB_LATENCY}）")
+    
+    load_options = argparse.ArgumentParser(add_help=False)
+    load_options.add_argument('--users', type=int, default=20, help="同時に操作する仮想ユーザー数")
+    load_options.add_argument('--duration', type=float, default=60, help="全員が揃ってから負荷をかける時間（秒）")
+    load_options.add_argument('--ramp-up', type=float, default=5, help="仮想ユーザーを順に開始する時間（秒）")
+    load_options.add_argument('--think-time', type=float, default=1.0,
+                              help="操作の間隔の平均（秒、指数分布。0 で待たずに次の操作を行う）")
+    load_options.add_argument('--seed', type=int, default=0, help="操作を選ぶ乱数の種")
+    load_options.add_argument('--output', help="集計結果を保存するJSONファイル")
+    load_options.add_argument('--max-error-rate', type=float, default=0.0,
+                              help="許容するエラー率（超えた場合は終了コード1、デフォルト: 0）")
+    
+    subparsers.add_parser('serve', parents=[serve_options], help="代替を使ってアプリを起動")
+    run_parser = subparsers.add_parser('run', parents=[load_options], help="起動済みのアプリに負荷をかける")
+    run_parser.add_argument('--url', default='http://127.0.0.1:8050')
+    subparsers.add_parser('all', parents=[serve_options, load_options], help="アプリを起動して負荷をかける")
+    args = parser.parse_args(argv)
+    
+    if args.command == 'serve':
+        return serve(args)
+    
+    process = None
+    base_url = getattr(args, 'url', None) or f"http://127.0.0.1:{args.port}"
+    if args.command == 'all':
+        command = [sys.executable, os.path.abspath(__file__), 'serve', '--mode', args.mode, '--port', str(args.port),
+                   '--yfinance-latency', str(args.yfinance_latency), '--news-latency', str(args.news_latency),
+                   '--db-latency', str(args.db_latency)]
+        server_log = tempfile.NamedTemporaryFile(prefix='stock_loadtest_server_', suffix='.log', delete=False)
+        print(f"アプリのログ: {server_log.name}")
+        # バックグラウンドコールバックのジョブのプロセスもまとめて終了できるよう、別のプロセスグループで起動する
+        process = subprocess.Popen(command, stdout=server_log, stderr=subprocess.STDOUT, start_new_session=True)
+        try:
+            _wait_for_server(base_url, process)
+        except Exception:
+            _stop_server(process)
+            raise
+    try:
+        print(f"{base_url} に {args.users} 人で {args.duration:.0f}秒間 負荷をかけます"
+              f"（開始 {args.ramp_up:.0f}秒、操作の間隔 {args.think_time}秒）")
+        summary = run_load(base_url, args.users, args.duration, args.think_time, args.ramp_up, args.seed)
+    finally:
+        if process is not None:
+            _stop_server(process)
+    summary.update(url=base_url, users=args.users, think_time=args.think_time,
+                   mode=getattr(args, 'mode', None), created_at=datetime.now(timezone.utc).isoformat())
+    print_summary(summary)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"結果を保存しました: {args.output}")
+    if summary['operations'] == 0:
+        return 1
+    if summary['error_rate'] > args.max_error_rate:
+        print(f"エラー率 {summary['error_rate']:.2%} が許容値 {args.max_error_rate:.2%} を超えています")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
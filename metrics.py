@@ -0,0 +1,338 @@
+import os
+import time
+import atexit
+import sqlite3
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Optional, Tuple
+import logging
+
+from fork_safety import keep_inherited, register_fork_reset
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 所要時間のヒストグラムの区切り（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# プロセス内の増分を共有ファイルに書き込む間隔（秒）
+METRICS_FLUSH_INTERVAL = 5.0
+
+# メトリクス名 -> (種類, 説明)
+METRIC_DEFINITIONS = {
+    'stock_app_operation_duration_seconds': (
+        'histogram', "処理の所要時間（operation: upstream_fetch, indicator_compute, figure_build, "
+                     "figure_serialize, sql_query）"),
+    'stock_app_operation_errors_total': ('counter', "例外で終了した処理の数"),
+    'stock_app_callback_duration_seconds': ('histogram', "Dash コールバックの所要時間"),
+    'stock_app_callback_errors_total': ('counter', "例外で終了した Dash コールバックの数"),
+    'stock_app_cache_requests_total': ('counter', "キャッシュの参照数（result: hit, miss）"),
+    'stock_app_http_requests_total': ('counter', "HTTPリクエスト数（ステータスコードの先頭桁ごと）"),
+    'stock_app_http_requests_in_flight': ('gauge', "処理中のHTTPリクエスト数"),
+}
+
+# ラベルの組（(名前, 値), ...）
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels) -> str:
+    """Prometheus のテキスト形式のラベル（{name="value",...}）"""
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in labels
+    ) + '}'
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class MetricsRegistry:
+    """
+    処理の所要時間・キャッシュのヒット率・エラー数などを集計し、Prometheus のテキスト形式で出力する
+    
+    本番モードの複数ワーカーの値をまとめるため、カウンター（ヒストグラムの各区切りを含む）は前回からの増分を
+    SQLite の共有ファイルに加算し、ゲージはプロセスごとの現在値を保存して、出力時に動作中のプロセスの値を合計する。
+    記録はメモリ上で行い、共有ファイルへの書き込みはプロセスごとのスレッドが flush_interval ごとに
+    （と /metrics の出力時・プロセスの終了時に）まとめて行う。
+    共有ファイルを使えない場合はプロセス内の値だけを出力する。
+    """
+    
+    def __init__(self, path: str = None, flush_interval: float = METRICS_FLUSH_INTERVAL):
+        """
+        Args:
+            path: 共有ファイルのパス（未指定時は環境変数 STOCK_CACHE_PATH、デフォルト: stock_cache.sqlite3）
+            flush_interval: 共有ファイルに書き込む間隔（秒）
+        """
+        self.path = path or os.getenv('STOCK_CACHE_PATH', 'stock_cache.sqlite3')
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        # (メトリクス名, ラベル) -> プロセス内の累計 / 共有ファイルに未反映の増分 / ゲージの現在値
+        self._totals = {}
+        self._pending = {}
+        self._gauges = {}
+        # 共有ファイルへの読み書き（記録中の他のスレッドを待たせないよう別のロックにする）
+        self._db_lock = threading.Lock()
+        self._connection = None
+        self._connect_failed = False
+        self._flush_thread = None
+        register_fork_reset(self)
+        # 最後の書き込み以降の増分を失わないよう、プロセスの終了時にも書き込む
+        atexit.register(self.flush)
+    
+    def _reset_after_fork(self):
+        """
+        fork した子プロセスでは親プロセスの値を引き継がずに集計し直す（二重に加算しない）
+        
+        書き込みのスレッドは子プロセスに複製されないため、子プロセスでの最初の記録時に開始し直す。
+        """
+        self._flush_thread = None
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._pending = {}
+        self._gauges = {}
+        self._db_lock = threading.Lock()
+        keep_inherited(self._connection)
+        self._connection = None
+        self._connect_failed = False
+    
+    def inc(self, metric: str, value: float = 1.0, **labels):
+        """カウンターを加算"""
+        self._ensure_flush_thread()
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self._totals[key] = self._totals.get(key, 0.0) + value
+            self._pending[key] = self._pending.get(key, 0.0) + value
+    
+    def observe(self, metric: str, value: float, **labels):
+        """ヒストグラムに値を追加（区切りごとの累積数・合計・件数を加算する）"""
+        label_items = tuple(sorted(labels.items()))
+        keys = [(f"{metric}_bucket", label_items + (('le', str(bound)),))
+                for bound in LATENCY_BUCKETS if value <= bound]
+        keys.append((f"{metric}_bucket", label_items + (('le', '+Inf'),)))
+        keys.append((f"{metric}_count", label_items))
+        self._ensure_flush_thread()
+        with self._lock:
+            for key in keys:
+                self._totals[key] = self._totals.get(key, 0.0) + 1
+                self._pending[key] = self._pending.get(key, 0.0) + 1
+            sum_key = (f"{metric}_sum", label_items)
+            self._totals[sum_key] = self._totals.get(sum_key, 0.0) + value
+            self._pending[sum_key] = self._pending.get(sum_key, 0.0) + value
+    
+    def add_gauge(self, metric: str, value: float, **labels):
+        """ゲージを増減"""
+        self._ensure_flush_thread()
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0.0) + value
+    
+    def record_cache(self, cache: str, hit: bool):
+        """キャッシュの参照結果を記録"""
+        self.inc('stock_app_cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+    
+    @contextmanager
+    def timer(self, operation: str, name: str):
+        """with ブロックの所要時間を記録（例外で終了した場合はエラー数も加算する）"""
+        started_at = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc('stock_app_operation_errors_total', operation=operation, name=name)
+            raise
+        finally:
+            self.observe('stock_app_operation_duration_seconds', time.perf_counter() - started_at,
+                         operation=operation, name=name)
+    
+    def timed(self, operation: str, name: str = None):
+        """関数の所要時間を記録するデコレータ（name の未指定時は関数名）"""
+        def decorator(func):
+            label = name or func.__name__
+            
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(operation, label):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+    
+    def track_callback(self, func):
+        """Dash コールバックの所要時間・エラー数を記録するデコレータ"""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                # PreventUpdate などの Dash の制御用の例外はエラーとして数えない
+                if not type(e).__module__.startswith('dash'):
+                    self.inc('stock_app_callback_errors_total', callback=func.__name__)
+                raise
+            finally:
+                self.observe('stock_app_callback_duration_seconds', time.perf_counter() - started_at,
+                             callback=func.__name__)
+        return wrapper
+    
+    def init_app(self, server, route: str = '/metrics'):
+        """Flask サーバーにリクエスト数の記録と /metrics のエンドポイントを追加"""
+        import flask
+        
+        @server.before_request
+        def start_request():
+            flask.g.metrics_started = True
+            self.add_gauge('stock_app_http_requests_in_flight', 1)
+        
+        @server.after_request
+        def count_response(response):
+            self.inc('stock_app_http_requests_total', status=f"{response.status_code // 100}xx")
+            return response
+        
+        @server.teardown_request
+        def finish_request(exc):
+            if flask.g.pop('metrics_started', False):
+                self.add_gauge('stock_app_http_requests_in_flight', -1)
+        
+        @server.route(route)
+        def serve_metrics():
+            return flask.Response(self.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    
+    def _ensure_flush_thread(self):
+        """共有ファイルに定期的に書き込むスレッドを開始（プロセスごとに最初の記録時に1度）"""
+        if self._flush_thread is not None:
+            return
+        with self._lock:
+            if self._flush_thread is not None:
+                return
+            self._flush_thread = threading.Thread(target=self._run_flush, name='metrics-flush', daemon=True)
+        self._flush_thread.start()
+    
+    def _run_flush(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+    
+    def flush(self):
+        """未反映の増分とゲージの現在値を共有ファイルに書き込む"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            gauges = dict(self._gauges)
+        if not pending and not gauges:
+            return
+        try:
+            connection = self._get_connection()
+            if connection is None:
+                return
+            with self._db_lock:
+                connection.executemany("""
+                    INSERT INTO metrics_counters (name, labels, value) VALUES (?, ?, ?)
+                    ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value
+                """, [(name, _format_labels(labels), value) for (name, labels), value in pending.items()])
+                connection.executemany("""
+                    INSERT OR REPLACE INTO metrics_gauges (pid, name, labels, value) VALUES (?, ?, ?, ?)
+                """, [(os.getpid(), name, _format_labels(labels), value) for (name, labels), value in gauges.items()])
+                connection.commit()
+        except Exception as e:
+            logger.warning(f"メトリクスの書き込みエラー: {e}")
+    
+    def render(self) -> str:
+        """全プロセスの値を Prometheus のテキスト形式で出力"""
+        self.flush()
+        counters, gauges = self._read_shared()
+        if counters is None:
+            with self._lock:
+                counters = {(name, _format_labels(labels)): value for (name, labels), value in self._totals.items()}
+                gauges = {(name, _format_labels(labels)): value for (name, labels), value in self._gauges.items()}
+        
+        lines = []
+        for metric, (metric_type, description) in METRIC_DEFINITIONS.items():
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} {metric_type}")
+            values = gauges if metric_type == 'gauge' else counters
+            names = [f"{metric}_bucket", f"{metric}_sum", f"{metric}_count"] if metric_type == 'histogram' else [metric]
+            for series_name in names:
+                series = sorted((labels, value) for (name, labels), value in values.items() if name == series_name)
+                if metric_type == 'histogram' and series_name.endswith('_bucket'):
+                    # 区切りの小さい順に並べる
+                    series.sort(key=lambda item: (item[0].rsplit('le="', 1)[0], self._bucket_order(item[0])))
+                for labels, value in series:
+                    lines.append(f"{series_name}{labels} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+    
+    def _bucket_order(self, labels: str) -> float:
+        bound = labels.rsplit('le="', 1)[-1].rstrip('"}')
+        return float('inf') if bound == '+Inf' else float(bound)
+    
+    def _read_shared(self) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """共有ファイルのカウンターと、動作中のプロセスのゲージの合計を読み込む"""
+        try:
+            connection = self._get_connection()
+            if connection is None:
+                return None, None
+            with self._db_lock:
+                counters = {(name, labels): value for name, labels, value in
+                            connection.execute("SELECT name, labels, value FROM metrics_counters")}
+                gauge_rows = connection.execute("SELECT pid, name, labels, value FROM metrics_gauges").fetchall()
+                dead_pids = {pid for pid, _, _, _ in gauge_rows if not self._is_alive(pid)}
+                if dead_pids:
+                    connection.executemany("DELETE FROM metrics_gauges WHERE pid = ?", [(pid,) for pid in dead_pids])
+                    connection.commit()
+        except Exception as e:
+            logger.warning(f"メトリクスの読み込みエラー: {e}")
+            return None, None
+        
+        gauges = {}
+        for pid, name, labels, value in gauge_rows:
+            if pid not in dead_pids:
+                gauges[(name, labels)] = gauges.get((name, labels), 0.0) + value
+        return counters, gauges
+    
+    def _is_alive(self, pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+            return True
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+    
+    def _get_connection(self) -> Optional[sqlite3.Connection]:
+        """共有ファイルの接続（初回に開く。開けなかった場合はNone）"""
+        if self._connection is None and not self._connect_failed:
+            with self._db_lock:
+                if self._connection is None and not self._connect_failed:
+                    try:
+                        connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+                        if self.path != ':memory:':
+                            connection.execute("PRAGMA journal_mode=WAL")
+                            # メトリクスは失われても問題ないため、コミットごとの fsync を省く
+                            connection.execute("PRAGMA synchronous=NORMAL")
+                        connection.execute("""
+                            CREATE TABLE IF NOT EXISTS metrics_counters (
+                                name TEXT NOT NULL,
+                                labels TEXT NOT NULL,
+                                value REAL NOT NULL,
+                                PRIMARY KEY (name, labels)
+                            )
+                        """)
+                        connection.execute("""
+                            CREATE TABLE IF NOT EXISTS metrics_gauges (
+                                pid INTEGER NOT NULL,
+                                name TEXT NOT NULL,
+                                labels TEXT NOT NULL,
+                                value REAL NOT NULL,
+                                PRIMARY KEY (pid, name, labels)
+                            )
+                        """)
+                        connection.commit()
+                        self._connection = connection
+                    except Exception as e:
+                        logger.warning(f"メトリクスの共有ファイルを開けません（プロセス内の値のみ出力します）: {e}")
+                        self._connect_failed = True
+        return self._connection
+
+
+# アプリ全体で共有するメトリクス
+metrics = MetricsRegistry()
@@ -1,26 +1,340 @@
 import os
+import re
+import json
+import time
+import heapq
+import hashlib
+import sqlite3
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 from dotenv import load_dotenv
 import logging
+from symbol_registry import get_symbol_registry
+from fork_safety import keep_inherited, register_fork_reset
+from metrics import metrics
 
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 銘柄ごとのニュースを並列取得する際のスレッド数の上限
+NEWS_FETCH_WORKERS = 5
+
+# ニュース取得全体の締め切り（秒）。超過した銘柄はエラー記事として返す
+NEWS_FETCH_DEADLINE = 12.0
+
+# 1回のAPI呼び出しにまとめる銘柄数の上限と、NewsAPIのクエリ長・ページサイズの上限
+MAX_SYMBOLS_PER_QUERY = 4
+MAX_QUERY_LENGTH = 500
+MAX_PAGE_SIZE = 100
+# まとめたクエリの結果が切り詰められた場合に、記事の不足した銘柄を個別に取得し直す回数の上限（バッチあたり）
+NEWS_BATCH_MAX_FOLLOWUPS = 1
+
+# ニュースの取得対象期間（日）。これより古い記事はキャッシュからも削除する
+NEWS_WINDOW_DAYS = 7
+
+# ニュースキャッシュの有効期間（秒）、保持期間（秒）、保持する銘柄・言語の組の上限
+NEWS_CACHE_TTL = 300
+NEWS_CACHE_MAX_AGE = 24 * 60 * 60
+NEWS_CACHE_MAX_ENTRIES = 1000
+
+# バックグラウンド更新: 確認間隔（秒）、有効期限の何秒前に更新するか、API呼び出しの間隔（秒）
+NEWS_REFRESH_CHECK_INTERVAL = 60
+NEWS_REFRESH_MARGIN = 60
+NEWS_REFRESH_STAGGER = 2.0
+# バックグラウンド更新の対象にする、最後に表示されてからの期間（秒）
+NEWS_REFRESH_WATCH_WINDOW = 30 * 60
+# 1日（UTC）のNewsAPIリクエスト数がこれに達したらバックグラウンド更新を止め、残りを画面からの取得に回す
+NEWS_REFRESH_DAILY_BUDGET = int(os.getenv('NEWS_REFRESH_DAILY_BUDGET', '50'))
+# NewsAPIのリクエスト数の記録を保持する日数
+NEWS_API_USAGE_DAYS = 7
+
+
+
+def normalize_article_url(url: str) -> str:
+    """記事URLを正規化（スキーム・ホストの大文字小文字、www.、トラッキング用パラメータ、末尾のスラッシュを無視）"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    query = urlencode([(key, value) for key, value in parse_qsl(parts.query)
+                       if not key.lower().startswith('utm_') and key.lower() not in ('ref', 'cmpid')])
+    return urlunsplit(('https' if parts.scheme.lower() in ('http', 'https') else parts.scheme.lower(),
+                       host, parts.path.rstrip('/'), query, ''))
+
+
+def article_hash(article: Dict) -> str:
+    """記事の識別子（正規化したURLのハッシュ。URLがない場合はタイトルのハッシュ）"""
+    url = article.get('url') or ''
+    key = normalize_article_url(url) if url else f"title:{article.get('title') or ''}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+class NewsCache:
+    """
+    銘柄・言語ごとのニュース記事をSQLiteに永続化するキャッシュ
+    
+    取得した中で最大のページサイズの記事を保存し、それ以下の記事数の要求にも応える。
+    保持期間を過ぎたエントリと上限数を超えた古いエントリは保存時に削除される。
+    """
+    
+    def __init__(self, path: str = None, ttl: int = NEWS_CACHE_TTL,
+                 max_age: int = NEWS_CACHE_MAX_AGE, max_entries: int = NEWS_CACHE_MAX_ENTRIES):
+        """
+        Args:
+            path: SQLiteファイルのパス（未指定時は環境変数 NEWS_CACHE_PATH、デフォルト: news_cache.sqlite3）
+            ttl: キャッシュの有効期間（秒）
+            max_age: エントリの保持期間（秒）
+            max_entries: 保持するエントリ数の上限
+        """
+        self.path = path or os.getenv('NEWS_CACHE_PATH', 'news_cache.sqlite3')
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        
+        # 並列取得のスレッドから共有するため、アクセスはロックで直列化する
+        self._connection = self._connect()
+        register_fork_reset(self)
+        with self._lock:
+            if self.path != ':memory:':
+                # 複数プロセスから同じファイルを読み書きできるようにする
+                self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS news_cache (
+                    symbol TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    page_size INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    articles TEXT NOT NULL,
+                    newest_published_at TEXT,
+                    PRIMARY KEY (symbol, language)
+                )
+            """)
+            # 差分取得に対応する前のキャッシュファイルからの移行
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(news_cache)")]
+            if 'newest_published_at' not in columns:
+                self._connection.execute("ALTER TABLE news_cache ADD COLUMN newest_published_at TEXT")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_news_cache_fetched_at ON news_cache (fetched_at)"
+            )
+            # 日別のNewsAPIリクエスト数（ワーカープロセス間で共有する）
+            # requests: リクエスト数、followups: そのうち不足した銘柄の個別取得の数、symbols: 取得した銘柄数の延べ数
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS news_api_usage (
+                    day TEXT PRIMARY KEY,
+                    requests INTEGER NOT NULL DEFAULT 0,
+                    followups INTEGER NOT NULL DEFAULT 0,
+                    symbols INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            # リクエスト数のみを記録していたキャッシュファイルからの移行
+            usage_columns = [row[1] for row in self._connection.execute("PRAGMA table_info(news_api_usage)")]
+            for column in ('followups', 'symbols'):
+                if column not in usage_columns:
+                    self._connection.execute(
+                        f"ALTER TABLE news_api_usage ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"
+                    )
+            self._connection.commit()
+    
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+    
+    def _reset_after_fork(self):
+        """fork した子プロセスではキャッシュファイルを開き直す（メモリ上のDBは複製をそのまま使う）"""
+        self._lock = threading.Lock()
+        if self.path != ':memory:':
+            keep_inherited(self._connection)
+            self._connection = self._connect()
+    
+    def get(self, symbol: str, language: str, page_size: int, allow_stale: bool = False) -> Optional[List[Dict]]:
+        """
+        有効期限内の記事を最大 page_size 件取得
+        
+        Args:
+            allow_stale: True の場合、有効期限切れ（保持期間内）の記事も返す
+        
+        Returns:
+            List[Dict]: 記事のリスト（未キャッシュ・期限切れ・保存済みの記事数が足りない場合はNone）
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT page_size, fetched_at, articles FROM news_cache WHERE symbol = ? AND language = ?",
+                (symbol, language)
+            ).fetchone()
+        
+        if row is None:
+            return None
+        
+        stored_page_size, fetched_at, articles_json = row
+        age = time.time() - fetched_at
+        if age >= self.max_age or (age >= self.ttl and not allow_stale):
+            return None
+        
+        articles = json.loads(articles_json)
+        # 保存時より大きいページサイズの要求は、保存時に記事が不足していなかった場合のみ再取得が必要
+        if page_size > stored_page_size and len(articles) >= stored_page_size:
+            return None
+        
+        return articles[:page_size]
+    
+    def get_entry(self, symbol: str, language: str) -> Optional[Dict]:
+        """
+        保持期間内のエントリを有効期限に関係なく取得（差分取得のマージ用）
+        
+        Returns:
+            Dict: page_size, fetched_at, articles, newest_published_at（ない場合はNone）
+        """
+        with self._lock:
+            row = self._connection.execute(
+                """
+                SELECT page_size, fetched_at, articles, newest_published_at
+                FROM news_cache WHERE symbol = ? AND language = ?
+                """,
+                (symbol, language)
+            ).fetchone()
+        
+        if row is None or time.time() - row[1] >= self.max_age:
+            return None
+        
+        return {
+            'page_size': row[0],
+            'fetched_at': row[1],
+            'articles': json.loads(row[2]),
+            'newest_published_at': row[3]
+        }
+    
+    def put(self, symbol: str, language: str, page_size: int, articles: List[Dict]):
+        """記事を保存し、保持期間・上限数を超えたエントリを削除"""
+        now = time.time()
+        # 次回の差分取得の起点（取得済みの最新の公開日時）
+        newest_published_at = max((a.get('publishedAt') or '' for a in articles), default='') or None
+        with self._lock:
+            self._connection.execute(
+                """
+                INSERT OR REPLACE INTO news_cache
+                    (symbol, language, page_size, fetched_at, articles, newest_published_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (symbol, language, page_size, now, json.dumps(articles, ensure_ascii=False), newest_published_at)
+            )
+            self._connection.execute("DELETE FROM news_cache WHERE fetched_at < ?", (now - self.max_age,))
+            self._connection.execute("""
+                DELETE FROM news_cache WHERE rowid IN (
+                    SELECT rowid FROM news_cache ORDER BY fetched_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            self._connection.commit()
+    
+    def get_fetched_at(self, symbols: List[str], language: str) -> Dict[str, float]:
+        """銘柄ごとの最終取得時刻（UNIX時間）を取得（未キャッシュの銘柄は含まれない）"""
+        if not symbols:
+            return {}
+        placeholders = ', '.join('?' for _ in symbols)
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT symbol, fetched_at FROM news_cache WHERE language = ? AND symbol IN ({placeholders})",
+                (language, *symbols)
+            ).fetchall()
+        return dict(rows)
+    
+    def record_api_usage(self, requests: int = 0, followups: int = 0, symbols: int = 0):
+        """NewsAPIの利用状況（リクエスト数・個別取得の数・取得した銘柄数）を当日（UTC）の分に加算"""
+        now = datetime.now(timezone.utc)
+        cutoff = (now - timedelta(days=NEWS_API_USAGE_DAYS)).strftime('%Y-%m-%d')
+        with self._lock:
+            self._connection.execute("""
+                INSERT INTO news_api_usage (day, requests, followups, symbols) VALUES (?, ?, ?, ?)
+                ON CONFLICT (day) DO UPDATE SET
+                    requests = requests + excluded.requests,
+                    followups = followups + excluded.followups,
+                    symbols = symbols + excluded.symbols
+            """, (now.strftime('%Y-%m-%d'), requests, followups, symbols))
+            self._connection.execute("DELETE FROM news_api_usage WHERE day < ?", (cutoff,))
+            self._connection.commit()
+    
+    def get_api_usage(self) -> Dict[str, int]:
+        """
+        当日（UTC）のNewsAPIの利用状況（全プロセスの合計）
+        
+        Returns:
+            Dict: requests, followups, symbols（symbols - requests がまとめて取得したことで省いたリクエスト数）
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT requests, followups, symbols FROM news_api_usage WHERE day = ?",
+                (datetime.now(timezone.utc).strftime('%Y-%m-%d'),)
+            ).fetchone()
+        requests, followups, symbols = row or (0, 0, 0)
+        return {'requests': requests, 'followups': followups, 'symbols': symbols}
+    
+    def api_requests_today(self) -> int:
+        """当日（UTC）のNewsAPIへのリクエスト数（全プロセスの合計）"""
+        return self.get_api_usage()['requests']
+    
+    def clear(self):
+        """全エントリを削除"""
+        with self._lock:
+            self._connection.execute("DELETE FROM news_cache")
+            self._connection.commit()
+
 
 class NewsAPIClient:
-    def __init__(self):
+    def __init__(self, max_workers: int = NEWS_FETCH_WORKERS, deadline: float = NEWS_FETCH_DEADLINE):
         self.api_key = os.getenv('NEWS_APIKEY')
         if not self.api_key or self.api_key == 'your_news_api_key_here':
             logger.warning("NEWS_APIKEY が設定されていません。.envファイルを確認してください。")
         
-        self.base_url = "https://newsapi.org/v2"
-        self.cache = {}
+        self.base_url = os.getenv('NEWS_API_BASE_URL', "https://newsapi.org/v2")
+        self.cache = NewsCache()
+        # 期限切れのキャッシュを非同期に更新する NewsRefresher（NewsManager が設定する）
+        self.refresher = None
+        self.max_workers = max_workers
+        self.deadline = deadline
+        
+        # keep-alive の接続プールを共有し、リクエストごとのTCP/TLSハンドシェイクを避ける
+        self.session = self._create_session()
+        register_fork_reset(self)
     
-    def get_stock_news(self, symbols: List[str], language: str = 'en', page_size: int = 10) -> List[Dict]:
+    def _reset_after_fork(self):
+        """fork した子プロセスでは親プロセスと keep-alive 接続を共有しないようセッションを作り直す"""
+        keep_inherited(self.session)
+        self.session = self._create_session()
+    
+    def _create_session(self) -> requests.Session:
+        """接続プール・リトライ・圧縮を設定したHTTPセッションを作成"""
+        session = requests.Session()
+        
+        # 並列取得のスレッド数分の接続を同一ホストに対して保持する
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.max_workers,
+            max_retries=Retry(
+                total=2,
+                backoff_factor=0.3,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=('GET',)
+            )
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        
+        session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+        if self.api_key:
+            # URLにキーを含めないようヘッダーで送信する
+            session.headers.update({'X-Api-Key': self.api_key})
+        
+        return session
+    
+    def get_stock_news(self, symbols: List[str], language: str = 'en', page_size: int = 10,
+                       allow_stale: bool = False, limit: Optional[int] = None) -> List[Dict]:
         """
         指定された銘柄のニュースを取得
         
@@ -28,9 +342,11 @@ class NewsAPIClient:
             symbols: 銘柄コードのリスト
             language: 言語設定（デフォルト: 'ja'）
             page_size: 取得する記事数（デフォルト: 10）
+            allow_stale: True の場合、期限切れのキャッシュを即座に返し、更新は refresher に任せる
+            limit: 返す記事数の上限（新しい順に先頭から。未指定の場合は全件）
         
         Returns:
-            List[Dict]: ニュース記事のリスト
+            List[Dict]: ニュース記事のリスト（重複除去済み。symbols に一致した全銘柄を持つ）
         """
         if not self.api_key or self.api_key == 'your_news_api_key_here':
             return [{
@@ -41,126 +357,312 @@ class NewsAPIClient:
                 'symbol': 'ERROR'
             }]
         
-        all_articles = []
+        # 銘柄ごとの記事リスト（それぞれ公開日時の新しい順）
+        article_lists = []
+        pending_symbols = []
+        stale_symbols = []
+        allow_stale = allow_stale and self.refresher is not None and self.refresher.is_running
         
         for symbol in symbols:
-            try:
-                # キャッシュキーを作成
-                cache_key = f"{symbol}_{language}_{page_size}"
-                
-                # キャッシュをチェック（5分間有効）
-                if cache_key in self.cache:
-                    cache_time, cached_data = self.cache[cache_key]
-                    if datetime.now() - cache_time < timedelta(minutes=5):
-                        logger.info(f"キャッシュから {symbol} のニュースを取得")
-                        all_articles.extend(cached_data)
-                        continue
-                
-                # 検索クエリを構築（日本の銘柄コードと企業名を考慮）
-                query = self._build_search_query(symbol)
-                
-                # APIリクエストを送信
-                articles = self._fetch_news_from_api(query, language, page_size)
-                
-                # 記事に銘柄情報を追加
-                for article in articles:
-                    article['symbol'] = symbol
-                    article['formatted_date'] = self._format_date(article.get('publishedAt', ''))
-                
-                # キャッシュに保存
-                self.cache[cache_key] = (datetime.now(), articles)
-                
-                all_articles.extend(articles)
-                logger.info(f"{symbol} のニュース {len(articles)} 件を取得")
+            # キャッシュをチェック（5分間有効）
+            cached_articles = self.cache.get(symbol, language, page_size)
+            if cached_articles is None and allow_stale:
+                cached_articles = self.cache.get(symbol, language, page_size, allow_stale=True)
+                if cached_articles is not None:
+                    stale_symbols.append(symbol)
+            
+            metrics.record_cache('news', cached_articles is not None)
+            if cached_articles is not None:
+                logger.info(f"キャッシュから {symbol} のニュースを取得")
+                article_lists.append(cached_articles)
+            else:
+                pending_symbols.append(symbol)
+        
+        if stale_symbols:
+            # 期限切れの銘柄はキャッシュを返しつつバックグラウンドで更新する
+            self.refresher.request_refresh(stale_symbols, language, page_size)
+        
+        if pending_symbols:
+            # 未キャッシュの銘柄は複数銘柄を1つのクエリにまとめ、クエリごとに並列に取得する
+            batches = self._group_symbols_for_query(pending_symbols)
+            executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches)))
+            futures = {
+                executor.submit(self._fetch_batch_news, batch, language, page_size): batch
+                for batch in batches
+            }
+            done, _ = wait(futures, timeout=self.deadline)
+            # 締め切りを過ぎた取得はバックグラウンドで完了させ、次回のキャッシュとして利用する
+            executor.shutdown(wait=False)
+            
+            for future, batch in futures.items():
+                if future not in done:
+                    for symbol in batch:
+                        logger.warning(f"{symbol} のニュース取得がタイムアウトしました ({self.deadline}秒)")
+                        article_lists.append([self._error_article(symbol, f'タイムアウト ({self.deadline}秒)')])
+                    continue
                 
-            except Exception as e:
-                logger.error(f"{symbol} のニュース取得エラー: {e}")
-                # エラーの場合は空の記事を追加
-                all_articles.append({
-                    'title': f'{symbol} のニュース取得エラー',
-                    'description': f'エラー: {str(e)}',
-                    'publishedAt': datetime.now().isoformat(),
-                    'formatted_date': datetime.now().strftime('%Y年%m月%d日 %H:%M'),
-                    'url': '',
-                    'symbol': symbol
-                })
-        
-        # 日付順でソート（新しい順）
-        all_articles.sort(key=lambda x: x.get('publishedAt', ''), reverse=True)
-        
-        return all_articles
+                try:
+                    article_lists.extend(future.result().values())
+                except Exception as e:
+                    for symbol in batch:
+                        logger.error(f"{symbol} のニュース取得エラー: {e}")
+                        # エラーの場合は空の記事を追加
+                        article_lists.append([self._error_article(symbol, str(e))])
+        
+        # 日付順（新しい順）にマージ
+        return self._merge_article_lists(article_lists, limit)
     
-    def _build_search_query(self, symbol: str) -> str:
-        """銘柄コードに基づいて検索クエリを構築"""
-        # 日本の銘柄コード（例: 7203.T）の場合
-        if '.T' in symbol:
-            base_symbol = symbol.replace('.T', '')
-            # 有名企業のマッピング
-            company_map = {
-                '7203': 'トヨタ自動車',
-                '9984': 'ソフトバンクグループ',
-                '6758': 'ソニーグループ',
-                '8035': '東京エレクトロン',
-                '4689': 'LINEヤフー',
-                '6861': 'キーエンス',
-                '9434': 'Softbank',
-                '4502': '武田薬品工業',
-                '8058': '三菱商事',
-                '9432': 'NTT'
-            }
+    def _merge_article_lists(self, article_lists: List[List[Dict]], limit: Optional[int] = None) -> List[Dict]:
+        """
+        公開日時の新しい順に並んだ銘柄ごとの記事リストをk-wayマージし、同一記事を1件にまとめる
+        
+        同一記事（正規化URLのハッシュが一致）は最初の1件に集約し、一致した銘柄を symbols に追加する。
+        limit 件に達した時点で打ち切る（同一記事は公開日時が等しいため、同時刻の記事までは確認する）。
+        """
+        merged = {}
+        result = []
+        last_published_at = None
+        
+        for article in heapq.merge(*article_lists, key=lambda x: x.get('publishedAt') or '', reverse=True):
+            published_at = article.get('publishedAt') or ''
+            if limit is not None and len(result) >= limit and published_at != last_published_at:
+                break
             
-            if base_symbol in company_map:
-                return f'"{company_map[base_symbol]}" OR "{symbol}" OR "{base_symbol}"'
-            else:
-                return f'"{symbol}" OR "{base_symbol}" OR "銘柄コード {base_symbol}"'
+            article_id = article_hash(article)
+            symbol = article.get('symbol', '')
+            if article_id in merged:
+                if symbol not in merged[article_id]['symbols']:
+                    merged[article_id]['symbols'].append(symbol)
+                continue
+            if limit is not None and len(result) >= limit:
+                continue
+            
+            article = dict(article)
+            article['id'] = article_id
+            article['symbols'] = [symbol]
+            merged[article_id] = article
+            result.append(article)
+            last_published_at = published_at
+        
+        return result
+    
+    def _group_symbols_for_query(self, symbols: List[str]) -> List[List[str]]:
+        """銘柄をクエリ長・銘柄数の上限内で1回のAPI呼び出しにまとめるグループに分割"""
+        batches = []
+        current_batch = []
+        current_length = 0
         
-        # 米国株などの場合
+        for symbol in symbols:
+            clause_length = len(self._build_search_query(symbol)) + 2  # 括弧
+            separator_length = len(' OR ') if current_batch else 0
+            
+            if current_batch and (len(current_batch) >= MAX_SYMBOLS_PER_QUERY or
+                                  current_length + separator_length + clause_length > MAX_QUERY_LENGTH):
+                batches.append(current_batch)
+                current_batch = []
+                current_length = 0
+                separator_length = 0
+            
+            current_batch.append(symbol)
+            current_length += separator_length + clause_length
+        
+        if current_batch:
+            batches.append(current_batch)
+        return batches
+    
+    def _fetch_batch_news(self, symbols: List[str], language: str, page_size: int) -> Dict[str, List[Dict]]:
+        """複数銘柄のニュースを1つのクエリでAPIから取得し、銘柄ごとに振り分けてキャッシュに保存"""
+        # 各銘柄の検索クエリ（日本の銘柄コードと企業名を考慮）をORで結合
+        if len(symbols) == 1:
+            query = self._build_search_query(symbols[0])
         else:
-            # 有名企業のマッピング
-            company_map = {
-                'AAPL': 'Apple',
-                'GOOGL': 'Google',
-                'MSFT': 'Microsoft',
-                'AMZN': 'Amazon',
-                'TSLA': 'Tesla',
-                'META': 'Meta',
-                'NFLX': 'Netflix',
-                'NVDA': 'NVIDIA'
-            }
+            query = ' OR '.join(f'({self._build_search_query(symbol)})' for symbol in symbols)
+        
+        # 全銘柄に十分な記事数の保存済みエントリがあれば、最も古い最新公開日時以降の差分だけを取得する
+        stored_entries = {symbol: self.cache.get_entry(symbol, language) for symbol in symbols}
+        since = None
+        if all(entry and entry['page_size'] >= page_size and entry['newest_published_at']
+               for entry in stored_entries.values()):
+            since = min(entry['newest_published_at'] for entry in stored_entries.values())
+        
+        # APIリクエストを送信。まとめたクエリは上限件数で要求し、記事の多い銘柄で切り詰められることを例外的にする
+        # （ページサイズによらず1回のリクエストとして数えられる）
+        requested = page_size if len(symbols) == 1 else MAX_PAGE_SIZE
+        self.cache.record_api_usage(symbols=len(symbols))
+        articles = self._fetch_news_from_api(query, language, requested, since=since)
+        if since is not None and len(articles) >= requested:
+            # 差分が上限件数に達した場合は since までの間に取得していない記事が残りうるため、保存済みの記事とマージしない。
+            # 新しい順の先頭 requested 件は期間全体を取得した場合と同じなので、取得し直さずに全件取得の結果として扱う
+            logger.info(f"{since} 以降の差分が上限の {requested} 件に達したため、全件取得の結果として扱います")
+            since = None
+        
+        # 記事に銘柄情報を追加
+        unverified = set()
+        if len(symbols) == 1:
+            articles_by_symbol = {symbols[0]: articles}
+        else:
+            articles_by_symbol = self._attribute_articles(articles, symbols)
+            unverified = self._refetch_underfilled(articles_by_symbol, language, page_size, since,
+                                                   truncated=len(articles) >= requested)
+        
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=NEWS_WINDOW_DAYS)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        for symbol, symbol_articles in articles_by_symbol.items():
+            for article in symbol_articles:
+                article['symbol'] = symbol
+                article['formatted_date'] = self._format_date(article.get('publishedAt', ''))
+            new_count = len(symbol_articles)
+            
+            stored_page_size = page_size
+            if since is not None:
+                # 差分を保存済みの記事にマージし、取得対象期間より古い記事を除外する
+                stored = stored_entries[symbol]
+                stored_page_size = max(page_size, stored['page_size'])
+                symbol_articles = self._merge_articles(symbol_articles, stored['articles'], cutoff)
+            symbol_articles = symbol_articles[:stored_page_size]
+            articles_by_symbol[symbol] = symbol_articles[:page_size]
+            
+            if not symbol_articles and symbol in unverified:
+                # 切り詰められた結果で記事がなかっただけの銘柄は、記事がないとはいえないためキャッシュしない
+                continue
             
-            if symbol in company_map:
-                return f'"{company_map[symbol]}" OR "{symbol}"'
+            # キャッシュに保存
+            self.cache.put(symbol, language, stored_page_size, symbol_articles)
+            
+            logger.info(f"{symbol} のニュース {new_count} 件を取得" + (f"（{since} 以降の差分）" if since else ""))
+        
+        return articles_by_symbol
+    
+    def _refetch_underfilled(self, articles_by_symbol: Dict[str, List[Dict]], language: str, page_size: int,
+                             since: Optional[str], truncated: bool) -> set:
+        """
+        まとめたクエリの結果が上限件数で切り詰められた場合に、記事が最も不足した銘柄を個別のクエリで取得し直す
+        
+        記事の多い銘柄に埋もれた銘柄の記事が不足するが、個別の取得はバッチあたり NEWS_BATCH_MAX_FOLLOWUPS 回までにし、
+        まとめて取得したことによるリクエスト数の削減を保つ。切り詰められていない結果で記事のない銘柄は、
+        記事がないものとしてそのままキャッシュする（次の更新まで取得し直さない）。
+        
+        Returns:
+            set: 切り詰められた結果で記事が1件もなく、取得し直していない銘柄
+        """
+        if not truncated:
+            return set()
+        underfilled = sorted((symbol for symbol, symbol_articles in articles_by_symbol.items()
+                              if len(symbol_articles) < page_size),
+                             key=lambda symbol: len(articles_by_symbol[symbol]))
+        for symbol in underfilled[:NEWS_BATCH_MAX_FOLLOWUPS]:
+            logger.info(f"まとめたクエリで記事が不足した {symbol} を個別に取得します "
+                        f"({len(articles_by_symbol[symbol])}/{page_size} 件)")
+            self.cache.record_api_usage(followups=1)
+            try:
+                articles_by_symbol[symbol] = self._fetch_news_from_api(
+                    self._build_search_query(symbol), language, page_size, since=since)
+            except Exception as e:
+                logger.warning(f"{symbol} のニュースの個別取得に失敗しました: {e}")
+        return {symbol for symbol in underfilled if not articles_by_symbol[symbol]}
+    
+    def _merge_articles(self, new_articles: List[Dict], stored_articles: List[Dict], cutoff: str) -> List[Dict]:
+        """新着記事と保存済み記事をURLで重複除去してマージし、cutoff より古い記事を除いて新しい順に並べる"""
+        merged = {}
+        for article in new_articles + stored_articles:
+            key = article.get('url') or article.get('title')
+            if key not in merged and (article.get('publishedAt') or '') >= cutoff:
+                merged[key] = article
+        return sorted(merged.values(), key=lambda x: x.get('publishedAt') or '', reverse=True)
+    
+    def _attribute_articles(self, articles: List[Dict], symbols: List[str]) -> Dict[str, List[Dict]]:
+        """
+        まとめて取得した記事をタイトル・説明文に含まれる検索語で銘柄に振り分ける
+        
+        複数銘柄に一致した記事は銘柄ごとにコピーされる。どの銘柄にも一致しない記事は除外する。
+        """
+        patterns = {symbol: self._compile_term_pattern(symbol) for symbol in symbols}
+        articles_by_symbol = {symbol: [] for symbol in symbols}
+        unmatched = 0
+        
+        for article in articles:
+            text = f"{article.get('title') or ''} {article.get('description') or ''}"
+            matched = [symbol for symbol, pattern in patterns.items() if pattern.search(text)]
+            if not matched:
+                unmatched += 1
+            for symbol in matched:
+                articles_by_symbol[symbol].append(dict(article))
+        
+        if unmatched:
+            logger.info(f"銘柄に振り分けられなかった記事 {unmatched} 件を除外しました")
+        return articles_by_symbol
+    
+    def _compile_term_pattern(self, symbol: str) -> re.Pattern:
+        """
+        銘柄の検索語のいずれかに一致する正規表現（英数字の語は単語境界で照合）
+        
+        会社名は大文字小文字を区別せずに照合する。銘柄コードは T・MA・F のように一般的な語と重なるため、
+        大文字小文字を区別し、アポストロフィ・& に続く場合（"won't"、"AT&T"）も語の途中とみなす。
+        """
+        codes = {symbol, symbol.replace('.T', '')}
+        alternatives = []
+        for term in self._get_search_terms(symbol):
+            escaped = re.escape(term)
+            if term in codes:
+                if term.isascii():
+                    escaped = rf"(?<![A-Za-z0-9'’&]){escaped}(?![A-Za-z0-9&])"
             else:
-                return f'"{symbol}"'
+                if term.isascii():
+                    escaped = rf'(?<![A-Za-z0-9]){escaped}(?![A-Za-z0-9])'
+                escaped = f'(?i:{escaped})'
+            alternatives.append(escaped)
+        return re.compile('|'.join(alternatives))
+    
+    def _error_article(self, symbol: str, message: str) -> Dict:
+        """取得エラーを表す記事エントリを作成"""
+        return {
+            'title': f'{symbol} のニュース取得エラー',
+            'description': f'エラー: {message}',
+            'publishedAt': datetime.now().isoformat(),
+            'formatted_date': datetime.now().strftime('%Y年%m月%d日 %H:%M'),
+            'url': '',
+            'symbol': symbol
+        }
     
-    def _fetch_news_from_api(self, query: str, language: str, page_size: int) -> List[Dict]:
-        """NewsAPIからニュースを取得"""
+    def _build_search_query(self, symbol: str) -> str:
+        """銘柄コードに基づいて検索クエリを構築"""
+        return ' OR '.join(f'"{term}"' for term in self._get_search_terms(symbol))
+    
+    def _get_search_terms(self, symbol: str) -> List[str]:
+        """銘柄の検索語（企業名・銘柄コード）のリストを取得"""
+        return get_symbol_registry().get_search_terms(symbol)
+    
+    def _fetch_news_from_api(self, query: str, language: str, page_size: int, since: str = None) -> List[Dict]:
+        """
+        NewsAPIからニュースを取得
+        
+        Args:
+            since: 指定された場合はこの公開日時（ISO形式）以降の記事のみを取得する
+        """
         url = f"{self.base_url}/everything"
         
-        # 日付範囲を設定（過去7日間）
-        from datetime import datetime, timedelta
+        # 日付範囲を設定（過去7日間、または since 以降）
         to_date = datetime.now()
-        from_date = to_date - timedelta(days=7)
+        from_date = to_date - timedelta(days=NEWS_WINDOW_DAYS)
         
         params = {
             'q': query,
             'sortBy': 'publishedAt',
-            'pageSize': min(page_size, 20),  # APIの制限
-            'apiKey': self.api_key,
+            'pageSize': min(page_size, MAX_PAGE_SIZE),  # APIの制限
             'from': from_date.strftime('%Y-%m-%d'),
             'to': to_date.strftime('%Y-%m-%d')
         }
+        if since:
+            # 差分取得では終了日時を指定せず最新までを対象にする
+            params['from'] = since.rstrip('Z')
+            del params['to']
         
         # 言語パラメータは英語以外の場合のみ追加
         if language != 'en':
             params['language'] = language
         
-        logger.info(f"NewsAPI リクエスト - クエリ: {query}, 言語: {language}, 期間: {params['from']} - {params['to']}")
-        
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
+        logger.info(f"NewsAPI リクエスト - クエリ: {query}, 言語: {language}, 期間: {params['from']} - {params.get('to', '現在')}")
         
-        data = response.json()
+        data = self._get_json(url, params)
         
         if data.get('status') == 'ok':
             articles = data.get('articles', [])
@@ -170,6 +672,20 @@ class NewsAPIClient:
             logger.error(f"NewsAPI エラー: {data.get('message', 'Unknown error')}")
             return []
     
+    def _get_json(self, url: str, params: Dict) -> Dict:
+        """
+        GETリクエストを送信してJSONを返す
+        
+        NewsAPI のレスポンスには ETag / Last-Modified が付かないため条件付きリクエストは行わず、
+        同じ内容の再取得はニュースキャッシュ（有効期間内は呼ばない・期限後は差分取得）で避ける。
+        """
+        self.cache.record_api_usage(requests=1)
+        with metrics.timer('upstream_fetch', 'newsapi'):
+            response = self.session.get(url, params=params, timeout=10)
+        
+        response.raise_for_status()
+        return response.json()
+    
     def _format_date(self, date_string: str) -> str:
         """日付文字列を日本語形式にフォーマット"""
         try:
@@ -189,6 +705,14 @@ class NewsAPIClient:
             logger.error(f"日付フォーマットエラー: {e}")
             return datetime.now(timezone(timedelta(hours=9))).strftime('%Y年%m月%d日 %H:%M')
     
+    def get_freshness(self, symbols: List[str], language: str = 'en') -> Dict[str, Optional[datetime]]:
+        """銘柄ごとのニュースの最終取得時刻を取得（未取得の銘柄はNone）"""
+        fetched_at = self.cache.get_fetched_at(symbols, language)
+        return {
+            symbol: datetime.fromtimestamp(fetched_at[symbol]) if symbol in fetched_at else None
+            for symbol in symbols
+        }
+    
     def get_news_for_symbol(self, symbol: str, language: str = 'en', page_size: int = 5) -> List[Dict]:
         """単一銘柄のニュースを取得"""
         return self.get_stock_news([symbol], language, page_size)
@@ -199,17 +723,178 @@ class NewsAPIClient:
         logger.info("ニュースキャッシュをクリアしました")
 
 
+class NewsRefresher:
+    """
+    ニュースキャッシュが期限切れになる前にバックグラウンドで更新するスケジューラ
+    
+    最近表示された銘柄（watch で登録され、NEWS_REFRESH_WATCH_WINDOW 以内のもの）のうち有効期限が近いものと、
+    期限切れのキャッシュを返した際に要求された銘柄を、API呼び出しの間隔を空けながら順に更新する。
+    当日のNewsAPIリクエスト数が daily_budget に達した後は更新せず、期限切れのキャッシュを返し続ける。
+    """
+    
+    def __init__(self, client: 'NewsAPIClient',
+                 check_interval: float = NEWS_REFRESH_CHECK_INTERVAL,
+                 refresh_margin: float = NEWS_REFRESH_MARGIN,
+                 stagger: float = NEWS_REFRESH_STAGGER,
+                 watch_window: float = NEWS_REFRESH_WATCH_WINDOW,
+                 daily_budget: int = NEWS_REFRESH_DAILY_BUDGET):
+        """
+        Args:
+            client: キャッシュの読み書きとAPI呼び出しに使うクライアント
+            check_interval: 監視対象の有効期限を確認する間隔（秒）
+            refresh_margin: 有効期限の何秒前から更新対象にするか
+            stagger: API呼び出しの間隔（秒）。レート制限を超えないよう更新を分散させる
+            watch_window: 最後に表示されてから監視対象にしておく期間（秒）
+            daily_budget: バックグラウンド更新を行う、当日のNewsAPIリクエスト数（全プロセスの合計）の上限
+        """
+        self.client = client
+        self.check_interval = check_interval
+        self.refresh_margin = refresh_margin
+        self.stagger = stagger
+        self.watch_window = watch_window
+        self.daily_budget = daily_budget
+        
+        # (language, page_size) -> 更新を要求された銘柄
+        self._requested = {}
+        # (symbol, language, page_size) -> 最後に表示された時刻
+        self._watched = {}
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._budget_exhausted_day = None
+        register_fork_reset(self)
+    
+    def _reset_after_fork(self):
+        """fork した子プロセスでは更新は動かない（開始は post_fork で改めて行う）"""
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """バックグラウンド更新を開始"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='news-refresher', daemon=True)
+        self._thread.start()
+        logger.info("ニュースのバックグラウンド更新を開始しました")
+    
+    @property
+    def is_running(self) -> bool:
+        """バックグラウンド更新が動作中かどうか"""
+        return self._thread is not None and self._thread.is_alive() and not self._stop_event.is_set()
+    
+    def stop(self):
+        """バックグラウンド更新を停止"""
+        self._stop_event.set()
+        self._wake_event.set()
+    
+    def watch(self, symbols: List[str], language: str, page_size: int):
+        """表示された銘柄を監視対象に登録（watch_window の間、期限切れ前に更新する）"""
+        now = time.time()
+        with self._lock:
+            for symbol in symbols:
+                self._watched[(symbol, language, page_size)] = now
+    
+    def request_refresh(self, symbols: List[str], language: str, page_size: int):
+        """指定された銘柄の更新を要求（すぐに更新処理を起こす）"""
+        with self._lock:
+            self._requested.setdefault((language, page_size), set()).update(symbols)
+        self._wake_event.set()
+    
+    def _due_symbols(self) -> Dict[tuple, set]:
+        """監視対象のうち有効期限が近い（または未取得の）銘柄を (language, page_size) ごとに取得"""
+        now = time.time()
+        watched = {}
+        with self._lock:
+            for key, watched_at in list(self._watched.items()):
+                if now - watched_at > self.watch_window:
+                    del self._watched[key]
+                else:
+                    symbol, language, page_size = key
+                    watched.setdefault((language, page_size), []).append(symbol)
+        
+        refresh_after = self.client.cache.ttl - self.refresh_margin
+        due = {}
+        for (language, page_size), symbols in watched.items():
+            fetched_at = self.client.cache.get_fetched_at(symbols, language)
+            due_symbols = {symbol for symbol in symbols
+                           if symbol not in fetched_at or now - fetched_at[symbol] >= refresh_after}
+            if due_symbols:
+                due[(language, page_size)] = due_symbols
+        return due
+    
+    def _within_budget(self) -> bool:
+        """当日のNewsAPIリクエスト数がバックグラウンド更新の上限未満か"""
+        if self.client.cache.api_requests_today() < self.daily_budget:
+            return True
+        today = datetime.now(timezone.utc).date()
+        if self._budget_exhausted_day != today:
+            self._budget_exhausted_day = today
+            logger.warning(f"本日のNewsAPIリクエスト数が上限 ({self.daily_budget}) に達したため、"
+                           f"ニュースのバックグラウンド更新を停止します")
+        return False
+    
+    def _run(self):
+        while not self._stop_event.is_set():
+            with self._lock:
+                jobs = self._requested
+                self._requested = {}
+            
+            try:
+                for job, symbols in self._due_symbols().items():
+                    jobs.setdefault(job, set()).update(symbols)
+            except Exception as e:
+                logger.error(f"監視対象銘柄の確認エラー: {e}")
+            
+            for (language, page_size), symbols in jobs.items():
+                for batch in self.client._group_symbols_for_query(sorted(symbols)):
+                    if self._stop_event.is_set():
+                        return
+                    if not self._within_budget():
+                        break
+                    try:
+                        self.client._fetch_batch_news(batch, language, page_size)
+                        logger.info(f"ニュースをバックグラウンド更新しました: {', '.join(batch)}")
+                    except Exception as e:
+                        logger.error(f"ニュースのバックグラウンド更新エラー ({', '.join(batch)}): {e}")
+                    # レート制限を考慮して次のAPI呼び出しまで間隔を空ける
+                    self._stop_event.wait(self.stagger)
+            
+            self._wake_event.wait(self.check_interval)
+            self._wake_event.clear()
+
+
 class NewsManager:
     def __init__(self):
         self.news_client = NewsAPIClient()
+        self.refresher = NewsRefresher(self.news_client)
+        self.news_client.refresher = self.refresher
+        # sentiment は article_hash を使うためここでimportする
+        from sentiment import SentimentScorer
+        self.sentiment_scorer = SentimentScorer()
+    
+    def start_background_refresh(self):
+        """ニュースのバックグラウンド更新を開始（ワーカープロセスごとに1度、run() または gunicorn の post_fork で呼ぶ）"""
+        if not self.news_client.api_key or self.news_client.api_key == 'your_news_api_key_here':
+            return
+        self.refresher.start()
+    
+    def prefetch_news(self, symbols: List[str], page_size: int):
+        """未取得の銘柄のニュースを取得してキャッシュする（表示とはみなさず、監視対象には登録しない）"""
+        self.news_client.get_stock_news(symbols, page_size=page_size, allow_stale=True)
     
-    def get_favorites_news(self, favorite_symbols: List[str], page_size: int = 5) -> Dict[str, any]:
+    def get_favorites_news(self, favorite_symbols: List[str], page_size: int = 5,
+                           limit: Optional[int] = None) -> Dict[str, any]:
         """
         お気に入り銘柄のニュースを取得
         
         Args:
             favorite_symbols: お気に入り銘柄のリスト
             page_size: 銘柄あたりの記事数
+            limit: 返す記事数の上限（新しい順。表示する件数を指定すると、マージ・センチメント計算をその件数で打ち切る）
         
         Returns:
             Dict: ニュース取得結果
@@ -222,13 +907,20 @@ class NewsManager:
             }
         
         try:
-            articles = self.news_client.get_stock_news(favorite_symbols, page_size=page_size)
+            # 期限切れのキャッシュも即座に返し、更新はバックグラウンドで行う
+            self.refresher.watch(favorite_symbols, 'en', page_size)
+            articles = self.news_client.get_stock_news(favorite_symbols, page_size=page_size, allow_stale=True,
+                                                       limit=limit)
+            scores = self.sentiment_scorer.score_articles(articles)
+            for article in articles:
+                article['sentiment'] = scores.get(article.get('id') or article_hash(article))
             
             return {
                 'success': True,
                 'message': f'{len(favorite_symbols)} 銘柄のニュース {len(articles)} 件を取得しました',
                 'articles': articles,
-                'symbols': favorite_symbols
+                'symbols': favorite_symbols,
+                'freshness': self.news_client.get_freshness(favorite_symbols)
             }
         
         except Exception as e:
@@ -239,18 +931,57 @@ class NewsManager:
                 'articles': []
             }
     
-    def format_news_for_display(self, articles: List[Dict]) -> str:
-        """ニュース記事を表示用にフォーマット"""
+    def get_sentiment_series(self, symbols: List[str], page_size: int = 20) -> Dict[str, List[Dict]]:
+        """
+        銘柄ごとの日次センチメントの時系列を取得
+        
+        Args:
+            symbols: 銘柄のリスト
+            page_size: 銘柄あたりの集計対象の記事数
+        
+        Returns:
+            Dict: symbol -> [{'date', 'score', 'count'}, ...]（取得に失敗した場合は空）
+        """
+        if not symbols:
+            return {}
+        
+        try:
+            self.refresher.watch(symbols, 'en', page_size)
+            articles = self.news_client.get_stock_news(symbols, page_size=page_size, allow_stale=True)
+            series = self.sentiment_scorer.aggregate_by_symbol(articles)
+            return {symbol: series[symbol] for symbol in symbols if symbol in series}
+        except Exception as e:
+            logger.error(f"センチメント集計エラー: {e}")
+            return {}
+    
+    def get_news_version(self, symbols: List[str], language: str = 'en') -> Dict[str, float]:
+        """
+        銘柄ごとのニュースキャッシュの版（最終取得時刻のUNIX時間。未取得の銘柄は含まない）
+        
+        キャッシュを参照するだけで NewsAPI は呼ばないため、グラフのキャッシュキーなどの作成に使える。
+        """
+        return self.news_client.cache.get_fetched_at(symbols, language)
+    
+    def format_news_for_display(self, articles: List[Dict], page: int = 1, per_page: int = 20) -> str:
+        """
+        ニュース記事を表示用にフォーマット
+        
+        Args:
+            articles: 記事のリスト
+            page: 表示するページ番号（1始まり）
+            per_page: 1ページあたりの記事数
+        """
         if not articles:
             return "ニュース記事がありません。"
         
         formatted_news = []
+        start = (max(page, 1) - 1) * per_page
         
-        for i, article in enumerate(articles[:20], 1):  # 最大20件
+        for i, article in enumerate(articles[start:start + per_page], start + 1):
             title = article.get('title', 'タイトルなし')
             description = article.get('description', '')
             date = article.get('formatted_date', '')
-            symbol = article.get('symbol', '')
+            symbol = ', '.join(article.get('symbols') or [article.get('symbol', '')])
             url = article.get('url', '')
             
             # 説明文を短縮
@@ -0,0 +1,163 @@
+import io
+import os
+import re
+import time
+import pstats
+import cProfile
+import threading
+from datetime import datetime
+from functools import wraps
+from typing import Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# プロファイルの取得モード（off: 取得しない, request: ?profile=1 を付けたページからの呼び出しのみ, always: すべて）
+PROFILE_MODE = os.getenv('STOCK_APP_PROFILE', 'off').strip().lower()
+# プロファイルの保存先ディレクトリと保持するプロファイル数（古いものから削除する）
+PROFILE_DIR = os.getenv('STOCK_APP_PROFILE_DIR', 'profiles')
+PROFILE_KEEP = int(os.getenv('STOCK_APP_PROFILE_KEEP', '50'))
+# request モードでプロファイルを要求するクエリパラメーター
+PROFILE_QUERY_PARAM = 'profile'
+# 要約に出力する関数の数
+PROFILE_SUMMARY_LIMIT = 30
+
+if PROFILE_MODE not in ('off', 'request', 'always'):
+    logger.warning(f"STOCK_APP_PROFILE が不正な値のため off として扱います: {PROFILE_MODE}")
+    PROFILE_MODE = 'off'
+
+# cProfile（Python 3.12 以降）はプロセス内で同時に1つしか有効にできず、有効な間は全スレッドの呼び出しを記録する
+_profile_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    """プロファイルを取得するモードかどうか"""
+    return PROFILE_MODE != 'off'
+
+
+def _profile_requested() -> bool:
+    """呼び出し元のリクエスト（またはコールバックを実行したページのURL）で ?profile=1 が指定されているか"""
+    from urllib.parse import parse_qs, urlparse
+    from dash import callback_context
+    
+    try:
+        # バックグラウンドコールバックのジョブでも元のリクエストの値を参照できる
+        args = callback_context.args or {}
+        headers = callback_context.headers or {}
+    except Exception:
+        import flask
+        if not flask.has_request_context():
+            return False
+        args = flask.request.args
+        headers = flask.request.headers
+    
+    if str(args.get(PROFILE_QUERY_PARAM, '')) in ('1', 'true'):
+        return True
+    # Dash のコールバックはページのURLではなく /_dash-update-component に送られるため、Referer も確認する
+    referer = headers.get('Referer') or headers.get('referer') or ''
+    values = parse_qs(urlparse(referer).query).get(PROFILE_QUERY_PARAM, [])
+    return any(value in ('1', 'true') for value in values)
+
+
+def _should_profile() -> bool:
+    if PROFILE_MODE == 'always':
+        return True
+    try:
+        return _profile_requested()
+    except Exception:
+        return False
+
+
+def profiled(func):
+    """
+    呼び出しを cProfile で計測し、PROFILE_DIR にプロファイルと要約を保存するデコレータ
+    
+    STOCK_APP_PROFILE が off の場合は関数をそのまま返す（ラップしないため計測のコストはかからない）。
+    他のプロファイルの取得中に呼ばれた場合は、その呼び出しは取得中のプロファイルに含まれる。
+    """
+    if not is_enabled():
+        return func
+    label = func.__qualname__.split('<locals>.')[-1]
+    
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _should_profile() or not _profile_lock.acquire(blocking=False):
+            return func(*args, **kwargs)
+        try:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # デバッガなど他のツールがプロファイラを使用中
+                return func(*args, **kwargs)
+            started_at = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                save_profile(profile, label, time.perf_counter() - started_at)
+        finally:
+            _profile_lock.release()
+    return wrapper
+
+
+def profile_methods(cls):
+    """クラスの公開メソッドに profiled を適用するクラスデコレータ（off の場合はクラスをそのまま返す）"""
+    if not is_enabled():
+        return cls
+    for name, value in list(vars(cls).items()):
+        if not name.startswith('_') and callable(value) and not isinstance(value, (staticmethod, classmethod, type)):
+            setattr(cls, name, profiled(value))
+    return cls
+
+
+def save_profile(profile: cProfile.Profile, label: str, elapsed: float) -> Optional[str]:
+    """
+    プロファイル（.prof）と呼び出し経路の要約（.txt）を保存し、古いプロファイルを削除する
+    
+    Returns:
+        str: 保存したプロファイルのパス（保存できなかった場合はNone）
+    """
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        base = os.path.join(PROFILE_DIR, f"{timestamp}_{os.getpid()}_{re.sub(r'[^A-Za-z0-9_.-]', '_', label)}")
+        profile.dump_stats(f"{base}.prof")
+        with open(f"{base}.txt", 'w', encoding='utf-8') as f:
+            f.write(_summarize(profile, label, elapsed))
+        _rotate()
+        logger.info(f"プロファイルを保存しました: {base}.prof ({label}, {elapsed:.3f}秒)")
+        return f"{base}.prof"
+    except Exception as e:
+        logger.warning(f"プロファイルの保存エラー ({label}): {e}")
+        return None
+
+
+def _summarize(profile: cProfile.Profile, label: str, elapsed: float) -> str:
+    """累積時間順・自己時間順の上位の関数と、自己時間の長い関数の呼び出し元"""
+    stream = io.StringIO()
+    stream.write(f"{label}: {elapsed:.3f}秒 (pid {os.getpid()}, mode {PROFILE_MODE})\n")
+    stream.write("他のスレッドの呼び出しも含まれます（ThreadPoolExecutor での取得や同時に処理中の他のリクエスト）\n\n")
+    stats = pstats.Stats(profile, stream=stream).strip_dirs()
+    stream.write("== 累積時間順 ==\n")
+    stats.sort_stats('cumulative').print_stats(PROFILE_SUMMARY_LIMIT)
+    stream.write("== 自己時間順 ==\n")
+    stats.sort_stats('tottime').print_stats(PROFILE_SUMMARY_LIMIT)
+    stream.write("== 自己時間の長い関数の呼び出し元 ==\n")
+    stats.print_callers(10)
+    return stream.getvalue()
+
+
+def _rotate():
+    """保存数が PROFILE_KEEP を超えた分を古いものから削除"""
+    profiles = sorted(
+        (os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR) if name.endswith('.prof')),
+        key=os.path.getmtime
+    )
+    for path in profiles[:max(0, len(profiles) - PROFILE_KEEP)]:
+        for stale in (path, path[:-len('.prof')] + '.txt'):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,151 @@
+import re
+import math
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional
+import logging
+
+from news_api import article_hash
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# スコアをキャッシュする記事数の上限
+SENTIMENT_CACHE_SIZE = 10000
+
+# 金融ニュース向けの極性辞書（英語は単語単位、日本語は部分一致で照合する）
+POSITIVE_WORDS = {
+    'beat', 'beats', 'boost', 'boosts', 'boosted', 'bullish', 'climb', 'climbs', 'climbed', 'gain', 'gains',
+    'gained', 'growth', 'grow', 'grows', 'higher', 'high', 'record', 'rally', 'rallies', 'rallied', 'rebound',
+    'rebounds', 'rise', 'rises', 'rising', 'rose', 'soar', 'soars', 'soared', 'surge', 'surges', 'surged',
+    'strong', 'stronger', 'strength', 'outperform', 'outperforms', 'upgrade', 'upgrades', 'upgraded', 'profit',
+    'profits', 'profitable', 'positive', 'optimistic', 'optimism', 'exceed', 'exceeds', 'exceeded', 'jump',
+    'jumps', 'jumped', 'win', 'wins', 'won', 'success', 'successful', 'innovative', 'innovation', 'expand',
+    'expands', 'expansion', 'buyback', 'dividend', 'approval', 'approved', 'breakthrough', 'recover',
+    'recovers', 'recovery', 'improve', 'improves', 'improved', 'improvement', 'robust', 'top', 'tops', 'best',
+}
+NEGATIVE_WORDS = {
+    'bearish', 'cut', 'cuts', 'decline', 'declines', 'declined', 'drop', 'drops', 'dropped', 'fall', 'falls',
+    'fell', 'falling', 'loss', 'losses', 'lose', 'loses', 'lost', 'lower', 'low', 'miss', 'misses', 'missed',
+    'plunge', 'plunges', 'plunged', 'slump', 'slumps', 'slumped', 'tumble', 'tumbles', 'tumbled', 'sink',
+    'sinks', 'sank', 'weak', 'weaker', 'weakness', 'downgrade', 'downgrades', 'downgraded', 'underperform',
+    'lawsuit', 'sue', 'sues', 'sued', 'probe', 'investigation', 'fine', 'fined', 'penalty', 'recall',
+    'recalls', 'layoff', 'layoffs', 'bankruptcy', 'bankrupt', 'default', 'fraud', 'scandal', 'warning',
+    'warns', 'warned', 'risk', 'risks', 'concern', 'concerns', 'fear', 'fears', 'negative', 'pessimistic',
+    'crash', 'crashes', 'crashed', 'selloff', 'sell-off', 'volatile', 'volatility', 'delay', 'delays',
+    'delayed', 'halt', 'halts', 'halted', 'shortage', 'tariff', 'tariffs', 'worst',
+}
+POSITIVE_WORDS_JA = [
+    '上昇', '急騰', '反発', '最高値', '増益', '増収', '黒字', '好調', '上方修正', '好決算', '過去最高',
+    '買い', '拡大', '成長', '回復', '改善', '承認', '提携', '増配', '自社株買い',
+]
+NEGATIVE_WORDS_JA = [
+    '下落', '急落', '反落', '最安値', '減益', '減収', '赤字', '不振', '下方修正', '売り', '縮小',
+    '悪化', '懸念', '訴訟', '不正', 'リコール', '減配', '破綻', '延期', '停止',
+]
+# 直後（3語以内）の極性を反転させる否定語
+NEGATIONS = {'not', 'no', 'never', "n't", 'without', 'nor', "didn't", "doesn't", "isn't", "wasn't", "won't"}
+
+_TOKEN_PATTERN = re.compile(r"[a-z]+(?:[-'][a-z]+)*")
+
+
+class SentimentScorer:
+    """
+    辞書ベースのニュース記事センチメントスコアラー（外部サービスを使わない）
+    
+    記事のタイトルと説明文から -1.0（ネガティブ）〜 1.0（ポジティブ）のスコアを算出し、
+    記事の識別子（正規化URLのハッシュ）ごとにキャッシュして同じ記事を再計算しない。
+    """
+    
+    def __init__(self, cache_size: int = SENTIMENT_CACHE_SIZE):
+        self.cache_size = cache_size
+        # article_hash -> スコア（古いものから破棄）
+        self.cache = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def score_text(self, text: str) -> float:
+        """テキストのセンチメントスコアを算出"""
+        if not text:
+            return 0.0
+        
+        raw_score = 0.0
+        negate_window = 0
+        for token in _TOKEN_PATTERN.findall(text.lower()):
+            if token in NEGATIONS or token.endswith("n't"):
+                negate_window = 3
+                continue
+            
+            polarity = 1 if token in POSITIVE_WORDS else -1 if token in NEGATIVE_WORDS else 0
+            if polarity and negate_window:
+                polarity = -polarity
+            raw_score += polarity
+            negate_window = max(0, negate_window - 1)
+        
+        raw_score += sum(text.count(word) for word in POSITIVE_WORDS_JA)
+        raw_score -= sum(text.count(word) for word in NEGATIVE_WORDS_JA)
+        
+        # 語数に対して飽和するよう -1〜1 に正規化
+        return raw_score / math.sqrt(raw_score * raw_score + 4) if raw_score else 0.0
+    
+    def score_articles(self, articles: List[Dict]) -> Dict[str, float]:
+        """
+        記事をまとめてスコアリングする（キャッシュ済みの記事は再計算しない）
+        
+        Returns:
+            Dict: article_hash -> スコア
+        """
+        scores = {}
+        unscored = []
+        with self._lock:
+            for article in articles:
+                article_id = article.get('id') or article_hash(article)
+                if article_id in self.cache:
+                    self.cache.move_to_end(article_id)
+                    scores[article_id] = self.cache[article_id]
+                elif article_id not in scores:
+                    scores[article_id] = None
+                    unscored.append((article_id, article))
+        
+        computed = {
+            article_id: self.score_text(f"{article.get('title') or ''}. {article.get('description') or ''}")
+            for article_id, article in unscored
+        }
+        
+        with self._lock:
+            for article_id, score in computed.items():
+                self.cache[article_id] = score
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        
+        scores.update(computed)
+        return scores
+    
+    def aggregate_by_symbol(self, articles: List[Dict],
+                            scores: Optional[Dict[str, float]] = None) -> Dict[str, List[Dict]]:
+        """
+        銘柄ごと・日ごとの平均センチメントの時系列を作成する
+        
+        Returns:
+            Dict: symbol -> [{'date': 'YYYY-MM-DD', 'score': 平均スコア, 'count': 記事数}, ...]（日付順）
+        """
+        if scores is None:
+            scores = self.score_articles(articles)
+        
+        # symbol -> date -> スコアのリスト
+        daily_scores = defaultdict(lambda: defaultdict(list))
+        for article in articles:
+            published_at = article.get('publishedAt') or ''
+            if not article.get('url') or len(published_at) < 10:
+                # エラー記事など実際の記事でないものは集計しない
+                continue
+            score = scores.get(article.get('id') or article_hash(article))
+            for symbol in article.get('symbols') or [article.get('symbol', '')]:
+                daily_scores[symbol][published_at[:10]].append(score)
+        
+        return {
+            symbol: [
+                {'date': date, 'score': sum(values) / len(values), 'count': len(values)}
+                for date, values in sorted(by_date.items())
+            ]
+            for symbol, by_date in daily_scores.items()
+        }
@@ -0,0 +1,175 @@
+import os
+import time
+import pickle
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+import logging
+
+from fork_safety import keep_inherited, register_fork_reset
+from metrics import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 保持するエントリ数・合計サイズ（バイト）の上限（超えた分は最後に参照された時刻の古いものから削除）
+SHARED_CACHE_MAX_ENTRIES = 500
+SHARED_CACHE_MAX_BYTES = int(os.getenv('STOCK_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+# 参照時刻を更新する間隔（秒）。読み込みのたびに書き込みが発生しないよう、この間隔より古い場合のみ更新する
+SHARED_CACHE_TOUCH_INTERVAL = 60
+
+
+class SharedDataCache:
+    """
+    ワーカープロセス間で共有するデータキャッシュ（SQLite）
+    
+    本番モードの複数ワーカーが同じ株価データをそれぞれ取得・保持しないよう、取得結果をpickleして
+    1つのファイルに保存する。上限を超えた分は最後に参照された時刻の古いものから削除する（有効期限の
+    長いエントリが残り続けて、保存したばかりのエントリが削除されることはない）。
+    キャッシュの読み書きに失敗した場合はキャッシュなしとして動作する。
+    """
+    
+    def __init__(self, path: str = None, max_entries: int = SHARED_CACHE_MAX_ENTRIES,
+                 max_bytes: int = SHARED_CACHE_MAX_BYTES):
+        """
+        Args:
+            path: SQLiteファイルのパス（未指定時は環境変数 STOCK_CACHE_PATH、デフォルト: stock_cache.sqlite3）
+            max_entries: 保持するエントリ数の上限
+            max_bytes: 保持する値の合計サイズの上限（バイト）
+        """
+        self.path = path or os.getenv('STOCK_CACHE_PATH', 'stock_cache.sqlite3')
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        
+        self._connection = self._connect()
+        register_fork_reset(self)
+        with self._lock:
+            if self.path != ':memory:':
+                # 複数プロセスからの読み込みと書き込みを並行できるようにする
+                self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS shared_cache (
+                    key TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    accessed_at REAL NOT NULL DEFAULT 0
+                )
+            """)
+            # 参照時刻・サイズを記録する前のキャッシュファイルからの移行
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(shared_cache)")]
+            if 'size' not in columns:
+                self._connection.execute("ALTER TABLE shared_cache ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                self._connection.execute("UPDATE shared_cache SET size = length(value)")
+            if 'accessed_at' not in columns:
+                self._connection.execute("ALTER TABLE shared_cache ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_shared_cache_expires_at ON shared_cache (expires_at)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_shared_cache_accessed_at ON shared_cache (accessed_at)"
+            )
+            self._connection.commit()
+    
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+    
+    def _reset_after_fork(self):
+        """fork したワーカーではキャッシュファイルを開き直す"""
+        self._lock = threading.Lock()
+        if self.path != ':memory:':
+            keep_inherited(self._connection)
+            self._connection = self._connect()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """有効期限内の値を取得（ない場合はNone）"""
+        try:
+            now = time.time()
+            with self._lock:
+                row = self._connection.execute(
+                    "SELECT value, accessed_at FROM shared_cache WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone()
+                if row and now - row[1] >= SHARED_CACHE_TOUCH_INTERVAL:
+                    self._touch([key], now)
+            return pickle.loads(row[0]) if row else None
+        except Exception as e:
+            logger.warning(f"共有キャッシュの読み込みエラー ({key}): {e}")
+            return None
+    
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """有効期限内の値をまとめて取得（ない値は含まない）"""
+        if not keys:
+            return {}
+        try:
+            now = time.time()
+            with self._lock:
+                rows = self._connection.execute(
+                    f"SELECT key, value, accessed_at FROM shared_cache WHERE key IN ({', '.join('?' * len(keys))}) "
+                    "AND expires_at > ?",
+                    (*keys, now)
+                ).fetchall()
+                stale = [key for key, _, accessed_at in rows if now - accessed_at >= SHARED_CACHE_TOUCH_INTERVAL]
+                if stale:
+                    self._touch(stale, now)
+            return {key: pickle.loads(value) for key, value, _ in rows}
+        except Exception as e:
+            logger.warning(f"共有キャッシュの読み込みエラー ({len(keys)}件): {e}")
+            return {}
+    
+    def set(self, key: str, value: Any, ttl: float):
+        """値を有効期間 ttl 秒で保存"""
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            if len(blob) > self.max_bytes:
+                logger.warning(f"共有キャッシュの上限より大きいため保存しません ({key}: {len(blob)} バイト)")
+                return
+            now = time.time()
+            with self._lock:
+                self._connection.execute(
+                    """
+                    INSERT OR REPLACE INTO shared_cache (key, expires_at, value, size, accessed_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (key, now + ttl, blob, len(blob), now)
+                )
+                self._evict(now)
+                self._connection.commit()
+        except Exception as e:
+            logger.error(f"共有キャッシュの書き込みエラー ({key}): {e}")
+            metrics.inc('stock_app_operation_errors_total', operation='cache_write', name='shared_cache')
+    
+    def _evict(self, now: float):
+        """期限切れのエントリと、件数・合計サイズの上限を超えた分を参照時刻の古いものから削除（ロック内で呼ぶ）"""
+        self._connection.execute("DELETE FROM shared_cache WHERE expires_at <= ?", (now,))
+        count, total_size = self._connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM shared_cache"
+        ).fetchone()
+        if count <= self.max_entries and total_size <= self.max_bytes:
+            return
+        evicted = self._connection.execute("""
+            DELETE FROM shared_cache WHERE key IN (
+                SELECT key FROM (
+                    SELECT key,
+                           ROW_NUMBER() OVER (ORDER BY accessed_at DESC) AS position,
+                           SUM(size) OVER (ORDER BY accessed_at DESC ROWS UNBOUNDED PRECEDING) AS kept_size
+                    FROM shared_cache
+                )
+                WHERE position > ? OR kept_size > ?
+            )
+        """, (self.max_entries, self.max_bytes)).rowcount
+        logger.debug(f"共有キャッシュの上限を超えた {evicted} 件を削除しました")
+    
+    def _touch(self, keys: List[str], now: float):
+        """参照時刻を更新（ロック内で呼ぶ）"""
+        self._connection.executemany(
+            "UPDATE shared_cache SET accessed_at = ? WHERE key = ?", [(now, key) for key in keys]
+        )
+        self._connection.commit()
+    
+    def clear(self):
+        """キャッシュを全削除"""
+        with self._lock:
+            self._connection.execute("DELETE FROM shared_cache")
+            self._connection.commit()
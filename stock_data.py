@@ -1,16 +1,86 @@
-import yfinance as yf
-import pandas as pd
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
-from database import FavoriteStockManager
-from news_api import NewsManager
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from fork_safety import register_fork_reset
+from metrics import metrics
+from profiling import profile_methods
+from shared_cache import SharedDataCache
+
+# yfinance / pandas / DB / NewsAPI は起動を遅くするため初回利用時にimportする
+if TYPE_CHECKING:
+    import pandas as pd
+    from database import FavoriteStockManager
+    from live_quotes import LiveQuoteHub
+    from news_api import NewsManager
+
+# 複数銘柄を並列取得する際のスレッド数の上限（yfinanceへの同時接続数）
+MAX_FETCH_WORKERS = 8
+
+# 銘柄検証結果のキャッシュ有効期間（有効な銘柄は長く、無効な銘柄は短く保持する）
+VALID_SYMBOL_TTL = timedelta(hours=24)
+INVALID_SYMBOL_TTL = timedelta(minutes=10)
 
+# 株価データのキャッシュ有効期間（指標の切り替えなどで同じデータを再取得しない）
+STOCK_DATA_TTL = timedelta(minutes=5)
 
+# 会社情報の共有キャッシュの有効期間（ほとんど変化しないため長くする）
+COMPANY_INFO_TTL = timedelta(hours=24)
+
+# チャートに同時に表示できる銘柄数の上限
+MAX_CHART_SYMBOLS = 50
+
+
+@profile_methods
 class StockDataManager:
     def __init__(self):
-        self.cache = {}
-        self.favorites_manager = FavoriteStockManager()
-        self.news_manager = NewsManager()
+        # "{symbol}_{period}" -> 株価データ（ワーカープロセス・バックグラウンドジョブ間で共有する）
+        self.cache = SharedDataCache()
+        self.info_cache = {}
+        self._info_lock = threading.Lock()
+        self._favorites_manager = None
+        self._news_manager = None
+        self._live_quote_hub = None
+        self._init_lock = threading.Lock()
+        register_fork_reset(self)
+    
+    def _reset_after_fork(self):
+        """fork した子プロセスでは、親プロセスの他のスレッド（事前取得など）が保持していたロックを作り直す"""
+        self._info_lock = threading.Lock()
+        self._init_lock = threading.Lock()
+    
+    @property
+    def favorites_manager(self) -> FavoriteStockManager:
+        """お気に入り銘柄マネージャー（初回アクセス時に生成）"""
+        if self._favorites_manager is None:
+            with self._init_lock:
+                if self._favorites_manager is None:
+                    from database import FavoriteStockManager
+                    self._favorites_manager = FavoriteStockManager(shared_cache=self.cache)
+        return self._favorites_manager
+    
+    @property
+    def news_manager(self) -> NewsManager:
+        """ニュースマネージャー（初回アクセス時に生成）"""
+        if self._news_manager is None:
+            with self._init_lock:
+                if self._news_manager is None:
+                    from news_api import NewsManager
+                    self._news_manager = NewsManager()
+        return self._news_manager
+    
+    @property
+    def live_quote_hub(self) -> LiveQuoteHub:
+        """ライブ更新用の最新の日足の取得（初回アクセス時に生成）"""
+        if self._live_quote_hub is None:
+            with self._init_lock:
+                if self._live_quote_hub is None:
+                    from live_quotes import LiveQuoteHub
+                    self._live_quote_hub = LiveQuoteHub(shared_cache=self.cache)
+        return self._live_quote_hub
     
     def get_stock_data(self, symbol: str, period: str = "1y") -> Optional[pd.DataFrame]:
         """
@@ -20,25 +90,100 @@ class StockDataManager:
             symbol: 株価コード (例: "AAPL", "7203.T")
             period: 期間 ("1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd", "max")
         
+        Returns:
+            pandas.DataFrame: 株価データ
+        """
+        data = self.cache.get(f"{symbol}_{period}")
+        metrics.record_cache('stock_data', data is not None)
+        if data is not None:
+            return data
+        return self.refresh_stock_data(symbol, period)
+    
+    def refresh_stock_data(self, symbol: str, period: str = "1y", ttl: Optional[float] = None) -> Optional[pd.DataFrame]:
+        """
+        キャッシュを使わずに株価データを取得し、キャッシュし直す
+        
+        Args:
+            symbol: 株価コード
+            period: 期間
+            ttl: キャッシュの有効期間（秒）。未指定時は STOCK_DATA_TTL
+        
         Returns:
             pandas.DataFrame: 株価データ
         """
         try:
-            cache_key = f"{symbol}_{period}"
+            import yfinance as yf
             
             ticker = yf.Ticker(symbol)
-            data = ticker.history(period=period)
+            with metrics.timer('upstream_fetch', 'yfinance.history'):
+                data = ticker.history(period=period)
             
             if data.empty:
                 return None
             
-            self.cache[cache_key] = data
+            self.cache.set(f"{symbol}_{period}", data, ttl if ttl is not None else STOCK_DATA_TTL.total_seconds())
+            self._set_validation(symbol, True)
             return data
             
         except Exception as e:
             print(f"Error fetching data for {symbol}: {e}")
             return None
     
+    def get_stock_data_batch(self, symbols: List[str], period: str = "1y",
+                             max_workers: int = MAX_FETCH_WORKERS) -> Dict[str, Optional[pd.DataFrame]]:
+        """
+        複数銘柄の株価データをまとめて取得する（キャッシュは1回で読み、未キャッシュの銘柄は並列取得）
+        
+        Args:
+            symbols: 株価コードのリスト
+            period: 期間
+            max_workers: 並列取得のスレッド数の上限
+        
+        Returns:
+            Dict: 銘柄コード -> 株価データ（取得できなかった銘柄はNone）
+        """
+        cached = self.cache.get_many([f"{symbol}_{period}" for symbol in symbols])
+        result = {symbol: cached.get(f"{symbol}_{period}") for symbol in symbols}
+        missing = [symbol for symbol, data in result.items() if data is None]
+        # キャッシュにない銘柄は get_stock_data で記録される
+        for _ in range(len(symbols) - len(missing)):
+            metrics.record_cache('stock_data', True)
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+                result.update(zip(missing, executor.map(lambda symbol: self.get_stock_data(symbol, period), missing)))
+        return result
+    
+    def get_live_stock_data(self, symbols: List[str], period: str = "1y") -> Dict[str, pd.DataFrame]:
+        """
+        株価データに最新の日足を反映したものを取得する（ライブ更新用）
+        
+        Args:
+            symbols: 株価コードのリスト
+            period: 期間
+        
+        Returns:
+            Dict: 銘柄コード -> 終値（Close列）のデータ。インデックスは日付の文字列 ("YYYY-MM-DD")
+        """
+        latest_bars = self.live_quote_hub.get_latest_bars(symbols)
+        history = self.get_stock_data_batch(symbols, period)
+        
+        result = {}
+        for symbol in symbols:
+            data = history[symbol]
+            if data is None or data.empty:
+                continue
+            
+            closes = data['Close'].copy()
+            closes.index = closes.index.strftime('%Y-%m-%d')
+            bars = latest_bars.get(symbol)
+            if bars is not None:
+                # 株価データの最終日（取得時点の当日の足）以降だけを最新の値で置き換える
+                latest = bars['Close'].copy()
+                latest.index = latest.index.strftime('%Y-%m-%d')
+                closes = latest[latest.index >= closes.index[-1]].combine_first(closes)
+            result[symbol] = closes.to_frame('Close')
+        return result
+    
     def get_stock_data_range(self, symbol: str, start_date: str, end_date: str) -> Optional[pd.DataFrame]:
         """
         指定期間の株価データを取得する
@@ -52,12 +197,15 @@ class StockDataManager:
             pandas.DataFrame: 株価データ
         """
         try:
+            import yfinance as yf
+            
             ticker = yf.Ticker(symbol)
             data = ticker.history(start=start_date, end=end_date)
             
             if data.empty:
                 return None
-                
+            
+            self._set_validation(symbol, True)
             return data
             
         except Exception as e:
@@ -74,19 +222,64 @@ class StockDataManager:
         Returns:
             Dict: 会社情報
         """
+        with self._info_lock:
+            if symbol in self.info_cache:
+                metrics.record_cache('company_info', True)
+                return dict(self.info_cache[symbol])
+        
+        # 他のワーカー（キャッシュの事前取得など）が取得済みの会社情報
+        company_info = self.cache.get(f"info_{symbol}")
+        metrics.record_cache('company_info', company_info is not None)
+        if company_info is not None:
+            with self._info_lock:
+                self.info_cache[symbol] = company_info
+            return dict(company_info)
+        
         try:
+            import yfinance as yf
+            
             ticker = yf.Ticker(symbol)
-            info = ticker.info
-            return {
+            with metrics.timer('upstream_fetch', 'yfinance.info'):
+                info = ticker.info
+            company_info = {
                 'shortName': info.get('shortName', symbol),
                 'longName': info.get('longName', symbol),
                 'currency': info.get('currency', 'USD'),
                 'exchange': info.get('exchange', 'Unknown')
             }
+            
+            # 会社情報はほとんど変化しないため、取得に成功した場合のみキャッシュする
+            with self._info_lock:
+                self.info_cache[symbol] = company_info
+            self.cache.set(f"info_{symbol}", company_info, COMPANY_INFO_TTL.total_seconds())
+            
+            # 銘柄一覧にない銘柄を銘柄レジストリに追加（入力補完・ニュース検索で利用）
+            from symbol_registry import get_symbol_registry
+            get_symbol_registry().register(symbol, company_info['shortName'],
+                                           exchange=company_info['exchange'], overwrite=False)
+            return dict(company_info)
         except Exception as e:
             print(f"Error fetching info for {symbol}: {e}")
             return {'shortName': symbol, 'longName': symbol, 'currency': 'USD', 'exchange': 'Unknown'}
     
+    def get_company_infos(self, symbols: List[str], max_workers: int = MAX_FETCH_WORKERS) -> Dict[str, Dict]:
+        """
+        複数銘柄の会社情報をまとめて取得する（未キャッシュの銘柄は並列取得）
+        
+        Args:
+            symbols: 株価コードのリスト
+            max_workers: 並列取得のスレッド数の上限
+        
+        Returns:
+            Dict: 銘柄コード -> 会社情報
+        """
+        if not symbols:
+            return {}
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(symbols))) as executor:
+            infos = executor.map(self.get_company_info, symbols)
+            return dict(zip(symbols, infos))
+    
     def validate_symbol(self, symbol: str) -> bool:
         """
         株価コードの有効性を検証する
@@ -97,13 +290,36 @@ class StockDataManager:
         Returns:
             bool: 有効な場合True
         """
+        cached = self._get_validation(symbol)
+        metrics.record_cache('symbol_validation', cached is not None)
+        if cached is not None:
+            return cached
+        
         try:
+            import yfinance as yf
+            
             ticker = yf.Ticker(symbol)
-            data = ticker.history(period="1d")
-            return not data.empty
-        except:
+            with metrics.timer('upstream_fetch', 'yfinance.history'):
+                data = ticker.history(period="1d")
+            is_valid = not data.empty
+        except Exception as e:
+            # 通信エラー等は銘柄の無効を意味しないためキャッシュしない
+            print(f"Error validating {symbol}: {e}")
             return False
+        
+        self._set_validation(symbol, is_valid)
+        return is_valid
+    
+    def _get_validation(self, symbol: str) -> Optional[bool]:
+        """共有キャッシュの検証結果を取得（未キャッシュ・期限切れの場合はNone）"""
+        return self.cache.get(f"valid_{symbol.upper()}")
     
+    def _set_validation(self, symbol: str, is_valid: bool):
+        """検証結果を共有キャッシュに保存（有効・無効で有効期間が異なる。期限切れのものは保存時に削除される）"""
+        ttl = VALID_SYMBOL_TTL if is_valid else INVALID_SYMBOL_TTL
+        self.cache.set(f"valid_{symbol.upper()}", is_valid, ttl.total_seconds())
+    
+    @metrics.timed('indicator_compute')
     def calculate_moving_average(self, data: pd.DataFrame, window: int = 20) -> pd.Series:
         """
         移動平均線を計算する
@@ -117,6 +333,7 @@ class StockDataManager:
         """
         return data['Close'].rolling(window=window).mean()
     
+    @metrics.timed('indicator_compute')
     def calculate_bollinger_bands(self, data: pd.DataFrame, window: int = 20, std_dev: int = 2) -> Dict:
         """
         ボリンジャーバンドを計算する
@@ -138,7 +355,12 @@ class StockDataManager:
             'middle': sma
         }
     
-    def add_favorite_stock(self, symbol: str) -> Dict[str, any]:
+    @property
+    def favorites_limit(self) -> int:
+        """ユーザーあたりのお気に入り銘柄の上限"""
+        return self.favorites_manager.max_favorites
+    
+    def add_favorite_stock(self, symbol: str, user_id: Optional[str] = None) -> Dict[str, any]:
         """お気に入り銘柄を追加"""
         # 銘柄の有効性をチェック
         if not self.validate_symbol(symbol):
@@ -152,25 +374,92 @@ class StockDataManager:
         company_name = company_info.get('shortName', symbol)
         
         # お気に入りに追加
-        return self.favorites_manager.add_favorite(symbol, company_name)
+        return self.favorites_manager.add_favorite(symbol, company_name, user_id)
     
-    def remove_favorite_stock(self, symbol: str) -> Dict[str, any]:
+    def add_favorite_stocks(self, symbols: List[str], user_id: Optional[str] = None,
+                            max_workers: int = MAX_FETCH_WORKERS) -> Dict[str, any]:
+        """
+        複数のお気に入り銘柄を一括で追加する
+        
+        銘柄の検証と会社情報の取得を並列に行い、有効な銘柄を1トランザクションで登録する。
+        
+        Args:
+            symbols: 株価コードのリスト
+            user_id: ユーザーID（未指定の場合はデフォルトユーザー）
+            max_workers: 検証・会社情報取得の並列数の上限
+        
+        Returns:
+            Dict: success, message と銘柄ごとの結果 results（symbol, success, message）
+        """
+        # 正規化と入力内の重複除去（入力順を維持）
+        candidates = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+        if not candidates:
+            return {'success': False, 'message': '銘柄コードが入力されていません', 'results': []}
+        
+        results = {}
+        existing = set(self.get_favorite_symbols(user_id))
+        to_validate = []
+        for symbol in candidates:
+            if symbol in existing:
+                results[symbol] = {'symbol': symbol, 'success': False,
+                                   'message': f'銘柄 {symbol} は既にお気に入りに登録されています'}
+            else:
+                to_validate.append(symbol)
+        
+        valid_symbols = []
+        if to_validate:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(to_validate))) as executor:
+                for symbol, is_valid in zip(to_validate, executor.map(self.validate_symbol, to_validate)):
+                    if is_valid:
+                        valid_symbols.append(symbol)
+                    else:
+                        results[symbol] = {'symbol': symbol, 'success': False,
+                                           'message': f'銘柄コード "{symbol}" は無効です'}
+        
+        if valid_symbols:
+            company_infos = self.get_company_infos(valid_symbols, max_workers)
+            entries = [(symbol, company_infos[symbol].get('shortName', symbol)) for symbol in valid_symbols]
+            for result in self.favorites_manager.add_favorites(entries, user_id):
+                results[result['symbol']] = result
+        
+        ordered_results = [results[symbol] for symbol in candidates]
+        added_count = sum(1 for result in ordered_results if result['success'])
+        return {
+            'success': added_count > 0,
+            'message': f'{len(candidates)} 銘柄中 {added_count} 銘柄をお気に入りに追加しました',
+            'results': ordered_results
+        }
+    
+    def remove_favorite_stock(self, symbol: str, user_id: Optional[str] = None) -> Dict[str, any]:
         """お気に入り銘柄を削除"""
-        return self.favorites_manager.remove_favorite(symbol)
+        return self.favorites_manager.remove_favorite(symbol, user_id)
     
-    def get_favorite_stocks(self) -> List[Dict[str, any]]:
+    def get_favorite_stocks(self, user_id: Optional[str] = None) -> List[Dict[str, any]]:
         """お気に入り銘柄一覧を取得"""
-        return self.favorites_manager.get_favorites()
+        return self.favorites_manager.get_favorites(user_id)
     
-    def get_favorite_symbols(self) -> List[str]:
+    def get_favorite_symbols(self, user_id: Optional[str] = None) -> List[str]:
         """お気に入り銘柄のシンボル一覧を取得"""
-        return self.favorites_manager.get_symbols()
+        return self.favorites_manager.get_symbols(user_id)
+    
+    def get_all_favorite_symbols(self) -> List[str]:
+        """全ユーザーのお気に入り銘柄のシンボル一覧（重複なし）を取得"""
+        return self.favorites_manager.get_all_symbols()
+    
+    def get_favorites_news(self, page_size: int = 5, user_id: Optional[str] = None,
+                           limit: Optional[int] = None) -> Dict[str, any]:
+        """お気に入り銘柄のニュースを取得（limit: 返す記事数の上限）"""
+        favorite_symbols = self.get_favorite_symbols(user_id)
+        return self.news_manager.get_favorites_news(favorite_symbols, page_size, limit)
+    
+    def format_news_for_display(self, articles: List[Dict], page: int = 1, per_page: int = 20) -> str:
+        """ニュース記事を表示用にフォーマット（指定ページのみ）"""
+        return self.news_manager.format_news_for_display(articles, page, per_page)
     
-    def get_favorites_news(self, page_size: int = 5) -> Dict[str, any]:
-        """お気に入り銘柄のニュースを取得"""
-        favorite_symbols = self.get_favorite_symbols()
-        return self.news_manager.get_favorites_news(favorite_symbols, page_size)
+    def get_news_sentiment(self, symbols: List[str], page_size: int = 20) -> Dict[str, List[Dict]]:
+        """銘柄ごとのニュースセンチメントの日次時系列を取得"""
+        return self.news_manager.get_sentiment_series(symbols, page_size)
     
-    def format_news_for_display(self, articles: List[Dict]) -> str:
-        """ニュース記事を表示用にフォーマット"""
-        return self.news_manager.format_news_for_display(articles)
\ No newline at end of file
+    def get_news_version(self, symbols: List[str]) -> Dict[str, float]:
+        """銘柄ごとのニュースキャッシュの版（最終取得時刻。NewsAPIは呼ばない）"""
+        return self.news_manager.get_news_version(symbols)
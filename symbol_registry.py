@@ -0,0 +1,190 @@
+import os
+import re
+import csv
+import bisect
+import threading
+from typing import Dict, List, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 銘柄一覧ファイル（symbol, name, search_name, exchange 列のCSV）
+DEFAULT_SYMBOL_LIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'symbols.csv')
+
+# ニュース検索語から除く会社名の接尾辞
+_COMPANY_SUFFIX_PATTERN = re.compile(
+    r'(,?\s+(Inc\.?|Incorporated|Corporation|Corp\.?|Company|Co\.,? Ltd\.?|Co\.?|Ltd\.?|Limited|'
+    r'plc|N\.V\.|S\.A\.|AG|SE|Holdings?|Group|Class [A-C]))+$',
+    re.IGNORECASE
+)
+
+
+class SymbolRegistry:
+    """
+    銘柄コードと会社名のレジストリ
+    
+    銘柄一覧ファイルから読み込み、会社情報の取得結果で補完する。
+    銘柄コード・会社名（単語単位）のソート済み配列による前方一致検索を提供する。
+    """
+    
+    def __init__(self):
+        # symbol -> {'symbol', 'name', 'search_name', 'exchange'}
+        self._entries = {}
+        # 銘柄コード（小文字）のソート済み配列
+        self._symbol_index = []
+        # (会社名・単語のキー, symbol) のソート済み配列
+        self._name_index = []
+        self._lock = threading.Lock()
+    
+    def load(self, path: str) -> int:
+        """
+        銘柄一覧ファイルを読み込む
+        
+        Returns:
+            int: 読み込んだ銘柄数
+        """
+        count = 0
+        try:
+            with open(path, encoding='utf-8', newline='') as f:
+                for row in csv.DictReader(f):
+                    if row.get('symbol'):
+                        self.register(row['symbol'], row.get('name'), row.get('search_name'), row.get('exchange'))
+                        count += 1
+            logger.info(f"銘柄一覧 {count} 件を読み込みました: {path}")
+        except OSError as e:
+            logger.warning(f"銘柄一覧ファイルを読み込めません: {e}")
+        return count
+    
+    def register(self, symbol: str, name: str = None, search_name: str = None,
+                 exchange: str = None, overwrite: bool = True):
+        """
+        銘柄を登録する
+        
+        Args:
+            symbol: 銘柄コード
+            name: 会社名
+            search_name: ニュース検索に使う名称（未指定の場合は会社名から接尾辞を除いたもの）
+            exchange: 取引所
+            overwrite: False の場合、登録済みの銘柄は更新しない
+        """
+        symbol = symbol.strip().upper()
+        name = (name or '').strip() or None
+        
+        with self._lock:
+            if symbol in self._entries and not overwrite:
+                return
+            
+            old_entry = self._entries.get(symbol)
+            if old_entry:
+                for key in self._name_keys(old_entry):
+                    position = bisect.bisect_left(self._name_index, (key, symbol))
+                    if position < len(self._name_index) and self._name_index[position] == (key, symbol):
+                        del self._name_index[position]
+            else:
+                bisect.insort(self._symbol_index, symbol.lower())
+            
+            entry = {
+                'symbol': symbol,
+                'name': name or symbol,
+                'search_name': (search_name or '').strip() or self._to_search_name(name),
+                'exchange': (exchange or '').strip() or None
+            }
+            self._entries[symbol] = entry
+            for key in self._name_keys(entry):
+                bisect.insort(self._name_index, (key, symbol))
+    
+    def get(self, symbol: str) -> Optional[Dict]:
+        """銘柄の登録情報を取得（未登録の場合はNone）"""
+        entry = self._entries.get(symbol.strip().upper())
+        return dict(entry) if entry else None
+    
+    def search(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """
+        銘柄コード・会社名の前方一致で銘柄を検索する
+        
+        Args:
+            prefix: 入力中の文字列
+            limit: 返す件数の上限
+        
+        Returns:
+            List[Dict]: 銘柄コードが一致したものを優先した登録情報のリスト
+        """
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        
+        symbols = []
+        with self._lock:
+            # 銘柄コードの一致を優先し、残りを会社名の一致で埋める
+            position = bisect.bisect_left(self._symbol_index, prefix)
+            while (len(symbols) < limit and position < len(self._symbol_index)
+                   and self._symbol_index[position].startswith(prefix)):
+                symbols.append(self._symbol_index[position].upper())
+                position += 1
+            
+            position = bisect.bisect_left(self._name_index, (prefix, ''))
+            while (len(symbols) < limit and position < len(self._name_index)
+                   and self._name_index[position][0].startswith(prefix)):
+                symbol = self._name_index[position][1]
+                if symbol not in symbols:
+                    symbols.append(symbol)
+                position += 1
+            
+            return [dict(self._entries[symbol]) for symbol in symbols]
+    
+    def get_search_terms(self, symbol: str) -> List[str]:
+        """銘柄のニュース検索語（会社名・銘柄コード）のリストを取得"""
+        entry = self.get(symbol)
+        
+        # 日本の銘柄コード（例: 7203.T）の場合
+        if '.T' in symbol:
+            base_symbol = symbol.replace('.T', '')
+            if entry and entry['search_name']:
+                terms = [entry['search_name'], symbol, base_symbol]
+            else:
+                terms = [symbol, base_symbol, f'銘柄コード {base_symbol}']
+        
+        # 米国株などの場合
+        else:
+            if entry and entry['search_name']:
+                terms = [entry['search_name'], symbol]
+            else:
+                terms = [symbol]
+        
+        return list(dict.fromkeys(terms))
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def _name_keys(self, entry: Dict) -> List[str]:
+        """会社名による前方一致検索のキー（会社名全体と各単語）"""
+        keys = set()
+        for name in (entry['name'], entry['search_name']):
+            if name:
+                name = name.lower()
+                keys.add(name)
+                keys.update(word for word in re.split(r'[\s,.&]+', name) if word)
+        return sorted(keys)
+    
+    def _to_search_name(self, name: Optional[str]) -> Optional[str]:
+        """会社名から法人格などの接尾辞を除いてニュース検索用の名称にする"""
+        if not name:
+            return None
+        return _COMPANY_SUFFIX_PATTERN.sub('', name).strip() or name
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_symbol_registry() -> SymbolRegistry:
+    """銘柄レジストリを取得（初回呼び出し時に銘柄一覧ファイル SYMBOL_LIST_PATH を読み込む）"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                registry = SymbolRegistry()
+                registry.load(os.getenv('SYMBOL_LIST_PATH', DEFAULT_SYMBOL_LIST_PATH))
+                _registry = registry
+    return _registry
@@ -1,26 +1,179 @@
+import os
+import re
+import math
+import time
+import hashlib
+
+# 起動時間計測の基準点（以降のimportも計測対象に含める）
+_IMPORT_START = time.perf_counter()
+
+import numpy as np
 import dash
-from dash import dcc, html, Input, Output, State, callback
+import flask
+from dash import dcc, html, Input, Output, State, Patch, ALL, callback
+# plotly は dash のimport時に読み込まれるため、ここでのimportに追加コストはない
 import plotly.graph_objs as go
-import pandas as pd
+from plotly.colors import qualitative
 from datetime import datetime, timedelta
-from stock_data import StockDataManager
+from typing import Optional
+from stock_data import StockDataManager, MAX_CHART_SYMBOLS
+from symbol_registry import get_symbol_registry
+from live_quotes import LIVE_POLL_INTERVAL
+from figure_cache import FigureCache, data_version
+from cache_warmer import CacheWarmer
+from metrics import metrics
+from profiling import profiled
+
+# リバースプロキシ（認証ゲートウェイ）がログインユーザーを渡すヘッダー
+USER_ID_HEADER = os.getenv('USER_ID_HEADER', 'X-User-Id')
+
+# ニュースパネルの1ページあたりの記事数と、ページ送りで表示する記事数の上限（新しい順）
+NEWS_PER_PAGE = 5
+NEWS_MAX_ARTICLES = NEWS_PER_PAGE * 10
+# 描画済みニュースページとページ送り用の記事リストを共有キャッシュに保持する期間（秒、ニュースキャッシュの有効期間と同じ）
+NEWS_PAGE_CACHE_TTL = 300
+
+# チャートに追加する指標の種類（価格トレースの後にこの順で並べる）
+INDICATOR_GROUPS = ['ma', 'bb', 'sentiment']
+INDICATOR_PROGRESS_MESSAGES = {
+    'ma': "移動平均線を計算中...",
+    'bb': "ボリンジャーバンドを計算中...",
+    'sentiment': "ニュースセンチメントを集計中..."
+}
+# 指標の種類ごとの銘柄あたりのトレース数
+TRACES_PER_SYMBOL = {'ma': 1, 'bb': 3, 'sentiment': 1}
+# 最初に表示する銘柄の入力欄の数（「入力欄を追加」で MAX_CHART_SYMBOLS まで増やせる）
+INITIAL_SYMBOL_INPUTS = 4
+# 銘柄ごとの線の色（MAX_CHART_SYMBOLS 以上の色を、見分けやすい順に並べる）
+CHART_COLORS = [color.lower() for color in dict.fromkeys(qualitative.D3 + qualitative.Dark24 + qualitative.Light24)]
+# グラフ作成の目標時間（秒）。50銘柄・1年分でこの時間に収まるようにする
+CHART_TIME_BUDGET = float(os.getenv('CHART_TIME_BUDGET', '3.0'))
+# キャッシュの事前取得中に状況を確認する間隔（秒）
+WARMUP_STATUS_INTERVAL = 5
+# 指標の入力コンポーネント -> 指標の種類
+INDICATOR_INPUTS = {
+    'ma-checkbox': 'ma',
+    'ma-period': 'ma',
+    'bb-checkbox': 'bb',
+    'bb-period': 'bb',
+    'bb-std': 'bb',
+    'sentiment-checkbox': 'sentiment'
+}
+# 処理中の進捗表示のスタイル（処理中のみ表示する）
+PROGRESS_STYLE = {'display': 'block', 'font-size': '12px', 'color': '#17a2b8', 'margin-top': '5px'}
+PROGRESS_HIDDEN_STYLE = {'display': 'none'}
+
+# ニュースセンチメントを重ねる第2軸
+SENTIMENT_AXIS = dict(
+    title="センチメント",
+    overlaying='y',
+    side='right',
+    range=[-1, 1],
+    zeroline=True,
+    showgrid=False
+)
+
+
+class StartupTimer:
+    """起動処理の各フェーズの所要時間を計測し、目標時間と比較する"""
+    
+    def __init__(self, budget: float = None):
+        """
+        Args:
+            budget: 起動時間の目標（秒）。未指定の場合は環境変数 STARTUP_TIME_BUDGET（デフォルト: 3.0）
+        """
+        if budget is None:
+            budget = float(os.getenv('STARTUP_TIME_BUDGET', '3.0'))
+        self.budget = budget
+        self.start = _IMPORT_START
+        self.phases = []
+        self._last = self.start
+    
+    def mark(self, phase: str):
+        """直前のマークからの経過時間をフェーズとして記録"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+    
+    @property
+    def total(self) -> float:
+        """計測開始から最後のマークまでの合計時間（秒）"""
+        return self._last - self.start
+    
+    @property
+    def within_budget(self) -> bool:
+        """合計時間が目標以内かどうか"""
+        return self.total <= self.budget
+    
+    def report(self) -> str:
+        """起動時間レポートを文字列で返す"""
+        lines = ["起動時間レポート:"]
+        for phase, elapsed in self.phases:
+            lines.append(f"  {phase:<20} {elapsed * 1000:8.1f} ms")
+        result = "OK" if self.within_budget else "目標超過"
+        lines.append(f"  {'合計':<20} {self.total * 1000:8.1f} ms (目標: {self.budget * 1000:.0f} ms) {result}")
+        return '\n'.join(lines)
+
+
+def create_background_callback_manager():
+    """
+    バックグラウンドコールバック用のジョブマネージャーを作成
+    
+    ジョブはワーカープロセス内のスレッドで実行し、結果は diskcache に保存する（background_jobs.py）。
+    diskcache（pip install "dash[diskcache]"）が無い場合はNoneを返し、コールバックは通常どおり同期実行する。
+    """
+    try:
+        import diskcache
+        from background_jobs import ThreadJobManager
+        cache = diskcache.Cache(os.getenv('BACKGROUND_CACHE_DIR', '.dash_background_cache'))
+        return ThreadJobManager(cache)
+    except ImportError:
+        print("diskcache が無いため、グラフ・ニュースの取得はリクエスト内で実行します")
+        return None
 
 
 class StockChartWebApp:
     def __init__(self):
-        self.app = dash.Dash(__name__)
+        self.startup_timer = StartupTimer()
+        self.startup_timer.mark('imports')
+        
+        # 時間のかかる取得処理はジョブマネージャーのスレッドで実行し、リクエストを処理するスレッドを占有しない
+        self.background_manager = create_background_callback_manager()
+        self.app = dash.Dash(__name__, background_callback_manager=self.background_manager)
+        self.startup_timer.mark('dash_app')
+        
+        # DB接続・ニュースクライアント・yfinance は初回利用時に初期化される
         self.stock_manager = StockDataManager()
+        self.startup_timer.mark('stock_manager')
+        
+        # シリアライズ済みのグラフ（株価データと同じ共有キャッシュに保存し、どのワーカーからも配信する）
+        self.figure_cache = FigureCache(self.stock_manager.cache)
+        
+        # お気に入り銘柄のキャッシュの事前取得（開始は run() または gunicorn の post_fork で行う）
+        self.cache_warmer = CacheWarmer(self.stock_manager)
+        
+        # 入力補完・ニュース検索に使う銘柄一覧を読み込む
+        get_symbol_registry()
+        self.startup_timer.mark('symbol_registry')
+        
         self.setup_layout()
+        self.startup_timer.mark('layout')
+        
         self.setup_callbacks()
+        self.setup_routes()
+        self.startup_timer.mark('callbacks')
         
         # デフォルトの色設定
-        self.colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728']
+        self.colors = CHART_COLORS
     
     def setup_layout(self):
         """Webアプリのレイアウトを設定"""
         self.app.layout = html.Div([
             html.H1("株価チャート表示アプリ", style={'text-align': 'center', 'margin-bottom': '30px'}),
             
+            # 銘柄入力欄の入力補完候補（入力中の欄に合わせて更新）
+            html.Datalist(id='symbol-suggestions'),
+            
             html.Div([
                 # 左側のコントロールパネル
                 html.Div([
@@ -31,7 +184,9 @@ class StockChartWebApp:
                             dcc.Input(
                                 id='favorite-input',
                                 type='text',
-                                placeholder='銘柄コード (例: AAPL, 7203.T)',
+                                list='symbol-suggestions',
+                                autoComplete='off',
+                                placeholder='銘柄コード (例: AAPL, 7203.T / 複数はカンマ区切り)',
                                 style={'width': '150px', 'margin-right': '5px'}
                             ),
                             html.Button(
@@ -66,16 +221,26 @@ class StockChartWebApp:
                     ], style={'margin-bottom': '30px'}),
                     # 銘柄入力セクション
                     html.Div([
-                        html.H3("銘柄入力（最大4社）"),
-                        *[html.Div([
-                            html.Label(f"銘柄 {i+1}:", style={'display': 'block', 'margin-bottom': '5px'}),
-                            dcc.Input(
-                                id=f'stock-input-{i}',
-                                type='text',
-                                placeholder='例: AAPL, 7203.T',
-                                style={'width': '200px', 'margin-bottom': '10px'}
-                            )
-                        ]) for i in range(4)]
+                        html.H3(f"銘柄入力（最大{MAX_CHART_SYMBOLS}社）"),
+                        html.Div(
+                            [self._stock_input(i) for i in range(INITIAL_SYMBOL_INPUTS)],
+                            id='stock-inputs',
+                            style={'max-height': '300px', 'overflow-y': 'auto'}
+                        ),
+                        html.Button('＋ 入力欄を追加', id='add-stock-input-button', n_clicks=0, style={
+                            'margin-right': '5px',
+                            'padding': '5px 10px',
+                            'cursor': 'pointer'
+                        }),
+                        html.Button('お気に入りを比較', id='compare-favorites-button', n_clicks=0, style={
+                            'padding': '5px 10px',
+                            'cursor': 'pointer'
+                        }),
+                        html.Div(id='stock-inputs-status', style={
+                            'margin-top': '5px',
+                            'font-size': '12px',
+                            'color': '#666'
+                        })
                     ], style={'margin-bottom': '30px'}),
                     
                     # 期間選択セクション
@@ -95,7 +260,15 @@ class StockChartWebApp:
                             ],
                             value='1y',
                             labelStyle={'display': 'block', 'margin-bottom': '5px'}
-                        )
+                        ),
+                        # 取引時間中の画面向けに最新の足を定期的に反映する
+                        dcc.Checklist(
+                            id='live-checkbox',
+                            options=[{'label': ' ライブ更新', 'value': 'live'}],
+                            value=[],
+                            style={'margin-top': '10px'}
+                        ),
+                        dcc.Interval(id='live-interval', interval=int(LIVE_POLL_INTERVAL * 1000), disabled=True)
                     ], style={'margin-bottom': '30px'}),
                     
                     # テクニカル指標セクション
@@ -154,6 +327,16 @@ class StockChartWebApp:
                                     style={'width': '60px', 'margin-right': '5px'}
                                 )
                             ], style={'margin-left': '20px', 'margin-bottom': '15px'})
+                        ]),
+                        
+                        # ニュースセンチメント
+                        html.Div([
+                            dcc.Checklist(
+                                id='sentiment-checkbox',
+                                options=[{'label': ' ニュースセンチメント', 'value': 'show'}],
+                                value=[],
+                                style={'margin-bottom': '10px'}
+                            )
                         ])
                         
                     ], style={'margin-bottom': '30px'}),
@@ -186,7 +369,15 @@ class StockChartWebApp:
                                 'border-radius': '5px',
                                 'cursor': 'pointer'
                             }
-                        )
+                        ),
+                        # 取得中のみ表示する中止ボタン
+                        html.Button(
+                            '中止',
+                            id='cancel-chart-button',
+                            n_clicks=0,
+                            style={'display': 'none'}
+                        ),
+                        html.Div(id='chart-progress', style=PROGRESS_HIDDEN_STYLE)
                     ]),
                     
                     # ニュース取得セクション
@@ -213,7 +404,8 @@ class StockChartWebApp:
                             'font-size': '12px',
                             'color': '#666',
                             'margin-bottom': '10px'
-                        })
+                        }),
+                        html.Div(id='news-progress', style=PROGRESS_HIDDEN_STYLE)
                     ], style={'margin-bottom': '20px'})
                     
                 ], style={
@@ -232,9 +424,25 @@ class StockChartWebApp:
                     html.Div([
                         dcc.Graph(
                             id='stock-chart',
+                            figure=self._empty_figure(),
                             style={'height': '400px'}
                         ),
-                        html.Div(id='status-message', style={'margin-top': '10px'})
+                        html.Div(
+                            "銘柄を入力して「グラフ更新」をクリックしてください。",
+                            id='status-message',
+                            style={'margin-top': '10px'}
+                        ),
+                        # お気に入り銘柄のキャッシュの事前取得の状況
+                        html.Div(id='warmup-status', style={'margin-top': '5px', 'font-size': '12px', 'color': '#666'}),
+                        dcc.Interval(id='warmup-interval', interval=WARMUP_STATUS_INTERVAL * 1000),
+                        # 表示中のチャートの銘柄・期間と指標ごとのトレース数
+                        dcc.Store(id='chart-state'),
+                        # 表示中のグラフのキャッシュキー（キャッシュに保存していない場合はNone）
+                        dcc.Store(id='figure-key'),
+                        # キャッシュから表示するグラフ（クライアントが /_figure/<key> から取得する）と、
+                        # 取得できなかったグラフ（サーバーで作り直す）。同じキーでも更新されるよう要求時刻を含める
+                        dcc.Store(id='cached-figure'),
+                        dcc.Store(id='missing-figure')
                     ], style={'margin-bottom': '20px'}),
                     
                     # ニュース表示エリア
@@ -251,7 +459,19 @@ class StockChartWebApp:
                                 'background-color': '#f8f9fa'
                             },
                             children="お気に入り銘柄を追加して「ニュース取得」ボタンをクリックしてください。"
-                        )
+                        ),
+                        
+                        # ページ送り
+                        html.Div([
+                            html.Button('◀ 前へ', id='news-prev-button', n_clicks=0, disabled=True,
+                                        style={'margin-right': '10px'}),
+                            html.Span(id='news-page-label', style={'font-size': '12px', 'color': '#666'}),
+                            html.Button('次へ ▶', id='news-next-button', n_clicks=0, disabled=True,
+                                        style={'margin-left': '10px'})
+                        ], style={'text-align': 'center', 'margin-top': '10px'}),
+                        dcc.Store(id='news-page', data=1),
+                        # ページ送りで表示する記事リストの共有キャッシュのキー
+                        dcc.Store(id='news-articles-key')
                     ])
                 ], style={
                     'width': '70%',
@@ -267,146 +487,154 @@ class StockChartWebApp:
         
         @callback(
             [Output('stock-chart', 'figure'),
-             Output('status-message', 'children')],
-            [Input('update-button', 'n_clicks')],
-            [State('stock-input-0', 'value'),
-             State('stock-input-1', 'value'),
-             State('stock-input-2', 'value'),
-             State('stock-input-3', 'value'),
+             Output('status-message', 'children'),
+             Output('chart-state', 'data'),
+             Output('figure-key', 'data'),
+             Output('cached-figure', 'data')],
+            [Input('update-button', 'n_clicks'),
+             Input('live-checkbox', 'value'),
+             Input('missing-figure', 'data')],
+            [State({'type': 'stock-input', 'index': ALL}, 'value'),
              State('period-selector', 'value'),
              State('ma-checkbox', 'value'),
              State('ma-period', 'value'),
              State('bb-checkbox', 'value'),
              State('bb-period', 'value'),
-             State('bb-std', 'value')]
+             State('bb-std', 'value'),
+             State('sentiment-checkbox', 'value'),
+             State('figure-key', 'data')],
+            prevent_initial_call=True,
+            # 新しいクリックでは実行中のジョブを中止してから再実行する（中止ボタン・期間変更・クリアでも中止）
+            **self._background_options(
+                progress=[Output('chart-progress', 'children')],
+                running=[(Output('update-button', 'disabled'), True, False),
+                         (Output('cancel-chart-button', 'style'), {'display': 'inline-block', 'margin-left': '10px'},
+                          {'display': 'none'}),
+                         (Output('chart-progress', 'style'), PROGRESS_STYLE, PROGRESS_HIDDEN_STYLE)],
+                cancel=[Input('cancel-chart-button', 'n_clicks'),
+                        Input('period-selector', 'value'),
+                        Input('clear-button', 'n_clicks')]
+            )
         )
-        def update_chart(n_clicks, stock1, stock2, stock3, stock4, period, ma_enabled, ma_period, bb_enabled, bb_period, bb_std):
-            if n_clicks == 0:
-                # 初期表示
-                fig = go.Figure()
-                fig.update_layout(
-                    title="株価チャート",
-                    xaxis_title="日付",
-                    yaxis_title="株価",
-                    template="plotly_white"
-                )
-                return fig, "銘柄を入力して「グラフ更新」をクリックしてください。"
+        @self._with_progress
+        @metrics.track_callback
+        @profiled
+        def update_chart(set_progress, n_clicks, live_enabled, missing_figure, stock_values, period, ma_enabled,
+                         ma_period, bb_enabled, bb_period, bb_std, sentiment_enabled, current_figure_key):
+            if not n_clicks:
+                # グラフ表示前のライブ更新の切り替え
+                raise dash.exceptions.PreventUpdate
+            # キャッシュから表示しようとしたグラフを取得できなかった場合は、キャッシュを使わずに作り直す
+            rebuild = dash.ctx.triggered_id == 'missing-figure'
+            
+            started_at = time.perf_counter()
             
-            # 入力された銘柄を収集・検証
+            # 入力された銘柄を収集・検証（1つの欄にカンマ・空白区切りで複数入力できる）
             symbols = []
-            for stock in [stock1, stock2, stock3, stock4]:
-                if stock and stock.strip():
-                    symbol = stock.strip().upper()
+            for stock in stock_values:
+                for symbol in re.split(r'[,\s]+', (stock or '').strip().upper()):
                     # 基本的な形式チェック
-                    if self._is_valid_symbol_format(symbol):
+                    if self._is_valid_symbol_format(symbol) and symbol not in symbols:
                         symbols.append(symbol)
             
             if not symbols:
-                fig = go.Figure()
-                fig.update_layout(
-                    title="株価チャート",
-                    xaxis_title="日付",
-                    yaxis_title="株価",
-                    template="plotly_white"
-                )
-                return fig, "少なくとも1つの銘柄コードを入力してください。"
+                return self._empty_figure(), "少なくとも1つの銘柄コードを入力してください。", None, None, dash.no_update
+            
+            skipped_count = max(0, len(symbols) - MAX_CHART_SYMBOLS)
+            symbols = symbols[:MAX_CHART_SYMBOLS]
+            
+            # ライブ更新では最新の日足を反映し、点を追加・更新できるよう値をリストで送る
+            live = bool(live_enabled)
+            
+            # 全銘柄のデータと会社情報をまとめて取得（未キャッシュの銘柄は並列取得）
+            set_progress(f"{len(symbols)}銘柄の{'最新の' if live else ''}株価を取得中...")
+            error_messages = []
+            try:
+                if live:
+                    live_data = self.stock_manager.get_live_stock_data(symbols, period)
+                    stock_data = live_data
+                else:
+                    stock_data = self.stock_manager.get_stock_data_batch(symbols, period)
+                company_infos = self.stock_manager.get_company_infos([
+                    symbol for symbol in symbols
+                    if stock_data.get(symbol) is not None and not stock_data[symbol].empty
+                ])
+            except Exception as e:
+                stock_data, company_infos = {}, {}
+                error_messages.append(f"株価データの取得中にエラーが発生しました: {str(e)}")
+            
+            # 表示できた銘柄 -> (線の色, データ, 会社名)
+            datasets = {}
+            for i, symbol in enumerate(symbols):
+                if symbol in company_infos:
+                    company_name = company_infos[symbol].get('shortName', symbol)
+                    datasets[symbol] = (self.colors[i % len(self.colors)], stock_data[symbol], company_name)
+                elif stock_data:
+                    error_messages.append(f"銘柄コード '{symbol}' のデータを取得できませんでした。")
+            if skipped_count:
+                error_messages.append(f"{MAX_CHART_SYMBOLS}銘柄を超える{skipped_count}銘柄は表示しません。")
+            
+            # 同じ入力・同じデータのグラフはシリアライズ済みのものをクライアントが /_figure/<key> から取得する
+            # （ライブ更新中のグラフは毎回変わるため対象外）
+            figure_key = None
+            indicators = {
+                'ma': bool(ma_enabled and 'show' in ma_enabled),
+                'bb': bool(bb_enabled and 'show' in bb_enabled),
+                'sentiment': bool(sentiment_enabled and 'show' in sentiment_enabled),
+                'params': [ma_period, bb_period, bb_std]
+            }
+            # キーには作成前に分かっているエラーだけを含める（作成後にキーを作り直しても一致させる）
+            key_errors = list(error_messages)
+            if not live and datasets:
+                figure_key = self._figure_key(datasets, period, key_errors, indicators)
+                if figure_key == current_figure_key and not rebuild:
+                    # 表示中のグラフと同じ
+                    return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+                cached = None if rebuild else self.figure_cache.get(figure_key)
+                if cached is not None:
+                    return (dash.no_update, cached['status'], cached['chart_state'], figure_key,
+                            {'key': figure_key, 'requested_at': time.time()})
             
             # グラフを作成
+            build_started_at = time.perf_counter()
             fig = go.Figure()
             
             valid_data_count = 0
-            error_messages = []
+            # 表示できた銘柄 -> 線の色
+            plotted_colors = {}
+            # 表示できた銘柄 -> 最終日
+            last_dates = {}
             
-            for i, symbol in enumerate(symbols):
-                try:
-                    # データ取得
-                    data = self.stock_manager.get_stock_data(symbol, period)
-                    
-                    if data is not None and not data.empty:
-                        # 会社情報を取得
-                        company_info = self.stock_manager.get_company_info(symbol)
-                        company_name = company_info.get('shortName', symbol)
-                        
-                        # グラフにプロット
-                        color = self.colors[i % len(self.colors)]
-                        
-                        fig.add_trace(go.Scatter(
-                            x=data.index,
-                            y=data['Close'],
-                            mode='lines',
-                            name=f"{company_name} ({symbol})",
-                            line=dict(color=color, width=2)
-                        ))
-                        
-                        valid_data_count += 1
-                        
-                    else:
-                        error_messages.append(f"銘柄コード '{symbol}' のデータを取得できませんでした。")
-                        
-                except Exception as e:
-                    error_messages.append(f"銘柄 '{symbol}' の処理中にエラーが発生しました: {str(e)}")
+            for symbol, (color, data, company_name) in datasets.items():
+                # グラフにプロット（銘柄数が多くても描画できるようWebGLで描画する）
+                fig.add_trace(go.Scattergl(
+                    x=self._trace_x(data, live),
+                    y=self._trace_values(data['Close'], live),
+                    mode='lines',
+                    name=f"{company_name} ({symbol})",
+                    line=dict(color=color, width=2)
+                ))
+                
+                plotted_colors[symbol] = color
+                last_dates[symbol] = data.index[-1]
+                valid_data_count += 1
             
-            # テクニカル指標を追加
-            if valid_data_count > 0:
-                # 最初の有効な銘柄のデータを使用してテクニカル指標を計算
-                for i, symbol in enumerate(symbols):
+            # テクニカル指標・センチメントを種類ごとにまとめて追加（種類単位で差し替えられるようにする）
+            group_symbols = {}
+            for group, enabled in zip(INDICATOR_GROUPS, [ma_enabled, bb_enabled, sentiment_enabled]):
+                traces, group_symbols[group] = [], []
+                if plotted_colors and enabled and 'show' in enabled:
+                    set_progress(INDICATOR_PROGRESS_MESSAGES[group])
                     try:
-                        data = self.stock_manager.get_stock_data(symbol, period)
-                        if data is not None and not data.empty:
-                            
-                            # 移動平均線を追加
-                            if ma_enabled and 'show' in ma_enabled:
-                                ma_data = self.stock_manager.calculate_moving_average(data, ma_period)
-                                color = self.colors[i % len(self.colors)]
-                                
-                                fig.add_trace(go.Scatter(
-                                    x=data.index,
-                                    y=ma_data,
-                                    mode='lines',
-                                    name=f"MA({ma_period}) - {symbol}",
-                                    line=dict(color=color, width=1, dash='dash'),
-                                    opacity=0.8
-                                ))
-                            
-                            # ボリンジャーバンドを追加
-                            if bb_enabled and 'show' in bb_enabled:
-                                bb_data = self.stock_manager.calculate_bollinger_bands(data, bb_period, bb_std)
-                                color = self.colors[i % len(self.colors)]
-                                
-                                # 上限線
-                                fig.add_trace(go.Scatter(
-                                    x=data.index,
-                                    y=bb_data['upper'],
-                                    mode='lines',
-                                    name=f"BB上限({bb_period},{bb_std}σ) - {symbol}",
-                                    line=dict(color=color, width=1, dash='dot'),
-                                    opacity=0.6
-                                ))
-                                
-                                # 下限線
-                                fig.add_trace(go.Scatter(
-                                    x=data.index,
-                                    y=bb_data['lower'],
-                                    mode='lines',
-                                    name=f"BB下限({bb_period},{bb_std}σ) - {symbol}",
-                                    line=dict(color=color, width=1, dash='dot'),
-                                    opacity=0.6,
-                                    fill='tonexty',
-                                    fillcolor=f'rgba({int(color[1:3], 16)}, {int(color[3:5], 16)}, {int(color[5:7], 16)}, 0.1)'
-                                ))
-                                
-                                # 中央線（移動平均）
-                                fig.add_trace(go.Scatter(
-                                    x=data.index,
-                                    y=bb_data['middle'],
-                                    mode='lines',
-                                    name=f"BB中央({bb_period}) - {symbol}",
-                                    line=dict(color=color, width=1, dash='dash'),
-                                    opacity=0.7
-                                ))
-                                
+                        traces, group_symbols[group] = self._build_indicator_traces(
+                            group, plotted_colors, period, ma_period, bb_period, bb_std,
+                            live_until=last_dates if live else None
+                        )
+                        if group == 'sentiment' and not traces:
+                            error_messages.append("ニュースセンチメントを取得できませんでした。")
                     except Exception as e:
                         error_messages.append(f"テクニカル指標の計算中にエラーが発生しました: {str(e)}")
+                fig.add_traces(traces)
             
             # グラフのレイアウトを更新
             fig.update_layout(
@@ -416,6 +644,10 @@ class StockChartWebApp:
                 template="plotly_white",
                 hovermode='x unified'
             )
+            if group_symbols['sentiment']:
+                fig.update_layout(yaxis2=SENTIMENT_AXIS)
+            metrics.observe('stock_app_operation_duration_seconds', time.perf_counter() - build_started_at,
+                            operation='figure_build', name='update_chart')
             
             # ステータスメッセージを生成
             if valid_data_count > 0:
@@ -428,19 +660,269 @@ class StockChartWebApp:
             if error_messages:
                 status_msg += " - " + "; ".join(error_messages[:2])  # 最初の2つのエラーのみ表示
             
-            return fig, status_msg
+            # 指標の切り替え・ライブ更新で変更するトレースの位置を特定するための情報
+            chart_state = {
+                'symbols': plotted_colors,
+                'period': period,
+                'price_count': valid_data_count,
+                'group_symbols': group_symbols,
+                'params': {'ma_period': ma_period, 'bb_period': bb_period, 'bb_std': bb_std},
+                'live': live
+            }
+            if live:
+                chart_state.update(
+                    last_x=last_dates,
+                    last_close={symbol: float(live_data[symbol]['Close'].iloc[-1]) for symbol in plotted_colors},
+                    points={symbol: len(live_data[symbol]) for symbol in plotted_colors}
+                )
+            
+            elapsed = time.perf_counter() - started_at
+            if elapsed > CHART_TIME_BUDGET:
+                print(f"警告: グラフの作成に{elapsed:.1f}秒かかりました（{len(symbols)}銘柄・{period}、目標: {CHART_TIME_BUDGET:.1f}秒）")
+            if figure_key:
+                if indicators['sentiment']:
+                    # 作成中に取得したニュースの版でキーを作り直す（次回の表示でキャッシュに一致させる）
+                    figure_key = self._figure_key(datasets, period, key_errors, indicators)
+                self.figure_cache.put(figure_key, fig, status_msg, chart_state)
+            # 作成したグラフはそのまま返す（キャッシュへの保存に失敗・すぐに削除されても表示できる）
+            return fig, status_msg, chart_state, figure_key, dash.no_update
+        
+        # キャッシュから表示するグラフはシリアライズ済みのJSONを取得する（同じグラフはブラウザのキャッシュを使う）
+        # 取得できなかった場合（キャッシュから削除された場合など）は missing-figure を更新してサーバーで作り直す
+        dash.clientside_callback(
+            """
+            function(cachedFigure) {
+                var noUpdate = window.dash_clientside.no_update;
+                if (!cachedFigure) {
+                    return [noUpdate, noUpdate];
+                }
+                var missing = [noUpdate, {key: cachedFigure.key, requested_at: Date.now() / 1000}];
+                return fetch('%s_figure/' + cachedFigure.key)
+                    .then(function(response) {
+                        return response.ok ? response.json().then(function(figure) {
+                            return [figure, noUpdate];
+                        }) : missing;
+                    })
+                    .catch(function() {
+                        return missing;
+                    });
+            }
+            """ % self.app.config.requests_pathname_prefix,
+            [Output('stock-chart', 'figure', allow_duplicate=True),
+             Output('missing-figure', 'data')],
+            Input('cached-figure', 'data'),
+            prevent_initial_call=True
+        )
         
         @callback(
-            [Output('stock-input-0', 'value'),
-             Output('stock-input-1', 'value'),
-             Output('stock-input-2', 'value'),
-             Output('stock-input-3', 'value')],
-            [Input('clear-button', 'n_clicks')]
+            [Output('stock-chart', 'figure', allow_duplicate=True),
+             Output('chart-state', 'data', allow_duplicate=True),
+             Output('figure-key', 'data', allow_duplicate=True)],
+            [Input('ma-checkbox', 'value'),
+             Input('ma-period', 'value'),
+             Input('bb-checkbox', 'value'),
+             Input('bb-period', 'value'),
+             Input('bb-std', 'value'),
+             Input('sentiment-checkbox', 'value')],
+            [State('chart-state', 'data')],
+            prevent_initial_call=True
         )
-        def clear_inputs(n_clicks):
+        @metrics.track_callback
+        @profiled
+        def update_indicators(ma_enabled, ma_period, bb_enabled, bb_period, bb_std, sentiment_enabled, chart_state):
+            # 表示中のチャートの該当する指標のトレースだけを差し替える（価格データは再送しない）
+            if not chart_state or not chart_state['symbols']:
+                return dash.no_update, dash.no_update, dash.no_update
+            
+            group = INDICATOR_INPUTS[dash.ctx.triggered_id]
+            enabled = {'ma': ma_enabled, 'bb': bb_enabled, 'sentiment': sentiment_enabled}[group]
+            group_symbols = chart_state['group_symbols']
+            
+            traces, symbols = [], []
+            if enabled and 'show' in enabled:
+                if None in {'ma': [ma_period], 'bb': [bb_period, bb_std], 'sentiment': []}[group]:
+                    # 期間などの入力途中（空欄・範囲外）は表示を変えない
+                    return dash.no_update, dash.no_update, dash.no_update
+                # ライブ更新中は価格トレースと同じ最終日までの点にそろえる
+                traces, symbols = self._build_indicator_traces(
+                    group, chart_state['symbols'], chart_state['period'], ma_period, bb_period, bb_std,
+                    live_until=chart_state['last_x'] if chart_state.get('live') else None
+                )
+            elif not group_symbols[group]:
+                # 非表示のままパラメータだけ変更された場合
+                return dash.no_update, dash.no_update, dash.no_update
+            
+            start = self._indicator_start(chart_state, group)
+            patched_figure = Patch()
+            for index in reversed(range(start, start + len(group_symbols[group]) * TRACES_PER_SYMBOL[group])):
+                del patched_figure['data'][index]
+            for offset, trace in enumerate(traces):
+                patched_figure['data'].insert(start + offset, trace)
+            if group == 'sentiment':
+                if traces:
+                    patched_figure['layout']['yaxis2'] = SENTIMENT_AXIS
+                else:
+                    del patched_figure['layout']['yaxis2']
+            
+            patched_state = Patch()
+            patched_state['group_symbols'][group] = symbols
+            patched_state['params'] = {'ma_period': ma_period, 'bb_period': bb_period, 'bb_std': bb_std}
+            # 差し替えた後のグラフは表示中のキーのグラフとは異なるため、キーを消して
+            # 次の「グラフ更新」で同じキーとみなして更新を省かないようにする
+            return patched_figure, patched_state, None
+        
+        @callback(
+            Output('live-interval', 'disabled'),
+            [Input('live-checkbox', 'value')]
+        )
+        @metrics.track_callback
+        @profiled
+        def toggle_live_updates(live_enabled):
+            return not live_enabled
+        
+        @callback(
+            [Output('stock-chart', 'figure', allow_duplicate=True),
+             Output('chart-state', 'data', allow_duplicate=True)],
+            [Input('live-interval', 'n_intervals')],
+            [State('chart-state', 'data')],
+            prevent_initial_call=True
+        )
+        @metrics.track_callback
+        @profiled
+        def extend_live_chart(n_intervals, chart_state):
+            # 新しい足の点だけを各トレースに追加し、当日の足（最終点）の値を更新する
+            if not chart_state or not chart_state.get('live') or not chart_state['symbols']:
+                return dash.no_update, dash.no_update
+            
+            symbols = list(chart_state['symbols'])
+            live_data = self.stock_manager.get_live_stock_data(symbols, chart_state['period'])
+            group_symbols = chart_state['group_symbols']
+            params = chart_state['params']
+            
+            patched_figure = Patch()
+            patched_state = Patch()
+            updated = False
+            for position, symbol in enumerate(symbols):
+                data = live_data.get(symbol)
+                last_x = chart_state['last_x'][symbol]
+                if data is None or last_x not in data.index:
+                    continue
+                
+                start = data.index.get_loc(last_x)
+                if start == len(data) - 1 and float(data['Close'].iloc[-1]) == chart_state['last_close'][symbol]:
+                    continue
+                
+                # トレース番号 -> 前回の最終日以降の値（指標は直近の期間分の終値だけから計算する）
+                tails = {position: data['Close'].iloc[start:]}
+                if symbol in group_symbols['ma']:
+                    window = params['ma_period']
+                    recent = data.iloc[max(0, start - window + 1):]
+                    ma_data = self.stock_manager.calculate_moving_average(recent, window)
+                    tails[self._indicator_start(chart_state, 'ma') + group_symbols['ma'].index(symbol)] = \
+                        ma_data.iloc[start - len(data):]
+                if symbol in group_symbols['bb']:
+                    window = params['bb_period']
+                    recent = data.iloc[max(0, start - window + 1):]
+                    bb_data = self.stock_manager.calculate_bollinger_bands(recent, window, params['bb_std'])
+                    base = self._indicator_start(chart_state, 'bb') + group_symbols['bb'].index(symbol) * 3
+                    for offset, band in enumerate(['upper', 'lower', 'middle']):
+                        tails[base + offset] = bb_data[band].iloc[start - len(data):]
+                
+                points = chart_state['points'][symbol]
+                for trace_index, values in tails.items():
+                    values = self._trace_values(values, live=True)
+                    patched_figure['data'][trace_index]['y'][points - 1] = values[0]
+                    if len(values) > 1:
+                        patched_figure['data'][trace_index]['x'].extend(list(data.index[start + 1:]))
+                        patched_figure['data'][trace_index]['y'].extend(values[1:])
+                
+                patched_state['last_x'][symbol] = data.index[-1]
+                patched_state['last_close'][symbol] = float(data['Close'].iloc[-1])
+                patched_state['points'][symbol] = points + len(data) - 1 - start
+                updated = True
+            
+            if not updated:
+                return dash.no_update, dash.no_update
+            return patched_figure, patched_state
+        
+        @callback(
+            [Output('warmup-status', 'children'),
+             Output('warmup-interval', 'disabled')],
+            [Input('warmup-interval', 'n_intervals')]
+        )
+        @metrics.track_callback
+        @profiled
+        def update_warmup_status(n_intervals):
+            # 事前取得中の間だけ状況を問い合わせ続ける（完了後・未実行の場合はページを開き直すまで止める）
+            status = self.cache_warmer.get_status()
+            return self._format_warmup_status(status), not status or status['state'] != 'running'
+        
+        @callback(
+            Output('symbol-suggestions', 'children'),
+            [Input('favorite-input', 'value'),
+             Input({'type': 'stock-input', 'index': ALL}, 'value')],
+            prevent_initial_call=True
+        )
+        @metrics.track_callback
+        @profiled
+        def update_symbol_suggestions(favorite_value, stock_values):
+            ctx = dash.callback_context
+            if not ctx.triggered:
+                raise dash.exceptions.PreventUpdate
+            
+            # カンマ・空白区切りの複数銘柄入力では最後の銘柄を補完する
+            text = ctx.triggered[0]['value'] or ''
+            head, prefix = re.match(r'^(.*[,\s])?([^,\s]*)$', text).groups()
+            head = head or ''
+            
+            return [
+                html.Option(value=head + entry['symbol'], label=f"{entry['symbol']} - {entry['name']}")
+                for entry in get_symbol_registry().search(prefix, limit=10)
+            ]
+        
+        @callback(
+            Output({'type': 'stock-input', 'index': ALL}, 'value'),
+            [Input('clear-button', 'n_clicks')],
+            [State({'type': 'stock-input', 'index': ALL}, 'value')]
+        )
+        @metrics.track_callback
+        @profiled
+        def clear_inputs(n_clicks, stock_values):
             if n_clicks > 0:
-                return '', '', '', ''
-            return dash.no_update, dash.no_update, dash.no_update, dash.no_update
+                return [''] * len(stock_values)
+            return [dash.no_update] * len(stock_values)
+        
+        @callback(
+            [Output('stock-inputs', 'children'),
+             Output('stock-inputs-status', 'children')],
+            [Input('add-stock-input-button', 'n_clicks'),
+             Input('compare-favorites-button', 'n_clicks')],
+            [State({'type': 'stock-input', 'index': ALL}, 'value')],
+            prevent_initial_call=True
+        )
+        @metrics.track_callback
+        @profiled
+        def update_stock_inputs(add_clicks, compare_clicks, stock_values):
+            ctx = dash.callback_context
+            trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
+            
+            if trigger_id == 'add-stock-input-button':
+                if len(stock_values) >= MAX_CHART_SYMBOLS:
+                    return dash.no_update, f"入力欄は最大{MAX_CHART_SYMBOLS}個です。"
+                # 入力済みの欄はそのままにして末尾に追加
+                patched_inputs = Patch()
+                patched_inputs.append(self._stock_input(len(stock_values)))
+                return patched_inputs, ""
+            
+            # お気に入り銘柄を入力欄に並べて比較する
+            symbols = self.stock_manager.get_favorite_symbols(self._get_user_id())[:MAX_CHART_SYMBOLS]
+            if not symbols:
+                return dash.no_update, "お気に入り銘柄がありません。"
+            inputs = [
+                self._stock_input(i, symbols[i] if i < len(symbols) else '')
+                for i in range(max(len(symbols), INITIAL_SYMBOL_INPUTS))
+            ]
+            return inputs, f"お気に入りの{len(symbols)}銘柄を入力しました。「グラフ更新」で表示します。"
         
         @callback(
             [Output('favorites-list', 'children'),
@@ -450,51 +932,83 @@ class StockChartWebApp:
              Input('favorites-list', 'n_clicks')],
             [State('favorite-input', 'value')]
         )
+        @metrics.track_callback
+        @profiled
         def update_favorites(add_clicks, list_clicks, symbol_input):
             ctx = dash.callback_context
+            user_id = self._get_user_id()
+            limit = self.stock_manager.favorites_limit
             
             if not ctx.triggered:
-                favorites = self.stock_manager.get_favorite_stocks()
-                return self.render_favorites_list(favorites), f"お気に入り: {len(favorites)}/10", ""
+                favorites = self.stock_manager.get_favorite_stocks(user_id)
+                return self.render_favorites_list(favorites), f"お気に入り: {len(favorites)}/{limit}", ""
             
             trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
             
             if trigger_id == 'add-favorite-button' and add_clicks > 0 and symbol_input:
-                symbol = symbol_input.strip().upper()
-                if not self._is_valid_symbol_format(symbol):
-                    result = {'success': False, 'message': f'無効な銘柄コード形式: {symbol}'}
+                # カンマ・空白区切りで複数銘柄をまとめて追加できる
+                input_symbols = [s for s in re.split(r'[,\s]+', symbol_input.strip().upper()) if s]
+                invalid_symbols = [s for s in input_symbols if not self._is_valid_symbol_format(s)]
+                
+                if invalid_symbols:
+                    result = {'success': False, 'message': f'無効な銘柄コード形式: {", ".join(invalid_symbols)}'}
+                elif len(input_symbols) == 1:
+                    result = self.stock_manager.add_favorite_stock(input_symbols[0], user_id)
                 else:
-                    result = self.stock_manager.add_favorite_stock(symbol)
-                favorites = self.stock_manager.get_favorite_stocks()
+                    result = self.stock_manager.add_favorite_stocks(input_symbols, user_id)
+                favorites = self.stock_manager.get_favorite_stocks(user_id)
                 
                 status_style = {'color': 'green' if result['success'] else 'red'}
+                failures = [r['message'] for r in result.get('results', []) if not r['success']]
                 status_message = html.Div([
-                    html.Span(f"お気に入り: {len(favorites)}/10", style={'color': '#666'}),
+                    html.Span(f"お気に入り: {len(favorites)}/{limit}", style={'color': '#666'}),
                     html.Br(),
-                    html.Span(result['message'], style=status_style)
+                    html.Span(result['message'], style=status_style),
+                    *[html.Div(message, style={'color': 'red'}) for message in failures]
                 ])
                 
                 return self.render_favorites_list(favorites), status_message, ""
             
-            favorites = self.stock_manager.get_favorite_stocks()
-            return self.render_favorites_list(favorites), f"お気に入り: {len(favorites)}/10", dash.no_update
+            favorites = self.stock_manager.get_favorite_stocks(user_id)
+            return self.render_favorites_list(favorites), f"お気に入り: {len(favorites)}/{limit}", dash.no_update
         
         @callback(
             [Output('news-display', 'children'),
-             Output('news-status', 'children')],
-            [Input('get-news-button', 'n_clicks')]
+             Output('news-status', 'children'),
+             Output('news-page', 'data'),
+             Output('news-page-label', 'children'),
+             Output('news-prev-button', 'disabled'),
+             Output('news-next-button', 'disabled'),
+             Output('news-articles-key', 'data')],
+            [Input('get-news-button', 'n_clicks')],
+            prevent_initial_call=True,
+            **self._background_options(
+                progress=[Output('news-progress', 'children')],
+                running=[(Output('get-news-button', 'disabled'), True, False),
+                         (Output('news-progress', 'style'), PROGRESS_STYLE, PROGRESS_HIDDEN_STYLE)]
+            )
         )
-        def update_news(n_clicks):
-            if n_clicks == 0:
-                return "お気に入り銘柄を追加して「ニュース取得」ボタンをクリックしてください。", ""
-            
+        @self._with_progress
+        @metrics.track_callback
+        @profiled
+        def update_news(set_progress, n_clicks):
             try:
-                news_result = self.stock_manager.get_favorites_news(page_size=10)
+                user_id = self._get_user_id()
+                favorite_symbols = self.stock_manager.get_favorite_symbols(user_id)
+                set_progress(f"{', '.join(favorite_symbols)} のニュースを取得中...")
+                news_result = self.stock_manager.get_favorites_news(page_size=10, user_id=user_id,
+                                                                     limit=NEWS_MAX_ARTICLES)
                 
                 if news_result['success']:
                     if news_result['articles']:
-                        news_components = self.render_news_list(news_result['articles'])
-                        status = html.Div(news_result['message'], style={'color': 'green'})
+                        articles_key = self.store_news_articles(news_result['articles'])
+                        news_components, page, page_count = self.render_news_page(news_result['articles'], 1)
+                        status = html.Div([
+                            html.Div(news_result['message'], style={'color': 'green'}),
+                            html.Div(self._format_freshness(news_result.get('freshness', {})))
+                        ])
+                        page_label = self._format_news_page_label(page, page_count, len(news_result['articles']))
+                        return news_components, status, page, page_label, page <= 1, page >= page_count, articles_key
                     else:
                         news_components = "ニュース記事が見つかりませんでした。"
                         status = html.Div("ニュースが見つかりませんでした", style={'color': 'orange'})
@@ -502,11 +1016,38 @@ class StockChartWebApp:
                     news_components = f"エラー: {news_result['message']}"
                     status = html.Div(news_result['message'], style={'color': 'red'})
                 
-                return news_components, status
+                return news_components, status, 1, "", True, True, None
                 
             except Exception as e:
                 error_msg = f"ニュース取得中にエラーが発生しました: {str(e)}"
-                return error_msg, html.Div(error_msg, style={'color': 'red'})
+                return error_msg, html.Div(error_msg, style={'color': 'red'}), 1, "", True, True, None
+        
+        @callback(
+            [Output('news-display', 'children', allow_duplicate=True),
+             Output('news-page', 'data', allow_duplicate=True),
+             Output('news-page-label', 'children', allow_duplicate=True),
+             Output('news-prev-button', 'disabled', allow_duplicate=True),
+             Output('news-next-button', 'disabled', allow_duplicate=True)],
+            [Input('news-prev-button', 'n_clicks'),
+             Input('news-next-button', 'n_clicks')],
+            [State('news-page', 'data'),
+             State('news-articles-key', 'data')],
+            prevent_initial_call=True
+        )
+        @metrics.track_callback
+        @profiled
+        def change_news_page(prev_clicks, next_clicks, current_page, articles_key):
+            # ページ送りは「ニュース取得」で共有キャッシュに保存した記事リストだけを使う
+            # （NewsAPI の取得は update_news とバックグラウンド更新に任せ、リクエスト内で即時に返す）
+            step = -1 if dash.ctx.triggered_id == 'news-prev-button' else 1
+            articles = self.load_news_articles(articles_key)
+            if not articles:
+                return ("表示期限が切れました。「ニュース取得」を押して読み込み直してください。",
+                        1, "", True, True)
+            
+            news_components, page, page_count = self.render_news_page(articles, (current_page or 1) + step)
+            page_label = self._format_news_page_label(page, page_count, len(articles))
+            return news_components, page, page_label, page <= 1, page >= page_count
         
         @callback(
             [Output('favorites-list', 'children', allow_duplicate=True),
@@ -514,6 +1055,8 @@ class StockChartWebApp:
             [Input({'type': 'remove-favorite', 'index': dash.dependencies.ALL}, 'n_clicks')],
             prevent_initial_call=True
         )
+        @metrics.track_callback
+        @profiled
         def remove_favorite(n_clicks_list):
             ctx = dash.callback_context
             
@@ -527,18 +1070,38 @@ class StockChartWebApp:
             symbol_to_remove = button_data['index']
             
             # お気に入りから削除
-            result = self.stock_manager.remove_favorite_stock(symbol_to_remove)
-            favorites = self.stock_manager.get_favorite_stocks()
+            user_id = self._get_user_id()
+            result = self.stock_manager.remove_favorite_stock(symbol_to_remove, user_id)
+            favorites = self.stock_manager.get_favorite_stocks(user_id)
             
             status_style = {'color': 'green' if result['success'] else 'red'}
             status_message = html.Div([
-                html.Span(f"お気に入り: {len(favorites)}/10", style={'color': '#666'}),
+                html.Span(f"お気に入り: {len(favorites)}/{self.stock_manager.favorites_limit}", style={'color': '#666'}),
                 html.Br(),
                 html.Span(result['message'], style=status_style)
             ])
             
             return self.render_favorites_list(favorites), status_message
     
+    def setup_routes(self):
+        """Dash のコールバック以外で配信するエンドポイントを設定"""
+        
+        # リクエスト数・処理中のリクエスト数の記録と、Prometheus 形式のメトリクス（/metrics）
+        metrics.init_app(self.app.server, f"{self.app.config.routes_pathname_prefix}metrics")
+        
+        @self.app.server.route(f"{self.app.config.routes_pathname_prefix}_figure/<figure_key>")
+        def serve_figure(figure_key):
+            entry = self.figure_cache.get(figure_key)
+            if entry is None:
+                return flask.Response(status=404)
+            
+            # キーは入力とデータの版から作るため、同じキーの内容は変わらない
+            response = flask.Response(entry['json'], mimetype='application/json')
+            response.set_etag(figure_key)
+            response.cache_control.private = True
+            response.cache_control.max_age = self.figure_cache.ttl
+            return response.make_conditional(flask.request)
+    
     def render_favorites_list(self, favorites):
         """お気に入り銘柄リストを描画"""
         if not favorites:
@@ -589,6 +1152,49 @@ class StockChartWebApp:
         
         return items
     
+    def render_news_page(self, articles, page: int):
+        """
+        ニュース記事リストの指定ページを描画（記事リストとページ番号ごとに共有キャッシュにメモ化し、
+        ページ送りが別のワーカーに届いても描画し直さない）
+        
+        Returns:
+            tuple: (コンポーネント, 範囲内に補正したページ番号, 総ページ数)
+        """
+        page_count = max(1, math.ceil(len(articles) / NEWS_PER_PAGE))
+        page = min(max(page or 1, 1), page_count)
+        
+        cache_key = f"news_page_{self._news_articles_key(articles)}_{page}"
+        
+        components = self.stock_manager.cache.get(cache_key)
+        metrics.record_cache('news_page', components is not None)
+        if components is not None:
+            return components, page, page_count
+        
+        start = (page - 1) * NEWS_PER_PAGE
+        components = self.render_news_list(articles[start:start + NEWS_PER_PAGE])
+        self.stock_manager.cache.set(cache_key, components, NEWS_PAGE_CACHE_TTL)
+        return components, page, page_count
+    
+    def store_news_articles(self, articles) -> str:
+        """ページ送り用に記事リストを共有キャッシュに保存し、キーを返す（別のワーカーに届いたページ送りでも参照できる）"""
+        articles_key = self._news_articles_key(articles)
+        self.stock_manager.cache.set(f"news_articles_{articles_key}", articles, NEWS_PAGE_CACHE_TTL)
+        return articles_key
+    
+    def load_news_articles(self, articles_key: Optional[str]) -> Optional[list]:
+        """store_news_articles で保存した記事リストを取得（未保存・期限切れの場合はNone）"""
+        if not articles_key:
+            return None
+        articles = self.stock_manager.cache.get(f"news_articles_{articles_key}")
+        metrics.record_cache('news_articles', articles is not None)
+        return articles
+    
+    def _news_articles_key(self, articles) -> str:
+        """記事リストのキー（記事リストの内容が変わらない限り同じキーになる）"""
+        return hashlib.sha1('\n'.join(
+            f"{article.get('id') or article.get('url', '')}:{article.get('title', '')}" for article in articles
+        ).encode('utf-8')).hexdigest()
+    
     def render_news_list(self, articles):
         """ニュース記事リストを描画"""
         if not articles:
@@ -599,8 +1205,9 @@ class StockChartWebApp:
             title = article.get('title', 'タイトルなし')
             description = article.get('description', '')
             date = article.get('formatted_date', article.get('publishedAt', ''))
-            symbol = article.get('symbol', '')
+            symbol = ', '.join(article.get('symbols') or [article.get('symbol', '')])
             url = article.get('url', '')
+            sentiment = article.get('sentiment')
             
             # 説明文を短縮
             if description and len(description) > 150:
@@ -615,7 +1222,8 @@ class StockChartWebApp:
                         'font-size': '11px',
                         'margin-right': '8px'
                     }),
-                    html.Span(date, style={'font-size': '11px', 'color': '#666'})
+                    html.Span(date, style={'font-size': '11px', 'color': '#666'}),
+                    self._render_sentiment_badge(sentiment)
                 ], style={'margin-bottom': '5px'}),
                 
                 html.A(
@@ -650,9 +1258,254 @@ class StockChartWebApp:
         
         return news_items
     
+    def _build_indicator_traces(self, group: str, chart_symbols: dict, period: str,
+                                ma_period=None, bb_period=None, bb_std=None, live_until: dict = None) -> tuple:
+        """
+        指標のトレースを作成（株価データはサーバー側のキャッシュから読む）
+        
+        Args:
+            group: 指標の種類（'ma', 'bb', 'sentiment'）
+            chart_symbols: 表示中の銘柄 -> 線の色
+            period: 表示中の期間
+            live_until: ライブ更新中の場合、銘柄 -> 価格トレースの最終日（最新の日足を反映してその日までの点にする）
+        
+        Returns:
+            tuple: (トレースのリスト, トレースを作成した銘柄のリスト)
+        """
+        if group == 'sentiment':
+            traces = []
+            sentiment_series = self.stock_manager.get_news_sentiment(list(chart_symbols))
+            for symbol, points in sentiment_series.items():
+                traces.append(go.Scattergl(
+                    x=[point['date'] for point in points],
+                    y=[point['score'] for point in points],
+                    customdata=[point['count'] for point in points],
+                    mode='lines+markers',
+                    name=f"センチメント - {symbol}",
+                    yaxis='y2',
+                    line=dict(color=chart_symbols[symbol], width=1, dash='dashdot'),
+                    marker=dict(size=6),
+                    hovertemplate='%{y:+.2f} (%{customdata}件)'
+                ))
+            return traces, list(sentiment_series)
+        
+        live = live_until is not None
+        if live:
+            stock_data = self.stock_manager.get_live_stock_data(list(chart_symbols), period)
+        else:
+            stock_data = self.stock_manager.get_stock_data_batch(list(chart_symbols), period)
+        
+        traces = []
+        symbols = []
+        for symbol, color in chart_symbols.items():
+            data = stock_data.get(symbol)
+            if live and data is not None and symbol in live_until:
+                data = data.loc[:live_until[symbol]]
+            if data is None or data.empty:
+                continue
+            symbols.append(symbol)
+            x = self._trace_x(data, live)
+            
+            # 移動平均線
+            if group == 'ma':
+                ma_data = self.stock_manager.calculate_moving_average(data, ma_period)
+                
+                traces.append(go.Scattergl(
+                    x=x,
+                    y=self._trace_values(ma_data, live),
+                    mode='lines',
+                    name=f"MA({ma_period}) - {symbol}",
+                    line=dict(color=color, width=1, dash='dash'),
+                    opacity=0.8
+                ))
+            
+            # ボリンジャーバンド
+            elif group == 'bb':
+                bb_data = self.stock_manager.calculate_bollinger_bands(data, bb_period, bb_std)
+                
+                # 上限線
+                traces.append(go.Scattergl(
+                    x=x,
+                    y=self._trace_values(bb_data['upper'], live),
+                    mode='lines',
+                    name=f"BB上限({bb_period},{bb_std}σ) - {symbol}",
+                    line=dict(color=color, width=1, dash='dot'),
+                    opacity=0.6
+                ))
+                
+                # 下限線
+                traces.append(go.Scattergl(
+                    x=x,
+                    y=self._trace_values(bb_data['lower'], live),
+                    mode='lines',
+                    name=f"BB下限({bb_period},{bb_std}σ) - {symbol}",
+                    line=dict(color=color, width=1, dash='dot'),
+                    opacity=0.6,
+                    fill='tonexty',
+                    fillcolor=f'rgba({int(color[1:3], 16)}, {int(color[3:5], 16)}, {int(color[5:7], 16)}, 0.1)'
+                ))
+                
+                # 中央線（移動平均）
+                traces.append(go.Scattergl(
+                    x=x,
+                    y=self._trace_values(bb_data['middle'], live),
+                    mode='lines',
+                    name=f"BB中央({bb_period}) - {symbol}",
+                    line=dict(color=color, width=1, dash='dash'),
+                    opacity=0.7
+                ))
+        
+        return traces, symbols
+    
+    def _figure_key(self, datasets: dict, period: str, error_messages: list, indicators: dict) -> str:
+        """グラフのキャッシュキー（入力・データの版・ニュースキャッシュの版から作成）"""
+        inputs = {
+            'symbols': [[symbol, color, company_name] for symbol, (color, _, company_name) in datasets.items()],
+            'period': period,
+            'errors': error_messages,
+            'indicators': indicators
+        }
+        versions = {symbol: data_version(data) for symbol, (_, data, _) in datasets.items()}
+        if indicators['sentiment']:
+            # 新しいニュースが入ったら作り直す（キーの作成ではNewsAPIを呼ばず、キャッシュの取得時刻だけを見る）
+            versions['sentiment'] = self.stock_manager.get_news_version(list(datasets))
+        return self.figure_cache.make_key(inputs, versions)
+    
+    def _indicator_start(self, chart_state: dict, group: str) -> int:
+        """指標の種類のトレースが始まる位置（価格トレース・前の種類の指標トレースの後）"""
+        group_symbols = chart_state['group_symbols']
+        return chart_state['price_count'] + sum(
+            len(group_symbols[g]) * TRACES_PER_SYMBOL[g] for g in INDICATOR_GROUPS[:INDICATOR_GROUPS.index(group)]
+        )
+    
+    def _trace_x(self, data, live: bool):
+        """トレースのx値（ライブ更新中は点を追加できるようリストにする）"""
+        if live:
+            return list(data.index)
+        # タイムゾーン付きの日時のままでは、銘柄数が多いとグラフの作成・シリアライズが遅くなるため日付の文字列にする
+        return np.datetime_as_string(data.index.tz_localize(None).values, unit='D')
+    
+    def _trace_values(self, values, live: bool):
+        """トレースのy値（ライブ更新中は点を更新できるよう、型付き配列ではなくリストにする）"""
+        if not live:
+            return values
+        return [None if math.isnan(value) else value for value in values.astype(float).tolist()]
+    
+    def _format_news_page_label(self, page: int, page_count: int, article_count: int) -> str:
+        return f"{page} / {page_count} ページ（全 {article_count} 件）"
+    
+    def _render_sentiment_badge(self, sentiment: Optional[float]):
+        """記事のセンチメントスコアをバッジとして描画（スコアがない場合はNone）"""
+        if sentiment is None:
+            return None
+        
+        if sentiment > 0.1:
+            color = '#28a745'
+        elif sentiment < -0.1:
+            color = '#dc3545'
+        else:
+            color = '#6c757d'
+        return html.Span(f"{sentiment:+.2f}", title="ニュースセンチメント", style={
+            'color': color,
+            'font-size': '11px',
+            'font-weight': 'bold',
+            'margin-left': '8px'
+        })
+    
+    def _format_freshness(self, freshness: dict) -> str:
+        """銘柄ごとのニュース最終更新時刻を「n分前」形式で表示用に整形"""
+        now = datetime.now()
+        parts = []
+        for symbol, fetched_at in freshness.items():
+            if fetched_at is None:
+                parts.append(f"{symbol}: 未取得")
+            else:
+                minutes = int((now - fetched_at).total_seconds() // 60)
+                parts.append(f"{symbol}: {minutes}分前" if minutes > 0 else f"{symbol}: 最新")
+        return "最終更新 - " + ", ".join(parts) if parts else ""
+    
+    def _format_warmup_status(self, status: Optional[dict]) -> str:
+        """キャッシュの事前取得の状況を表示用の文字列にする"""
+        if not status:
+            return ""
+        
+        target = f"{status['market']} の取引終了後の" if status['market'] else ""
+        if status['state'] == 'running':
+            return f"⏳ {target}キャッシュを事前取得中: {status['completed']}/{status['total']} 銘柄"
+        
+        finished_at = datetime.fromisoformat(status['finished_at']).astimezone().strftime('%m/%d %H:%M')
+        text = f"✅ {target}キャッシュを事前取得済み（{finished_at}, {status['total'] - len(status['failed'])}/{status['total']} 銘柄）"
+        if status['failed']:
+            text += f" - 取得できなかった銘柄: {', '.join(status['failed'][:5])}"
+        if status['next_runs']:
+            next_runs = ', '.join(
+                f"{market} {datetime.fromisoformat(run_at).astimezone().strftime('%m/%d %H:%M')}"
+                for market, run_at in sorted(status['next_runs'].items(), key=lambda item: item[1])
+            )
+            text += f" / 次回: {next_runs}"
+        return text
+    
+    def _get_user_id(self) -> Optional[str]:
+        """リクエストヘッダーからユーザーIDを取得（未設定の場合はNone = デフォルトユーザー）"""
+        # バックグラウンドコールバックのジョブ内でも参照できるコールバックコンテキストのヘッダーを使う
+        try:
+            headers = dash.ctx.headers
+        except dash.exceptions.MissingCallbackContextException:
+            return None
+        header_name = USER_ID_HEADER.lower()
+        user_id = next((value for name, value in headers.items() if name.lower() == header_name), '').strip()
+        if not user_id or len(user_id) > 64:
+            return None
+        return user_id
+    
+    def _stock_input(self, index: int, value: str = '') -> html.Div:
+        """銘柄の入力欄（入力欄の数を変えられるようパターンマッチングのIDにする）"""
+        return html.Div([
+            html.Label(f"銘柄 {index + 1}:", style={'display': 'block', 'margin-bottom': '5px'}),
+            dcc.Input(
+                id={'type': 'stock-input', 'index': index},
+                type='text',
+                value=value,
+                list='symbol-suggestions',
+                autoComplete='off',
+                placeholder='例: AAPL, 7203.T',
+                style={'width': '200px', 'margin-bottom': '10px'}
+            )
+        ])
+    
+    def _empty_figure(self) -> go.Figure:
+        """銘柄未表示時のチャート"""
+        fig = go.Figure()
+        fig.update_layout(
+            title="株価チャート",
+            xaxis_title="日付",
+            yaxis_title="株価",
+            template="plotly_white"
+        )
+        return fig
+    
+    def _background_options(self, progress: list = None, running: list = None, cancel: list = None) -> dict:
+        """
+        コールバックのバックグラウンド実行オプション
+        
+        ジョブマネージャーが無い場合は running（処理中の表示切り替え）のみ指定した通常のコールバックにする。
+        """
+        options = {'running': running or []}
+        if self.background_manager is not None:
+            options.update(background=True, interval=500, progress=progress, cancel=cancel or None)
+        return options
+    
+    def _with_progress(self, func):
+        """同期実行のコールバックでも set_progress を第1引数に受け取れるようにする"""
+        if self.background_manager is not None:
+            return func
+        
+        def without_progress(*args):
+            return func(lambda value: None, *args)
+        return without_progress
+    
     def _is_valid_symbol_format(self, symbol: str) -> bool:
         """株価シンボルの基本的な形式をチェック"""
-        import re
         if not symbol or len(symbol) < 1 or len(symbol) > 12:
             return False
         # 基本的な英数字と一部の記号のみ許可
@@ -660,10 +1513,21 @@ class StockChartWebApp:
             return False
         return True
     
+    def start_background_tasks(self):
+        """キャッシュの事前取得とニュースのバックグラウンド更新を開始（ワーカープロセスごとに1度呼ぶ）"""
+        self.cache_warmer.start()
+        self.stock_manager.news_manager.start_background_refresh()
+    
     def run(self, debug=True, host='127.0.0.1', port=8050):
         """Webアプリケーションを起動"""
+        self.startup_timer.mark('ready')
+        print(self.startup_timer.report())
+        if not self.startup_timer.within_budget:
+            print(f"警告: 起動時間が目標 ({self.startup_timer.budget:.1f}秒) を超えています")
+        
         print(f"株価チャート表示アプリを起動中...")
         print(f"ブラウザで http://{host}:{port} を開いてください")
+        self.start_background_tasks()
         self.app.run(debug=debug, host=host, port=port)
 
 
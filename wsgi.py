@@ -0,0 +1,14 @@
+"""
+本番環境用のWSGIエントリポイント
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+"""
+
+from web_app import StockChartWebApp
+
+# preload_app ではマスタープロセスで1度だけ初期化し、fork した各ワーカーでメモリを共有する
+stock_chart_app = StockChartWebApp()
+stock_chart_app.startup_timer.mark('ready')
+print(stock_chart_app.startup_timer.report())
+
+application = stock_chart_app.app.server